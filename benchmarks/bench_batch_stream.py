@@ -0,0 +1,58 @@
+"""`POST /risk_profiles/batch` with an NDJSON body of `--records` synthetic
+user data objects, answered with a JSON array (buffered) vs. streamed as
+NDJSON (`Accept: application/x-ndjson`): the time to the first byte and to
+the last one, and the peak memory traced while answering (on top of the
+request body).
+
+    $ python benchmarks/bench_batch_stream.py --records 20000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from riskprofiler import create_app
+from riskprofiler.synthetic import SyntheticUserDataGenerator
+
+MODES = {'buffered': 'application/json', 'streamed': 'application/x-ndjson'}
+
+def post(client, body, accept):
+    """Returns the times (in seconds) to the first and last bytes of the
+    response, and its size."""
+    start = time.perf_counter()
+    resp = client.post('/risk_profiles/batch', data=body, content_type='application/x-ndjson', headers={'Accept': accept}, buffered=False)
+    first = None
+    size = 0
+    for block in resp.response:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(block)
+    resp.close()
+    return first, time.perf_counter() - start, size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    args = parser.parse_args()
+    generator = SyntheticUserDataGenerator(seed=0)
+    body = ''.join(json.dumps(payload) + '\n' for payload in generator.payloads(args.records)).encode('utf-8')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({'DATABASE': os.path.join(tmp_dir, 'bench.sqlite'), 'METRICS_ENABLED': False})
+        client = app.test_client()
+        print('{} records ({:.1f} MB):'.format(args.records, len(body) / 1e6))
+        for mode, accept in MODES.items():
+            first, last, size = post(client, body, accept)
+            tracemalloc.start()
+            before, _ = tracemalloc.get_traced_memory()
+            post(client, body, accept)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print('  {:<8}: first byte {:8.1f} ms, last byte {:8.1f} ms, {:.1f} MB sent, peak memory {:6.1f} MB'.format(
+                mode, first * 1e3, last * 1e3, size / 1e6, (peak - before) / 1e6
+            ))
+        app.extensions['write_behind'].close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Bursts of identical `POST /risk_profile` requests sent by `--threads`
+threads at once, with and without request coalescing. Each burst sends new
+user data (another income), so it isn't in the profile cache yet.
+
+    $ python benchmarks/bench_coalescing.py --threads 8 --vehicles 2000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from riskprofiler import create_app
+from bench_large_items import make_payload
+
+def run_bursts(app, payload, threads, bursts):
+    barrier = threading.Barrier(threads + 1)
+    done = threading.Barrier(threads + 1)
+
+    def worker():
+        client = app.test_client()
+        for burst in range(bursts):
+            barrier.wait()
+            assert client.post('/risk_profile', json=dict(payload, income=burst)).status_code == 201
+            done.wait()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    timings = []
+    for _ in range(bursts):
+        barrier.wait()
+        start = time.perf_counter()
+        done.wait()
+        timings.append((time.perf_counter() - start) * 1e3)
+    for thread in workers:
+        thread.join()
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--vehicles', type=int, default=2000)
+    parser.add_argument('--bursts', type=int, default=50)
+    args = parser.parse_args()
+    payload = make_payload(1, args.vehicles)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for coalesce in (False, True):
+            app = create_app({
+                'DATABASE': os.path.join(tmp_dir, 'bench.sqlite'),
+                'COALESCE_REQUESTS': coalesce
+            })
+            timings = run_bursts(app, payload, args.threads, args.bursts)
+            stats = app.extensions['coalescer'].stats() if coalesce else None
+            print('coalescing {:<3}: burst of {} requests, median {:.1f} ms{}'.format(
+                'on' if coalesce else 'off', args.threads, statistics.median(timings),
+                '' if stats is None else ', {} of {} calculations saved'.format(stats['followers'], stats['leaders'] + stats['followers'])
+            ))
+            app.extensions['write_behind'].close()
+
+if __name__ == '__main__':
+    main()
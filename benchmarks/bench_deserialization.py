@@ -0,0 +1,36 @@
+"""Latency of `UserDataDeserializer.load`, for valid payloads of growing
+size and for an invalid one (every item has a wrong type).
+
+    $ python benchmarks/bench_deserialization.py
+"""
+import timeit
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.errors import OriginAdvisorError
+from bench_policy_compiler import make_payload
+
+PAYLOADS = {
+    'readme example': make_payload(2, 2),
+    '1000 houses and vehicles': make_payload(1000, 1000),
+    '5000 vehicles': make_payload(0, 5000)
+}
+
+def load_ignoring_errors(payload):
+    try:
+        UserDataDeserializer().load(payload)
+    except OriginAdvisorError:
+        pass
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def main():
+    invalid = make_payload(0, 1000)
+    for vehicle in invalid['vehicles']:
+        vehicle['year'] = str(vehicle['year'])
+    for name, payload in PAYLOADS.items():
+        number = max(1, 20000 // (1 + len(payload['houses']) + len(payload['vehicles'])))
+        print('{:<28} {:>12.2f} us'.format(name, per_call_us(lambda: UserDataDeserializer().load(payload), number)))
+    print('{:<28} {:>12.2f} us'.format('1000 invalid vehicles', per_call_us(lambda: load_ignoring_errors(invalid), 20)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Per-user latency with thousands of items: deserializing the user data,
+calculating the profile (compiled plan and interpreted policies) and the
+`UserData` queries the policies make.
+
+    $ python benchmarks/bench_large_items.py [--items 10000]
+"""
+import argparse
+import timeit
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.risk_scoring import RiskScoring
+from riskprofiler.risk_profile_calculator import RiskProfileCalculator
+
+def make_payload(num_houses, num_vehicles):
+    return {
+        'age': 35,
+        'gender': 'female',
+        'marital_status': 'married',
+        'dependents': 2,
+        'income': 250000,
+        'risk_questions': [0, 1, 0],
+        'houses': [{'key': i, 'zip_code': 10000 + i, 'status': 'mortgaged' if i % 3 == 0 else 'owned'} for i in range(num_houses)],
+        'vehicles': [{'key': i, 'make': 'Maker', 'model': 'Model', 'year': 1990 + i % 35} for i in range(num_vehicles)]
+    }
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=10000)
+    args = parser.parse_args()
+    payloads = {
+        'landlord ({} houses)'.format(args.items): make_payload(args.items, 1),
+        'fleet ({} vehicles)'.format(args.items): make_payload(1, args.items)
+    }
+    number = max(1, 200000 // args.items)
+    for name, payload in payloads.items():
+        user_data = UserDataDeserializer().load(payload)
+        timings = {
+            'deserialize': lambda: UserDataDeserializer().load(payload),
+            'calculate (compiled)': lambda: RiskProfileCalculator(user_data=user_data).calculate(),
+            # Indexes of a new `UserData` are built on first use.
+            'deserialize + calculate': lambda: RiskProfileCalculator(user_data=UserDataDeserializer().load(payload)).calculate(),
+            'calculate (interpreted)': lambda: RiskProfileCalculator(user_data=user_data, risk_scoring=RiskScoring()).calculate(),
+            'houses()': user_data.houses,
+            'get_house_at(0)': lambda: user_data.get_house_at(0),
+            'get_mortgaged_houses()': user_data.get_mortgaged_houses,
+            'has_mortgaged_houses()': user_data.has_mortgaged_houses,
+            'get_vehicle_at(0)': lambda: user_data.get_vehicle_at(0)
+        }
+        print(name)
+        for label, func in timings.items():
+            print('  {:<26} {:>12.2f} us'.format(label, per_call_us(func, number)))
+
+if __name__ == '__main__':
+    main()
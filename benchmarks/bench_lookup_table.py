@@ -0,0 +1,36 @@
+"""Per-profile latency of `CompiledPolicyPlan.run`, scoring life and
+disability by running the compiled steps vs. with the single item line
+table (see `riskprofiler/lookup_table.py`), for all the lines and for the
+life line alone, and the time to build the table.
+
+    $ python benchmarks/bench_lookup_table.py
+"""
+import timeit
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.lookup_table import build_single_item_line_table
+from riskprofiler.policy_compiler import _compile
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES
+from riskprofiler.serialization import UserDataDeserializer
+from bench_policy_compiler import PAYLOADS, per_call_us
+
+LINES = {'all lines': None, 'life': frozenset([Loi.life])}
+
+def main():
+    policies = tuple(CURRENT_RISK_POLICIES)
+    print('{:<28} {:<10} {:>14} {:>14} {:>8}'.format('payload', 'lines', 'steps', 'table', 'speedup'))
+    for name, payload in PAYLOADS.items():
+        user_data = UserDataDeserializer().load(payload)
+        number = 20000 // (1 + len(payload['vehicles']) // 10)
+        for lines_name, lines in LINES.items():
+            with_table = _compile(policies, lines)
+            # Same plan, without the table.
+            steps_only = _compile.__wrapped__(policies, lines)
+            steps_only.use_table(None, None, ())
+            assert with_table.run(user_data) == steps_only.run(user_data)
+            steps = per_call_us(lambda: steps_only.run(user_data), number)
+            table = per_call_us(lambda: with_table.run(user_data), number)
+            print('{:<28} {:<10} {:>11.2f} us {:>11.2f} us {:>7.2f}x'.format(name, lines_name, steps, table, steps / table))
+    print('building the table: {:.1f} us'.format(per_call_us(lambda: build_single_item_line_table(policies), 200)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Memory used by the data model, measured with tracemalloc.
+
+For each payload it reports the bytes and memory blocks retained by a
+deserialized `UserData` and by a `RiskScoring` after all policies were
+applied to it, and the peak traced memory of a whole request (deserialize,
+calculate, serialize).
+
+    $ python benchmarks/bench_memory.py
+"""
+import tracemalloc
+from riskprofiler.serialization import UserDataDeserializer, RiskProfileSerializer
+from riskprofiler.risk_scoring import RiskScoring
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES, RiskProfileCalculator
+from bench_policy_compiler import PAYLOADS
+
+COPIES = 1000
+
+def retained(build):
+    """Returns the bytes and blocks retained per object built by `build`."""
+    objs = []
+    before = tracemalloc.take_snapshot()
+    for _ in range(COPIES):
+        objs.append(build())
+    after = tracemalloc.take_snapshot()
+    stats = after.compare_to(before, 'filename')
+    size = sum(s.size_diff for s in stats)
+    blocks = sum(s.count_diff for s in stats)
+    del objs
+    return size / COPIES, blocks / COPIES
+
+def request(payload):
+    user_data = UserDataDeserializer().load(payload)
+    risk_profile = RiskProfileCalculator(user_data=user_data).calculate()
+    return RiskProfileSerializer().to_dict(risk_profile)
+
+def request_peak(payload):
+    request(payload)
+    tracemalloc.reset_peak()
+    current, _ = tracemalloc.get_traced_memory()
+    request(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    return peak - current
+
+def scored(user_data):
+    scoring = RiskScoring()
+    for policy in CURRENT_RISK_POLICIES:
+        policy.apply(user_data, scoring)
+    return scoring
+
+def main():
+    tracemalloc.start()
+    print('{:<28} {:>16} {:>16} {:>14}'.format('payload', 'UserData', 'RiskScoring', 'request peak'))
+    for name, payload in PAYLOADS.items():
+        user_data_size, user_data_blocks = retained(lambda: UserDataDeserializer().load(payload))
+        user_data = UserDataDeserializer().load(payload)
+        scoring_size, scoring_blocks = retained(lambda: scored(user_data))
+        print('{:<28} {:>7.0f}B {:>4.0f}blk {:>7.0f}B {:>4.0f}blk {:>12}B'.format(
+            name, user_data_size, user_data_blocks, scoring_size, scoring_blocks, request_peak(payload)
+        ))
+    tracemalloc.stop()
+
+if __name__ == '__main__':
+    main()
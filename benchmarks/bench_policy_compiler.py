@@ -0,0 +1,50 @@
+"""Per-profile latency of `RiskProfileCalculator.calculate`, applying the
+policies to a `RiskScoring` (interpreted) vs. running the compiled plan, and
+running the compiled plan of the same policies loaded from
+`riskprofiler/policies.json` (rules).
+
+    $ python benchmarks/bench_policy_compiler.py
+"""
+import os
+import timeit
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.risk_scoring import RiskScoring
+from riskprofiler.risk_profile_calculator import RiskProfileCalculator
+from riskprofiler.policy_rules import load_policies
+
+POLICY_FILE = os.path.join(os.path.dirname(__file__), '..', 'riskprofiler', 'policies.json')
+
+def make_payload(num_houses, num_vehicles):
+    return {
+        'age': 35,
+        'gender': 'female',
+        'marital_status': 'married',
+        'dependents': 2,
+        'income': 150000,
+        'risk_questions': [0, 1, 0],
+        'houses': [{'key': i, 'zip_code': 123, 'status': 'mortgaged' if i % 2 else 'owned'} for i in range(num_houses)],
+        'vehicles': [{'key': i, 'make': 'Maker', 'model': 'Model', 'year': 2005 + i % 15} for i in range(num_vehicles)]
+    }
+
+PAYLOADS = {
+    'readme example': make_payload(2, 2),
+    'single house and vehicle': make_payload(1, 1),
+    'fleet of 50 vehicles': make_payload(3, 50)
+}
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def main():
+    rule_policies = load_policies(POLICY_FILE)
+    print('{:<28} {:>14} {:>14} {:>8} {:>14}'.format('payload', 'interpreted', 'compiled', 'speedup', 'rules'))
+    for name, payload in PAYLOADS.items():
+        user_data = UserDataDeserializer().load(payload)
+        number = 20000 // (1 + len(payload['vehicles']) // 10)
+        interpreted = per_call_us(lambda: RiskProfileCalculator(user_data=user_data, risk_scoring=RiskScoring()).calculate(), number)
+        compiled = per_call_us(lambda: RiskProfileCalculator(user_data=user_data).calculate(), number)
+        rules = per_call_us(lambda: RiskProfileCalculator(user_data=user_data, risk_policies=rule_policies).calculate(), number)
+        print('{:<28} {:>11.2f} us {:>11.2f} us {:>7.2f}x {:>11.2f} us'.format(name, interpreted, compiled, interpreted / compiled, rules))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Requests cycling through `--versions` policy versions (copies of
+`riskprofiler/policies.json` with other large income thresholds) and the
+`lines` of insurance they ask for: the per-request latency of building the
+calculator and calculating, with the plan looked up in the shared cache of
+`compile_policies` vs. taken from the version's `ActivePolicies`, and of
+whole `POST /risk_profile` requests selecting a version by header.
+
+    $ python benchmarks/bench_policy_versions.py --versions 8
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+from riskprofiler import create_app
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.risk_profile_calculator import RiskProfileCalculator
+from riskprofiler.serialization import UserDataDeserializer
+from bench_policy_compiler import POLICY_FILE, make_payload
+
+LINES = [None] + [frozenset([loi]) for loi in Loi]
+
+def write_version(path, large_income_thresh):
+    with open(POLICY_FILE) as f:
+        definition = json.load(f)
+    for policy in definition['policies']:
+        if policy['name'] == 'large_income':
+            policy['rules'][0]['if']['income']['>'] = large_income_thresh
+    with open(path, 'w') as f:
+        json.dump(definition, f)
+
+def per_request_us(requests, calculate, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for active, lines in requests:
+            calculate(active, lines)
+        timings.append((time.perf_counter() - start) / len(requests) * 1e6)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--versions', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    payload = make_payload(2, 2)
+    user_data = UserDataDeserializer().load(payload)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        versions = {}
+        for i in range(args.versions):
+            versions['v{}'.format(i)] = path = os.path.join(tmp_dir, 'v{}.json'.format(i))
+            write_version(path, 100000 + i * 10000)
+        app = create_app({'DATABASE': os.path.join(tmp_dir, 'bench.sqlite'), 'POLICY_VERSIONS': versions, 'PROFILE_CACHE_SIZE': 0})
+        actives = [policy_set.active for policy_set in app.extensions['policy_sets'].values()]
+        requests = list(itertools.product(actives, LINES))
+
+        def shared_cache(active, lines):
+            return RiskProfileCalculator(user_data=user_data, risk_policies=active.policies, lines=lines).calculate()
+
+        def per_version(active, lines):
+            return RiskProfileCalculator(user_data=user_data, risk_policies=active.policies, plan=active.plan_for(lines), lines=lines).calculate()
+
+        print('{} versions x {} line selections, per request:'.format(args.versions, len(LINES)))
+        print('  shared compile cache: {:8.1f} us'.format(per_request_us(requests, shared_cache, args.rounds)))
+        print('  per-version plans:    {:8.1f} us'.format(per_request_us(requests, per_version, args.rounds)))
+
+        client = app.test_client()
+        names = list(versions)
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            for name in names:
+                assert client.post('/risk_profile', json=payload, headers={'X-Policy-Version': name}).status_code == 201
+            timings.append((time.perf_counter() - start) / len(names) * 1e6)
+        print('  POST /risk_profile, switching version every request: {:.1f} us (median)'.format(statistics.median(timings)))
+        app.extensions['write_behind'].close()
+
+if __name__ == '__main__':
+    main()
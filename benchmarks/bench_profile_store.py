@@ -0,0 +1,66 @@
+"""Benchmark of `ProfileStore.get` lookups (including decoding) in a
+database of `--rows` stored profiles.
+
+    $ python benchmarks/bench_profile_store.py --rows 2000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from riskprofiler import create_app
+from riskprofiler.db import get_profile_store
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.risk_profile_calculator import RiskAversion
+
+def make_profile(rnd):
+    aversions = list(RiskAversion)
+    return {
+        Loi.life: rnd.choice(aversions),
+        Loi.disability: rnd.choice(aversions),
+        Loi.home: {key: rnd.choice(aversions) for key in range(rnd.randint(0, 2))},
+        Loi.auto: {key: rnd.choice(aversions) for key in range(rnd.randint(0, 3))}
+    }
+
+def fill(store, rows, batch_size=50000):
+    rnd = random.Random(0)
+    for start in range(0, rows, batch_size):
+        store.put_many(
+            ('user-{}'.format(i), make_profile(rnd))
+            for i in range(start, min(rows, start + batch_size))
+        )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--lookups', type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({'DATABASE': os.path.join(tmp_dir, 'bench.sqlite')})
+        with app.app_context():
+            store = get_profile_store()
+        start = time.perf_counter()
+        fill(store, args.rows)
+        print('inserted {} rows in {:.1f} s ({} bytes on disk)'.format(
+            args.rows, time.perf_counter() - start, os.path.getsize(app.config['DATABASE'])
+        ))
+
+        rnd = random.Random(1)
+        user_ids = ['user-{}'.format(rnd.randrange(args.rows)) for _ in range(args.lookups)]
+        user_ids += ['missing-{}'.format(i) for i in range(args.lookups // 10)]
+        rnd.shuffle(user_ids)
+        timings = []
+        for user_id in user_ids:
+            start = time.perf_counter()
+            store.get(user_id)
+            timings.append((time.perf_counter() - start) * 1e6)
+        timings.sort()
+        print('{} lookups: median {:.1f} us, p99 {:.1f} us, max {:.1f} us'.format(
+            len(timings), statistics.median(timings), timings[int(0.99 * (len(timings) - 1))], timings[-1]
+        ))
+        store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Latency of `POST /risk_profile` without shadow evaluation, and with a
+candidate policy version (a copy of `riskprofiler/policies.json` with
+another large income threshold) scored in the background, along with the
+profiles compared and dropped.
+
+    $ python benchmarks/bench_shadow.py --requests 5000 --vehicles 2
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from riskprofiler import create_app
+from bench_large_items import make_payload
+from bench_policy_versions import write_version
+
+def percentile(timings, fraction):
+    return sorted(timings)[int(len(timings) * fraction)]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--vehicles', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=1000)
+    args = parser.parse_args()
+    payload = make_payload(2, args.vehicles)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        candidate_path = os.path.join(tmp_dir, 'candidate.json')
+        write_version(candidate_path, 100000)
+        for shadow in (False, True):
+            app = create_app({
+                'DATABASE': os.path.join(tmp_dir, 'bench.sqlite'),
+                'POLICY_VERSIONS': {'candidate': candidate_path},
+                'SHADOW_POLICY_VERSION': 'candidate' if shadow else None,
+                'SHADOW_QUEUE_SIZE': args.queue_size,
+                'PROFILE_CACHE_SIZE': 0
+            })
+            client = app.test_client()
+            timings = []
+            for i in range(args.requests):
+                body = dict(payload, income=i * 100)
+                start = time.perf_counter()
+                assert client.post('/risk_profile', json=body).status_code == 201
+                timings.append((time.perf_counter() - start) * 1e6)
+            line = 'shadow {:<3}: median {:.1f} us, p99 {:.1f} us'.format(
+                'on' if shadow else 'off', statistics.median(timings), percentile(timings, 0.99)
+            )
+            if shadow:
+                shadow_evaluator = app.extensions['shadow_evaluator']
+                shadow_evaluator.flush()
+                stats = shadow_evaluator.stats()
+                line += ', {} compared ({} changed), {} dropped'.format(stats['compared'], stats['changed'], stats['dropped'])
+                shadow_evaluator.close()
+            print(line)
+            app.extensions['write_behind'].close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Payload size and decoding time of user data, as JSON (`json.loads` and
+`UserDataDeserializer`) vs. in the binary format of
+`riskprofiler/wire_format.py`, the size and encoding time of the risk
+profiles, and the latency of whole `POST /risk_profile` requests with each
+format.
+
+    $ python benchmarks/bench_wire_format.py --payloads 1000
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import timeit
+from riskprofiler import create_app
+from riskprofiler.response_encoding import RISK_PROFILE_ENCODER
+from riskprofiler.risk_profile_calculator import RiskProfileCalculator
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.synthetic import SyntheticUserDataGenerator
+from riskprofiler.wire_format import BINARY_MIMETYPE, encode_user_data, decode_user_data, encode_risk_profile
+
+KINDS = ('typical', 'landlord', 'large_fleet')
+
+def per_call_us(func, items, repeat=5):
+    return min(timeit.repeat(lambda: [func(item) for item in items], number=1, repeat=repeat)) / len(items) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--payloads', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    generator = SyntheticUserDataGenerator(seed=0)
+    deserializer = UserDataDeserializer()
+
+    print('{:<12} {:>10} {:>10} {:>14} {:>14} {:>8}'.format('payload', 'JSON size', 'binary', 'JSON decode', 'binary decode', 'speedup'))
+    for kind in KINDS:
+        payloads = list(generator.payloads(args.payloads, {kind: 1}))
+        json_bodies = [json.dumps(payload).encode('utf-8') for payload in payloads]
+        binary_bodies = [encode_user_data(payload) for payload in payloads]
+        json_us = per_call_us(lambda body: deserializer.load(json.loads(body)), json_bodies)
+        binary_us = per_call_us(decode_user_data, binary_bodies)
+        print('{:<12} {:>8.0f} B {:>8.0f} B {:>11.2f} us {:>11.2f} us {:>7.2f}x'.format(
+            kind, statistics.mean(map(len, json_bodies)), statistics.mean(map(len, binary_bodies)), json_us, binary_us, json_us / binary_us
+        ))
+
+    payloads = list(generator.payloads(args.payloads, {kind: 1 for kind in KINDS}))
+    profiles = [RiskProfileCalculator(user_data=deserializer.load(payload)).calculate() for payload in payloads]
+    print('risk profiles: JSON {:.0f} B in {:.2f} us, binary {:.0f} B in {:.2f} us'.format(
+        statistics.mean(len(RISK_PROFILE_ENCODER.encode(p)) for p in profiles), per_call_us(RISK_PROFILE_ENCODER.encode, profiles),
+        statistics.mean(len(encode_risk_profile(p)) for p in profiles), per_call_us(encode_risk_profile, profiles)
+    ))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({'DATABASE': os.path.join(tmp_dir, 'bench.sqlite'), 'PROFILE_CACHE_SIZE': 0, 'METRICS_ENABLED': False})
+        client = app.test_client()
+        formats = {
+            'JSON': ([json.dumps(p).encode('utf-8') for p in payloads], 'application/json', 'application/json'),
+            'binary': ([encode_user_data(p) for p in payloads], BINARY_MIMETYPE, BINARY_MIMETYPE)
+        }
+        for name, (bodies, content_type, accept) in formats.items():
+            timings = []
+            for i in range(args.requests):
+                start = time.perf_counter()
+                assert client.post('/risk_profile', data=bodies[i % len(bodies)], content_type=content_type, headers={'Accept': accept}).status_code == 201
+                timings.append((time.perf_counter() - start) * 1e6)
+            print('POST /risk_profile, {:<6}: median {:.1f} us'.format(name, statistics.median(timings)))
+        app.extensions['write_behind'].close()
+
+if __name__ == '__main__':
+    main()
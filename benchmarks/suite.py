@@ -0,0 +1,140 @@
+"""Benchmark suite of the main request stages, driven by seeded synthetic
+user data.
+
+For every scenario (a kind of `SyntheticUserDataGenerator` payload) it
+times `UserDataDeserializer.load`, each policy's `apply`,
+`RiskProfileCalculator.calculate`, `RiskProfileSerializer.to_dict` and a
+full POST to /risk_profile through the Flask test client (with the profile
+cache disabled). Results are saved as JSON; given a baseline results file,
+stages whose median got slower than `--threshold` times the baseline are
+reported as regressions (and the exit status is 1).
+
+    $ python benchmarks/suite.py --output results.json
+    $ python benchmarks/suite.py --baseline results.json --threshold 1.2
+"""
+import argparse
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+from riskprofiler import create_app
+from riskprofiler.serialization import UserDataDeserializer, RiskProfileSerializer
+from riskprofiler.risk_scoring import RiskScoring
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES, RiskProfileCalculator
+from riskprofiler.synthetic import SyntheticUserDataGenerator
+
+SCENARIOS = ('typical', 'no_items', 'all_mortgaged', 'landlord', 'large_fleet')
+
+def time_per_call(func, args_list, repeat):
+    """Returns the per-call timings (in microseconds) of `func` over every
+    args tuple of `args_list`, each run `repeat` times."""
+    timings = []
+    for _ in range(repeat):
+        for args in args_list:
+            start = time.perf_counter()
+            func(*args)
+            timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'median_us': statistics.median(timings),
+        'mean_us': statistics.fmean(timings),
+        'p90_us': timings[max(0, math.ceil(0.9 * len(timings)) - 1)],
+        'min_us': timings[0]
+    }
+
+def apply_policy(policy, user_data, scoring):
+    policy.apply(user_data, scoring)
+
+def bench_scenario(scenario, payloads, repeat, client):
+    deserializer = UserDataDeserializer()
+    serializer = RiskProfileSerializer()
+    user_datas = [deserializer.load(p) for p in payloads]
+    risk_profiles = [RiskProfileCalculator(user_data=u).calculate() for u in user_datas]
+    results = {}
+
+    def record(stage, timings):
+        results['{}/{}'.format(stage, scenario)] = summarize(timings)
+
+    record('deserialize', time_per_call(deserializer.load, [(p,) for p in payloads], repeat))
+    for policy in CURRENT_RISK_POLICIES:
+        # Every policy is applied on top of the scores created by the
+        # initial one (repeated applies only keep adding points).
+        args_list = []
+        for user_data in user_datas:
+            scoring = RiskScoring()
+            CURRENT_RISK_POLICIES[0].apply(user_data, scoring)
+            args_list.append((policy, user_data, scoring))
+        record('policy.' + type(policy).__name__, time_per_call(apply_policy, args_list, repeat))
+    record('calculate', time_per_call(
+        lambda u: RiskProfileCalculator(user_data=u).calculate(), [(u,) for u in user_datas], repeat
+    ))
+    record('serialize', time_per_call(serializer.to_dict, [(p,) for p in risk_profiles], repeat))
+    record('post', time_per_call(
+        lambda p: client.post('/risk_profile', json=p), [(p,) for p in payloads], max(1, repeat // 5)
+    ))
+    return results
+
+def run(seed, count, repeat):
+    app = create_app({'TESTING': True, 'PROFILE_CACHE_SIZE': 0})
+    client = app.test_client()
+    results = {}
+    for scenario in SCENARIOS:
+        generator = SyntheticUserDataGenerator(seed=seed, curr_year=2018)
+        scenario_count = count if scenario != 'large_fleet' else max(1, count // 20)
+        payloads = [generator.payload(scenario) for _ in range(scenario_count)]
+        results.update(bench_scenario(scenario, payloads, repeat, client))
+    return {
+        'meta': {
+            'seed': seed,
+            'count': count,
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        },
+        'results': results
+    }
+
+def compare(results, baseline, threshold):
+    """Returns `(name, baseline median, median)` for every regressed stage."""
+    regressions = []
+    for name, stats in sorted(results['results'].items()):
+        base_stats = baseline['results'].get(name)
+        if base_stats is not None and stats['median_us'] > threshold * base_stats['median_us']:
+            regressions.append((name, base_stats['median_us'], stats['median_us']))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--count', type=int, default=200, help='payloads per scenario')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per payload')
+    parser.add_argument('--output', help='file to save the results (JSON) to')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='slowdown ratio of the median over the baseline flagged as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.seed, args.count, args.repeat)
+    for name, stats in sorted(results['results'].items()):
+        print('{:<45} median {:>10.2f} us   p90 {:>10.2f} us'.format(name, stats['median_us'], stats['p90_us']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, base_median, median in regressions:
+            print('REGRESSION {}: {:.2f} us -> {:.2f} us ({:.2f}x)'.format(name, base_median, median, median / base_median))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
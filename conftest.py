@@ -1,18 +1,28 @@
 import os
+import random
 import tempfile
 
 import pytest
 from riskprofiler import create_app
+from riskprofiler.user_data import UserData, ItemDataCollection, HouseItemData, VehicleItemData, HouseStatus, MaritalStatus, Gender
 
 
 @pytest.fixture
 def app():
+    db_fd, db_path = tempfile.mkstemp()
+
     app = create_app({
-        'TESTING': True
+        'TESTING': True,
+        'DATABASE': db_path
     })
 
     yield app
 
+    app.extensions['write_behind'].close()
+    app.extensions['profile_store'].close()
+    os.close(db_fd)
+    os.unlink(db_path)
+
 @pytest.fixture
 def client(app):
     return app.test_client()
@@ -38,4 +48,33 @@ def user_data_json():
             {'key': 0, 'make': 'Maker', 'model': 'Model A', 'year': 2008},
             {'key': 1, 'make': 'Maker', 'model': 'Model B', 'year': 2018}
         ]
-    }
\ No newline at end of file
+    }
+
+@pytest.fixture
+def make_random_user_datas():
+    """Seeded random `UserData` objects, biased towards the policy
+    thresholds (ages 30/40/60, zero and large incomes, single items)."""
+    def _random_user_data(rnd):
+        houses = ItemDataCollection(*[
+            HouseItemData(key, zip_code=rnd.randint(0, 99999), status=rnd.choice(list(HouseStatus)))
+            for key in rnd.sample(range(100), rnd.choice([0, 0, 1, 1, 2, 3, 5]))
+        ])
+        vehicles = ItemDataCollection(*[
+            VehicleItemData(key, make='Maker', model='Model', year=rnd.randint(2005, 2019))
+            for key in rnd.sample(range(100), rnd.choice([0, 0, 1, 1, 2, 4]))
+        ])
+        return UserData(
+            age=rnd.choice([18, 29, 30, 39, 40, 60, 61, 90, rnd.randint(0, 100)]),
+            gender=rnd.choice(list(Gender)),
+            marital_status=rnd.choice(list(MaritalStatus)),
+            dependents=rnd.choice([0, 0, 1, 3]),
+            income=rnd.choice([0, 1, 199999, 200000, 200001, rnd.randint(0, 500000)]),
+            houses=houses,
+            vehicles=vehicles,
+            risk_questions=[rnd.randint(0, 1) for _ in range(3)]
+        )
+
+    def _make_random_user_datas(count, seed=1234):
+        rnd = random.Random(seed)
+        return [_random_user_data(rnd) for _ in range(count)]
+    return _make_random_user_datas
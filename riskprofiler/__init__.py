@@ -24,6 +24,30 @@ def create_app(test_config=None):
     except OSError:
         pass
 
+    from . import metrics
+    metrics.init_app(app)
+
+    from . import db
+    db.init_app(app)
+
+    from . import write_behind
+    write_behind.init_app(app)
+
+    from . import policy_set
+    policy_set.init_app(app)
+
+    from . import profile_cache
+    profile_cache.init_app(app)
+
+    from . import coalescing
+    coalescing.init_app(app)
+
+    from . import shadow
+    shadow.init_app(app)
+
+    from . import cli
+    cli.init_app(app)
+
     from . import api
     app.register_blueprint(api.bp)
     app.add_url_rule('/', endpoint='index')
@@ -1,34 +1,352 @@
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, url_for, jsonify
+    Blueprint, flash, g, redirect, render_template, request, url_for, jsonify, current_app, stream_with_context
 )
 from werkzeug.exceptions import abort
 from http import HTTPStatus
+import datetime
 
-from .serialization import UserDataDeserializer, RiskProfileSerializer
-from .risk_profile_calculator import RiskProfileCalculator
-from .errors import MissingKeyDeserializationError, WrongKeyTypeDeserializationError
+from .line_of_insurance import Loi
+from .serialization import UserDataDeserializer, UserDataSerializer, RiskProfileSerializer
+from .risk_profile_calculator import RiskProfileCalculator, RiskScoreValueMapping
+from .profile_cache import get_profile_cache, in_item_order, user_data_fingerprint
+from .coalescing import get_coalescer
+from .metrics import get_metrics
+from .write_behind import get_profile_writer
+from .response_encoding import RISK_PROFILE_ENCODER, get_json_codec
+from .incremental import ScoringState
+from .policy_set import DEFAULT_POLICY_VERSION, get_active_policies
+from .shadow import get_shadow_evaluator
+from .evaluation_context import evaluation_date, evaluated_at, is_date_overridden, set_evaluation_date, reset_evaluation_date
+from .sweep import load_axes, sweep_profiles
+from .batch import MAX_LINE_SIZE, BatchScorer, decode_ndjson_line, iter_ndjson_lines, iter_stream_lines
+from .wire_format import BINARY_MIMETYPE, decode_user_data, encode_risk_profile
+from .errors import DeserializationError, DeserializationErrors, MissingKeyDeserializationError, WriteQueueFullError
 
 bp = Blueprint('api', __name__)
 
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+PROMETHEUS_TEXT_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+MAX_USER_ID_LENGTH = 256
+
+def get_user_id(required):
+    """Returns the `user_id` querystring argument (None if it's missing and
+    not `required`)."""
+    user_id = request.args.get('user_id')
+    if user_id is None and not required:
+        return None
+    if not user_id or len(user_id) > MAX_USER_ID_LENGTH:
+        abort(HTTPStatus.BAD_REQUEST)
+    return user_id
+
+def get_as_of():
+    """Returns the date of the `as_of` querystring argument (e.g.
+    `?as_of=2020-06-30`), or None if it's missing."""
+    as_of_arg = request.args.get('as_of')
+    if as_of_arg is None:
+        return None
+    try:
+        return datetime.date.fromisoformat(as_of_arg)
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST)
+
+@bp.before_request
+def set_request_evaluation_date():
+    # With `?as_of=...`, policies are evaluated at that date (back-dated
+    # quotes) rather than today's.
+    as_of = get_as_of()
+    if as_of is not None:
+        g.evaluation_date_token = set_evaluation_date(as_of)
+
+@bp.teardown_request
+def reset_request_evaluation_date(exc):
+    token = g.pop('evaluation_date_token', None)
+    if token is not None:
+        reset_evaluation_date(token)
+
+def calculate_risk_profile(user_data, policy_timer=None, lines=None):
+    active = get_active_policies()
+    policies = active.policies
+    # Back-dated profiles aren't cached, so they don't invalidate the cache
+    # (see `ProfileCache`) for requests evaluated today.
+    cache = None if is_date_overridden() else get_profile_cache()
+    coalescer = get_coalescer()
+    fingerprint = None if cache is None and coalescer is None else user_data_fingerprint(user_data)
+    if cache is not None:
+        # Only whole profiles are cached, but a cached one has the lines.
+        risk_profile = cache.get(user_data, policies, fingerprint, active.name)
+        if risk_profile is not None:
+            return risk_profile if lines is None else {loi: val for loi, val in risk_profile.items() if loi in lines}
+
+    calculated = []
+
+    def calculate():
+        plan = active.plan_for(lines)
+        risk_profile = RiskProfileCalculator(user_data=user_data, risk_policies=policies, plan=plan, policy_timer=policy_timer, lines=lines).calculate()
+        if cache is not None and lines is None:
+            cache.put(user_data, policies, risk_profile, fingerprint, active.name)
+        calculated.append(None)
+        return risk_profile
+
+    if coalescer is None:
+        return calculate()
+    # Concurrent identical requests share the calculation.
+    risk_profile = coalescer.run((fingerprint, active, evaluation_date(), lines), calculate)
+    if calculated:
+        return risk_profile
+    # Shared with a request that may list the items in another order.
+    return in_item_order(risk_profile, user_data)
+
+def get_lines():
+    """Returns the lines of insurance listed in the `lines` querystring
+    argument (e.g. `?lines=auto,home`), or None if it's missing."""
+    lines_arg = request.args.get('lines')
+    if lines_arg is None:
+        return None
+    try:
+        return frozenset(Loi(name.strip()) for name in lines_arg.split(','))
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST)
+
+def load_json_body():
+    # Same checks as `request.get_json()`, but decoding with the app's codec.
+    if not request.is_json:
+        abort(HTTPStatus.UNSUPPORTED_MEDIA_TYPE)
+    try:
+        return get_json_codec().loads(request.get_data())
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST)
+
+def load_binary_user_data(collect_errors):
+    # Invalid user data raises the same errors as the JSON path; data that
+    # isn't in the binary format is a bad request, like invalid JSON.
+    try:
+        return decode_user_data(request.get_data(), collect_errors)
+    except DeserializationError:
+        raise
+    except ValueError:
+        abort(HTTPStatus.BAD_REQUEST)
+
+def wants_binary():
+    """Whether the `Accept` header prefers the binary format to JSON."""
+    return request.accept_mimetypes.best_match(['application/json', BINARY_MIMETYPE]) == BINARY_MIMETYPE
+
+def json_bytes_response(body, status):
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+def risk_profile_response(risk_profile, status):
+    # Errors are still returned as JSON.
+    if wants_binary():
+        return current_app.response_class(encode_risk_profile(risk_profile), status=status, mimetype=BINARY_MIMETYPE)
+    # Same JSON as `jsonify(RiskProfileSerializer().to_dict(risk_profile))`.
+    return json_bytes_response(RISK_PROFILE_ENCODER.encode(risk_profile), status)
+
+def error_response(err):
+    if isinstance(err, DeserializationErrors):
+        resp = {'error': str(err.errors[0]), 'errors': [str(e) for e in err.errors]}
+        return jsonify(resp), HTTPStatus.UNPROCESSABLE_ENTITY
+    if isinstance(err, DeserializationError):
+        return jsonify({'error': str(err)}), HTTPStatus.UNPROCESSABLE_ENTITY
+    resp = jsonify({'error': 'too many profiles waiting to be stored, try again later'})
+    return resp, HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': '1'}
+
 @bp.route('/risk_profile', methods=['GET', 'POST'])
 def get_risk_profile():
     if request.method == 'POST':
-        user_data_obj = request.get_json()
-        if user_data_obj is None:
-            abort(HTTPStatus.BAD_REQUEST)
+        # With `?user_id=...`, the profile is stored for that user.
+        user_id = get_user_id(required=False)
+        lines = get_lines()
+        metrics = get_metrics()
+        # With `Content-Type: application/x-riskprofiler-binary`, the user
+        # data is in the binary format of `wire_format.py`, which is decoded
+        # in a single stage.
+        binary = request.mimetype == BINARY_MIMETYPE
+        if not binary:
+            with metrics.stage('parse'):
+                user_data_obj = load_json_body()
+            if user_data_obj is None:
+                abort(HTTPStatus.BAD_REQUEST)
+        # With `?errors=all`, every invalid field is reported at once.
+        collect_errors = request.args.get('errors') == 'all'
+        try:
+            with metrics.stage('deserialize'):
+                if binary:
+                    user_data = load_binary_user_data(collect_errors)
+                else:
+                    user_data = UserDataDeserializer().load(user_data_obj, collect_errors=collect_errors)
+            with metrics.stage('calculate'):
+                if user_id is not None:
+                    if binary:
+                        user_data_obj = UserDataSerializer().to_dict(user_data)
+                    # Also keeps what's needed to update the profile with
+                    # PATCH requests later on. The whole profile is stored,
+                    # even if only some `lines` are returned.
+                    risk_profile, state = get_active_policies().incremental_scorer.score(user_data_obj, user_data)
+                else:
+                    policy_timer = metrics.policy_timer(get_active_policies().name)
+                    risk_profile, state = calculate_risk_profile(user_data, policy_timer, lines), None
+            shadow_evaluator = get_shadow_evaluator()
+            if shadow_evaluator is not None and get_active_policies().name == DEFAULT_POLICY_VERSION:
+                # Compared with the candidate policies in the background
+                # (or dropped, if it's behind).
+                shadow_evaluator.submit(user_data, risk_profile, lines if user_id is None else None)
+            if user_id is not None:
+                with metrics.stage('store'):
+                    get_profile_writer().put(user_id, risk_profile, state.encode())
+                if lines is not None:
+                    risk_profile = {loi: val for loi, val in risk_profile.items() if loi in lines}
+            with metrics.stage('serialize'):
+                # JSON, or the binary format of `wire_format.py` if the
+                # `Accept` header prefers it.
+                resp = risk_profile_response(risk_profile, HTTPStatus.CREATED) # Let's return 201 as if it had been saved to the DB.
+            return resp
+        except (DeserializationError, WriteQueueFullError) as err:
+            metrics.count_error(err)
+            return error_response(err)
+    else:
+        # Returns the last profile POSTed with the same `?user_id=...`.
+        user_id = get_user_id(required=True)
+        try:
+            risk_profile = get_profile_writer().get(user_id)
+        except ValueError:
+            # Stored in an unknown format, or corrupted.
+            risk_profile = None
+        if risk_profile is None:
+            return jsonify({'error': 'no risk profile for user "{}"'.format(user_id)}), HTTPStatus.NOT_FOUND
+        return risk_profile_response(risk_profile, HTTPStatus.OK)
+
+@bp.route('/risk_profile', methods=['PATCH'])
+def patch_risk_profile():
+    # Updates the profile stored for `?user_id=...` with some of the user
+    # data (see `incremental.apply_patch`), only applying again the policies
+    # that depend on what changed.
+    user_id = get_user_id(required=True)
+    metrics = get_metrics()
+    with metrics.stage('parse'):
+        patch_obj = load_json_body()
+    writer = get_profile_writer()
+    state = writer.get_state(user_id)
+    if state is not None:
         try:
-            user_data = UserDataDeserializer().load(user_data_obj)
-            risk_profile = RiskProfileCalculator(user_data=user_data).calculate()
+            state = ScoringState.decode(state)
+        except ValueError:
+            # Stored in an unknown format, or corrupted.
+            state = None
+    if state is None:
+        resp = {'error': 'no risk profile to update for user "{}", POST the whole user data first'.format(user_id)}
+        return jsonify(resp), HTTPStatus.NOT_FOUND
+    collect_errors = request.args.get('errors') == 'all'
+    try:
+        with metrics.stage('rescore'):
+            scorer = get_active_policies().incremental_scorer
+            risk_profile, new_state = scorer.rescore(state, patch_obj, collect_errors)
+        with metrics.stage('store'):
+            writer.put(user_id, risk_profile, new_state.encode())
+        with metrics.stage('serialize'):
+            resp = RISK_PROFILE_ENCODER.encode(risk_profile)
+        return json_bytes_response(resp, HTTPStatus.OK)
+    except (DeserializationError, WriteQueueFullError) as err:
+        metrics.count_error(err)
+        return error_response(err)
+
+@bp.route('/risk_profile/sweep', methods=['POST'])
+def post_risk_profile_sweep():
+    # Takes `{"user_data": {...}, "sweep": {"age": {"from": 20, "to": 80},
+    # "income": {"values": [...]}}}` and returns the profiles of the user
+    # for every combination of the swept values (see `sweep.py`).
+    metrics = get_metrics()
+    with metrics.stage('parse'):
+        body = load_json_body()
+    if not isinstance(body, dict):
+        abort(HTTPStatus.BAD_REQUEST)
+    collect_errors = request.args.get('errors') == 'all'
+    try:
+        with metrics.stage('deserialize'):
+            if 'user_data' not in body:
+                raise MissingKeyDeserializationError('user_data')
+            if 'sweep' not in body:
+                raise MissingKeyDeserializationError('sweep')
+            user_data = UserDataDeserializer().load(body['user_data'], collect_errors=collect_errors)
+            axes = load_axes(body['sweep'])
+        with metrics.stage('sweep'):
+            profiles, grid = sweep_profiles(user_data, axes, get_active_policies().policies, RiskScoreValueMapping())
+        with metrics.stage('serialize'):
             serializer = RiskProfileSerializer()
-            resp = serializer.to_dict(risk_profile)
-            return jsonify(resp), HTTPStatus.CREATED # Let's return 201 as if it had been saved to the DB.
-        except MissingKeyDeserializationError as err:
-            return jsonify({'error': str(err)}), HTTPStatus.UNPROCESSABLE_ENTITY
-        except WrongKeyTypeDeserializationError as err:
-            return jsonify({'error': str(err)}), HTTPStatus.UNPROCESSABLE_ENTITY
+            resp = jsonify({
+                'axes': [{'field': axis.field, 'values': axis.values} for axis in axes],
+                'profiles': [serializer.to_dict(profile) for profile in profiles],
+                'grid': grid
+            })
+        return resp, HTTPStatus.OK
+    except DeserializationError as err:
+        metrics.count_error(err)
+        return error_response(err)
+
+def stream_risk_profiles_batch(scorer):
+    # NDJSON bodies are read a line at a time as the results are written,
+    # so memory use doesn't grow with the size of the batch, and the first
+    # results are sent once the first chunk of records is scored.
+    if request.mimetype == NDJSON_MIMETYPE:
+        max_line_size = current_app.config.get('BATCH_MAX_LINE_SIZE', MAX_LINE_SIZE)
+        records, decode = iter_ndjson_lines(iter_stream_lines(request.stream, max_line_size)), decode_ndjson_line
+    else:
+        records, decode = request.get_json(), None
+        if not isinstance(records, list):
+            abort(HTTPStatus.BAD_REQUEST)
+    # The response is written after the view returned (and maybe after
+    # the request's evaluation date was reset), so the whole batch is
+    # evaluated at the date the request started.
+    date = evaluation_date()
+
+    @stream_with_context
+    def generate():
+        with evaluated_at(date):
+            yield from scorer.stream_ndjson(records, decode)
+    return current_app.response_class(generate(), mimetype=NDJSON_MIMETYPE)
+
+@bp.route('/risk_profiles/batch', methods=['POST'])
+def post_risk_profiles_batch():
+    # Accepts either a JSON array of user data objects or an NDJSON body
+    # (one user data object per line). The response is a JSON array with
+    # one entry per input record, in input order (or NDJSON, streamed, with
+    # `Accept: application/x-ndjson`).
+    scorer = BatchScorer(risk_policies=get_active_policies().policies)
+    if request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        return stream_risk_profiles_batch(scorer)
+    if request.mimetype == NDJSON_MIMETYPE:
+        lines = iter_ndjson_lines(request.get_data(as_text=True).splitlines())
+        results = scorer.score_all(lines, decode=decode_ndjson_line)
     else:
-        # Here we could grab the user email through the querystring,
-        # and then see if there's a risk profile for that user in the DB.
-        # (We would also use an ORM for the database model...)
-        resp = {}
-        return jsonify(resp)
+        user_data_objs = request.get_json()
+        if not isinstance(user_data_objs, list):
+            abort(HTTPStatus.BAD_REQUEST)
+        results = scorer.score_all(user_data_objs)
+    return jsonify(list(results)), HTTPStatus.OK
+
+@bp.route('/profile_cache/stats', methods=['GET'])
+def get_profile_cache_stats():
+    cache = get_profile_cache()
+    if cache is None:
+        abort(HTTPStatus.NOT_FOUND)
+    return jsonify(cache.stats())
+
+@bp.route('/coalescing/stats', methods=['GET'])
+def get_coalescing_stats():
+    coalescer = get_coalescer()
+    if coalescer is None:
+        abort(HTTPStatus.NOT_FOUND)
+    return jsonify(coalescer.stats())
+
+@bp.route('/shadow/stats', methods=['GET'])
+def get_shadow_stats():
+    shadow_evaluator = get_shadow_evaluator()
+    if shadow_evaluator is None:
+        abort(HTTPStatus.NOT_FOUND)
+    return jsonify(shadow_evaluator.stats())
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics_text():
+    metrics = get_metrics()
+    if not metrics.enabled:
+        abort(HTTPStatus.NOT_FOUND)
+    return current_app.response_class(metrics.render(), content_type=PROMETHEUS_TEXT_MIMETYPE)
@@ -0,0 +1,141 @@
+import json
+from itertools import islice
+from .serialization import UserDataDeserializer, RiskProfileSerializer
+from .risk_profile_calculator import RiskProfileCalculator, CURRENT_RISK_POLICIES
+from .errors import DeserializationError, InvalidRecordError
+
+# Errors that only invalidate the record being scored, not the whole batch.
+RECORD_ERRORS = (DeserializationError, InvalidRecordError)
+
+try:
+    from .vectorized import calculate_many
+except ImportError: # NumPy is an optional dependency
+    def calculate_many(user_datas, risk_policies=CURRENT_RISK_POLICIES):
+        return [RiskProfileCalculator(user_data=u, risk_policies=risk_policies).calculate() for u in user_datas]
+
+# Default limit of `iter_stream_lines` (and `BATCH_MAX_LINE_SIZE`), in bytes.
+MAX_LINE_SIZE = 1024 * 1024
+
+class OversizedLine:
+    """Stands for a line of `iter_stream_lines` longer than its limit, which
+    was skipped rather than read into memory."""
+    __slots__ = ('limit',)
+
+    def __init__(self, limit):
+        self.limit = limit
+
+def decode_ndjson_line(line):
+    if isinstance(line, OversizedLine):
+        raise InvalidRecordError('line longer than {} bytes'.format(line.limit))
+    try:
+        return json.loads(line)
+    except ValueError as err:
+        raise InvalidRecordError('malformed JSON ({})'.format(err))
+
+def iter_ndjson_lines(lines):
+    """Yields the non-blank lines of an NDJSON document."""
+    for line in lines:
+        if isinstance(line, OversizedLine) or line.strip():
+            yield line
+
+def iter_stream_lines(stream, max_line_size=MAX_LINE_SIZE, block_size=64 * 1024):
+    """Yields the lines of a binary stream (e.g. a request body), reading
+    it `block_size` bytes at a time: iterating over werkzeug's request
+    stream reads lines a byte at a time. Lines longer than `max_line_size`
+    bytes are skipped, and yielded as an `OversizedLine`."""
+    # The start of the current line, kept as a list of pieces so a line
+    # spanning many blocks is only joined once.
+    parts = []
+    size = 0
+    oversized = False
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        pieces = block.split(b'\n')
+        if len(pieces) > 1:
+            # The first piece ends the current line.
+            if oversized or size + len(pieces[0]) > max_line_size:
+                yield OversizedLine(max_line_size)
+            else:
+                parts.append(pieces[0])
+                yield b''.join(parts)
+            if len(block) <= max_line_size:
+                yield from pieces[1:-1]
+            else:
+                for line in pieces[1:-1]:
+                    yield line if len(line) <= max_line_size else OversizedLine(max_line_size)
+            parts = []
+            size = 0
+            oversized = False
+        # The last piece starts the next line.
+        if not oversized:
+            size += len(pieces[-1])
+            if size > max_line_size:
+                oversized = True
+                parts = []
+            else:
+                parts.append(pieces[-1])
+    if oversized:
+        yield OversizedLine(max_line_size)
+    elif size:
+        yield b''.join(parts)
+
+class BatchScorer:
+    """Scores many user data objects, one result entry per object.
+
+    Each entry is either `{'profile': <serialized risk profile>}` or
+    `{'error': <message>}`, so a bad record never fails the whole batch.
+    Records are scored in chunks (vectorized, when NumPy is available)."""
+    CHUNK_SIZE = 1024
+
+    def __init__(self, **kwargs):
+        self.deserializer = UserDataDeserializer() if 'deserializer' not in kwargs else kwargs['deserializer']
+        self.serializer = RiskProfileSerializer() if 'serializer' not in kwargs else kwargs['serializer']
+        self.risk_policies = CURRENT_RISK_POLICIES if 'risk_policies' not in kwargs else kwargs['risk_policies']
+        self.chunk_size = self.CHUNK_SIZE if 'chunk_size' not in kwargs else kwargs['chunk_size']
+
+    def load(self, record, decode=None):
+        user_data_obj = record if decode is None else decode(record)
+        if not isinstance(user_data_obj, dict):
+            raise InvalidRecordError('expected a JSON object')
+        return self.deserializer.load(user_data_obj)
+
+    def score_chunk(self, records, decode=None):
+        """Returns the result entries of a list of records."""
+        entries = [None] * len(records)
+        user_datas = []
+        positions = []
+        for i, record in enumerate(records):
+            try:
+                user_datas.append(self.load(record, decode))
+                positions.append(i)
+            except RECORD_ERRORS as err:
+                entries[i] = {'error': str(err)}
+        profiles = calculate_many(user_datas, self.risk_policies)
+        for i, profile in zip(positions, profiles):
+            entries[i] = {'profile': self.serializer.to_dict(profile)}
+        return entries
+
+    def score_all(self, records, decode=None):
+        """Lazily yields one result entry per record, in input order.
+        `decode`, when given, turns each raw record into a user data object
+        (e.g. `decode_ndjson_line`)."""
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return
+            yield from self.score_chunk(chunk, decode)
+
+    def stream_ndjson(self, records, decode=None):
+        """Same as `score_all`, but yields the entries as NDJSON bytes, one
+        block of lines per chunk of records, so only one chunk is held in
+        memory at a time."""
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return
+            entries = self.score_chunk(chunk, decode)
+            yield ''.join([json.dumps(entry, separators=(',', ':'), sort_keys=True) + '\n' for entry in entries]).encode('utf-8')
@@ -0,0 +1,196 @@
+import csv
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .batch import BatchScorer, decode_ndjson_line
+from .errors import InvalidRecordError
+from .loadgen import HttpTarget, InProcessTarget, LocalServerTarget, make_bodies, parse_mix, run_load
+from .policy_rules import parse_policies
+from .policy_set import DEFAULT_POLICY_VERSION, find_active_policies
+from .risk_profile_calculator import CURRENT_RISK_POLICIES
+
+riskprofiler_cli = AppGroup('riskprofiler', help='Risk profiler commands.')
+
+CSV_INT_COLUMNS = ('age', 'dependents', 'income')
+CSV_JSON_COLUMNS = ('risk_questions', 'houses', 'vehicles')
+
+def decode_csv_row(row):
+    """Turns a CSV row into a user data object. `age`, `dependents` and
+    `income` hold integers; `risk_questions`, `houses` and `vehicles` hold
+    JSON arrays (e.g. `"[0, 1, 0]"`). Other columns are kept as strings."""
+    obj = {}
+    for column, value in row.items():
+        if column is None or value is None:
+            raise InvalidRecordError('row has {} columns than the header'.format('more' if column is None else 'fewer'))
+        if column in CSV_INT_COLUMNS:
+            try:
+                value = int(value)
+            except ValueError:
+                pass # Reported as a wrong type by the deserializer.
+        elif column in CSV_JSON_COLUMNS:
+            try:
+                value = json.loads(value)
+            except ValueError as err:
+                raise InvalidRecordError('malformed JSON in column "{}" ({})'.format(column, err))
+        obj[column] = value
+    return obj
+
+DECODERS = {
+    'ndjson': decode_ndjson_line,
+    'csv': decode_csv_row
+}
+
+# Scorer of the worker processes, set by `init_worker`.
+_scorer = None
+
+def init_worker(definition):
+    """Sets up a worker process to score with the policies of the policy
+    definition file contents `definition` (the built-in policies if None).
+    Policies are parsed again in each worker, as rule policies can't be
+    pickled."""
+    global _scorer
+    _scorer = BatchScorer(risk_policies=CURRENT_RISK_POLICIES if definition is None else parse_policies(definition))
+
+def score_chunk(input_format, numbered_records, scorer=None):
+    """Scores `(record number, raw record)` pairs, returning `(record number,
+    result entry)` pairs (see `BatchScorer`), with `scorer` or the worker
+    process' one."""
+    scorer = _scorer if scorer is None else scorer
+    record_nums = [num for num, _ in numbered_records]
+    entries = scorer.score_chunk([record for _, record in numbered_records], DECODERS[input_format])
+    return list(zip(record_nums, entries))
+
+def read_records(input_file, input_format):
+    """Lazily yields `(record number, raw record)` pairs, numbered from 1."""
+    if input_format == 'csv':
+        return enumerate(csv.DictReader(input_file), start=1)
+    return ((num, line) for num, line in enumerate(input_file, start=1) if line.strip())
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def score_records(numbered_records, input_format, workers, chunk_size, active):
+    """Yields the `(record number, result entry)` pairs of all records,
+    scored with the `ActivePolicies` `active`, in input order. At most
+    `2 * workers` chunks are in flight at any time, so memory use doesn't
+    depend on the number of records."""
+    chunks = chunked(numbered_records, chunk_size)
+    if workers <= 1:
+        scorer = BatchScorer(risk_policies=active.policies)
+        for chunk in chunks:
+            yield from score_chunk(input_format, chunk, scorer)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(active.definition,)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(score_chunk, input_format, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), sort_keys=True)
+
+@riskprofiler_cli.command('score')
+@click.argument('input_file', type=click.File('r'))
+@click.argument('output_file', type=click.File('w'))
+@click.option('--format', 'input_format', type=click.Choice(sorted(DECODERS)), default=None,
+              help='Input format (guessed from the input file extension by default).')
+@click.option('--workers', type=int, default=1, show_default=True,
+              help='Number of worker processes (1 scores in this process).')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=1000, show_default=True,
+              help='Number of records sent to a worker at a time.')
+@click.option('--errors', 'errors_file', type=click.File('w'), default=None,
+              help='NDJSON file receiving the records that could not be scored.')
+@click.option('--policy-version', default=DEFAULT_POLICY_VERSION, show_default=True,
+              help='Policy version to score with (see POLICY_VERSIONS).')
+def score_command(input_file, output_file, input_format, workers, chunk_size, errors_file, policy_version):
+    """Scores the user data in INPUT_FILE (NDJSON or CSV, "-" for stdin),
+    writing one `{"record": <n>, "profile": {...}}` line per scored record to
+    OUTPUT_FILE ("-" for stdout), in input order. Records are scored with the
+    app's policies, like `/risk_profiles/batch` requests."""
+    active = find_active_policies(policy_version)
+    if active is None:
+        raise click.BadParameter('unknown policy version "{}"'.format(policy_version), param_hint='--policy-version')
+    if input_format is None:
+        input_format = 'csv' if input_file.name.endswith('.csv') else 'ndjson'
+    num_scored = 0
+    num_errors = 0
+    records = read_records(input_file, input_format)
+    for record_num, entry in score_records(records, input_format, workers, chunk_size, active):
+        if 'profile' in entry:
+            output_file.write(_dumps({'record': record_num, 'profile': entry['profile']}) + '\n')
+            num_scored += 1
+        else:
+            if errors_file is not None:
+                errors_file.write(_dumps({'record': record_num, 'error': entry['error']}) + '\n')
+            num_errors += 1
+    click.echo('scored {} records, {} errors'.format(num_scored, num_errors), err=True)
+
+def _parse_mix_option(ctx, param, value):
+    try:
+        return parse_mix(value)
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+@riskprofiler_cli.command('load')
+@click.option('--requests', type=click.IntRange(min=1), default=None,
+              help='Number of requests to send (10000 if --duration is not given either).')
+@click.option('--duration', type=click.FloatRange(min=0, min_open=True), default=None,
+              help='Seconds to send requests for.')
+@click.option('--concurrency', type=click.IntRange(min=1), default=8, show_default=True,
+              help='Number of threads sending requests.')
+@click.option('--rate', type=click.FloatRange(min=0, min_open=True), default=None,
+              help='Requests per second to schedule (as fast as responses come back by default).')
+@click.option('--mix', default='typical', show_default=True, callback=_parse_mix_option,
+              help='Synthetic payload kinds and their weights, e.g. "typical=80,large_fleet=5,invalid=15".')
+@click.option('--payloads', type=click.IntRange(min=1), default=1000, show_default=True,
+              help='Number of distinct payloads generated (and sent in turn).')
+@click.option('--seed', type=int, default=0, show_default=True,
+              help='Seed of the payload generator.')
+@click.option('--path', default='/risk_profile', show_default=True,
+              help='Path (and querystring) requests are POSTed to.')
+@click.option('--url', default=None,
+              help='URL of a running server to load (e.g. "http://127.0.0.1:5000/risk_profile").')
+@click.option('--server', is_flag=True,
+              help='Start the app on a local port and load it over HTTP (rather than through its WSGI interface).')
+@click.option('--output', 'output_file', type=click.File('w'), default=None,
+              help='JSON file receiving the results.')
+def load_command(requests, duration, concurrency, rate, mix, payloads, seed, path, url, server, output_file):
+    """POSTs synthetic user data to /risk_profile and reports the throughput
+    and latency percentiles. Requests go through the app in this process
+    unless --url or --server is given. Exits with status 1 if any request
+    failed (no response, or a 5xx status)."""
+    if url is not None and server:
+        raise click.UsageError('--url and --server are mutually exclusive')
+    if requests is None and duration is None:
+        requests = 10000
+    bodies = make_bodies(payloads, mix, seed)
+    if url is not None:
+        target = HttpTarget(url)
+    elif server:
+        target = LocalServerTarget(current_app._get_current_object(), path)
+    else:
+        target = InProcessTarget(current_app._get_current_object(), path)
+    try:
+        result = run_load(target, bodies, requests=requests, duration=duration, concurrency=concurrency, rate=rate)
+    finally:
+        target.close()
+    click.echo(result.report())
+    if output_file is not None:
+        output_file.write(json.dumps(result.to_dict(), indent=2, sort_keys=True) + '\n')
+    if result.failures:
+        raise click.ClickException('{} requests failed'.format(result.failures))
+
+def init_app(app):
+    app.cli.add_command(riskprofiler_cli)
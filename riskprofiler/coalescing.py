@@ -0,0 +1,82 @@
+# Coalescing of identical in-flight calculations: while a request computes
+# the profile of some user data (the leader), concurrent requests for the
+# same key (`user_data_fingerprint`, policies, evaluation date and lines)
+# wait for its result rather than computing it again (the followers). An
+# exception raised by the leader is raised in every follower too.
+#
+# Only calculations in flight are shared; finished ones are forgotten (see
+# `profile_cache.py` for those).
+import threading
+from flask import current_app
+from .metrics import NULL_METRICS
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        # Only created once a follower waits (most calls have none).
+        self.done = None
+        self.result = None
+        self.error = None
+
+class Coalescer:
+    def __init__(self, metrics=NULL_METRICS):
+        self.metrics = metrics
+        self.leaders = 0
+        self.followers = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Number of calculations in flight."""
+        return len(self._calls)
+
+    def run(self, key, calculate):
+        """Returns `calculate()`, or the result of the call already in flight
+        for `key` (the same object). Raises the exception it raised."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                if call.done is None:
+                    call.done = threading.Event()
+                self.followers += 1
+        self.metrics.count_coalesced_request(leader)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = calculate()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                done = call.done
+            if done is not None:
+                done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                # Calculations saved.
+                'followers': self.followers
+            }
+
+def get_coalescer():
+    """Returns the app's `Coalescer`, or None if coalescing is disabled."""
+    return current_app.extensions.get('coalescer')
+
+def init_app(app):
+    app.config.setdefault('COALESCE_REQUESTS', True)
+    if app.config['COALESCE_REQUESTS']:
+        app.extensions['coalescer'] = Coalescer(metrics=app.extensions.get('metrics', NULL_METRICS))
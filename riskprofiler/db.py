@@ -0,0 +1,132 @@
+# SQLite store of computed risk profiles, by client supplied user id.
+#
+# Each thread gets its own connection (kept open across requests, and closed
+# when the thread exits), in WAL mode so reads don't wait for writes.
+# Statements are constant strings with parameters, so every connection
+# prepares each of them once (sqlite3's statement cache) and reuses it
+# afterwards.
+import sqlite3
+import threading
+import time
+import weakref
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from .profile_codec import encode_profile, decode_profile
+
+GET_SQL = 'SELECT profile FROM risk_profile WHERE user_id = ?'
+GET_STATE_SQL = 'SELECT state FROM risk_profile WHERE user_id = ?'
+PUT_SQL = (
+    'INSERT INTO risk_profile (user_id, profile, updated_at, state) VALUES (?, ?, ?, ?) '
+    'ON CONFLICT (user_id) DO UPDATE SET profile = excluded.profile, updated_at = excluded.updated_at, state = excluded.state'
+)
+
+class _ThreadConnection:
+    # Held by a single thread's `threading.local`, so it's collected (and
+    # its finalizer closes the connection) when the thread exits.
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+
+class ProfileStore:
+    def __init__(self, database, schema, clock=time.time):
+        self.database = database
+        self.schema = schema
+        self.clock = clock
+        self._local = threading.local()
+        # Open connections, closed by `close` or when their thread exits.
+        self._connections = set()
+        # Reentrant: dropping a thread's connection (e.g. in `close`) may run
+        # its finalizer, which takes the lock too.
+        self._lock = threading.RLock()
+
+    def connection(self):
+        """Returns the calling thread's connection, opening it (and creating
+        the schema if the database is new) on first use."""
+        thread_conn = getattr(self._local, 'thread_conn', None)
+        if thread_conn is not None:
+            return thread_conn.conn
+        # Only used by this thread, except by `close` and the finalizer.
+        conn = sqlite3.connect(self.database, timeout=30, cached_statements=64, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        # Durable at checkpoints rather than at every commit, which is
+        # safe in WAL mode (a crash may only lose the last commits).
+        conn.execute('PRAGMA synchronous = NORMAL')
+        with self._lock:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'risk_profile'"
+            ).fetchone()
+            if exists is None:
+                conn.executescript(self.schema)
+            elif 'state' not in [row[1] for row in conn.execute('PRAGMA table_info(risk_profile)')]:
+                # Databases created before states were stored.
+                conn.execute('ALTER TABLE risk_profile ADD COLUMN state BLOB')
+            self._connections.add(conn)
+        thread_conn = self._local.thread_conn = _ThreadConnection(conn)
+        # Threads come and go (e.g. one per HTTP connection with werkzeug's
+        # threaded server), so their connections mustn't outlive them.
+        weakref.finalize(thread_conn, self._release, conn)
+        return conn
+
+    def _release(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+        conn.close()
+
+    def get(self, user_id):
+        """Returns the stored risk profile of `user_id`, or None."""
+        row = self.connection().execute(GET_SQL, (user_id,)).fetchone()
+        return None if row is None else decode_profile(row[0])
+
+    def get_state(self, user_id):
+        """Returns the encoded scoring state stored with the profile of
+        `user_id`, or None."""
+        row = self.connection().execute(GET_STATE_SQL, (user_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, user_id, risk_profile, state=None):
+        conn = self.connection()
+        with conn:
+            conn.execute(PUT_SQL, (user_id, encode_profile(risk_profile), self.clock(), state))
+
+    def put_many(self, profiles_for_user_id):
+        """Stores `(user id, risk profile)` or `(user id, risk profile, encoded
+        scoring state)` tuples in a single transaction."""
+        conn = self.connection()
+        now = self.clock()
+        with conn:
+            conn.executemany(PUT_SQL, (
+                (entry[0], encode_profile(entry[1]), now, entry[2] if len(entry) > 2 else None)
+                for entry in profiles_for_user_id
+            ))
+
+    def reset(self):
+        """Drops every stored profile, recreating the schema."""
+        conn = self.connection()
+        with self._lock:
+            conn.executescript(self.schema)
+
+    def close(self):
+        """Closes the connections of every thread."""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self._local = threading.local()
+
+def get_profile_store():
+    return current_app.extensions['profile_store']
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Clear the existing data and create new tables."""
+    get_profile_store().reset()
+    click.echo('Initialized the database.')
+
+def init_app(app):
+    with app.open_resource('schema.sql') as f:
+        schema = f.read().decode('utf8')
+    app.extensions['profile_store'] = ProfileStore(app.config['DATABASE'], schema)
+    app.cli.add_command(init_db_command)
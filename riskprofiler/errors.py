@@ -7,14 +7,17 @@ class InvalidRiskScoreOperation(OriginAdvisorError):
 class ItemDataKeyNotUnique(OriginAdvisorError):
     "Duplicated item data key"
 
-class MissingKeyDeserializationError(OriginAdvisorError):
+class DeserializationError(OriginAdvisorError):
+    "Serialized object doesn't match the expected schema"
+
+class MissingKeyDeserializationError(DeserializationError):
     def __init__(self, key):
         self.key = key
     
     def __str__(self):
         return 'missing key "{}" in serialized object'.format(self.key)
 
-class WrongKeyTypeDeserializationError(OriginAdvisorError):
+class WrongKeyTypeDeserializationError(DeserializationError):
     def __init__(self, key, actual_type, expected_type):
         self.key = key
         self.actual_type = actual_type
@@ -22,3 +25,39 @@ class WrongKeyTypeDeserializationError(OriginAdvisorError):
     
     def __str__(self):
         return 'key "{}" in serialized object has wrong type "{}" (expected "{}") '.format(self.key, self.actual_type, self.expected_type)
+
+# Also a ValueError, which is what the enum `from_str` methods raise.
+class InvalidValueDeserializationError(DeserializationError, ValueError):
+    def __init__(self, key, value, reason):
+        self.key = key
+        self.value = value
+        self.reason = reason
+
+    def __str__(self):
+        return 'key "{}" in serialized object has invalid value {!r} ({})'.format(self.key, self.value, self.reason)
+
+class DeserializationErrors(DeserializationError):
+    "All the errors found in a serialized object"
+    def __init__(self, errors):
+        self.errors = errors
+
+    def __str__(self):
+        return '; '.join(str(err) for err in self.errors)
+
+class InvalidRecordError(OriginAdvisorError):
+    def __init__(self, reason):
+        self.reason = reason
+
+    def __str__(self):
+        return 'invalid record: {}'.format(self.reason)
+
+class WriteQueueFullError(OriginAdvisorError):
+    "The write-behind queue stayed full for longer than the put timeout"
+
+class PolicyDefinitionError(OriginAdvisorError):
+    def __init__(self, where, reason):
+        self.where = where
+        self.reason = reason
+
+    def __str__(self):
+        return 'invalid policy definition at "{}": {}'.format(self.where, self.reason)
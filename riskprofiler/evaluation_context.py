@@ -0,0 +1,93 @@
+# The date risk policies are evaluated at. Policies built without a
+# `curr_date` (e.g. those of `CURRENT_RISK_POLICIES`) read it from the
+# current `EvaluationContext` when they're applied: today's by default
+# (checked on every call, so long-lived workers follow day rollovers), or
+# one set for a block of code with `evaluated_at` (e.g. a request for a
+# back-dated quote, see `api.py`).
+#
+# A context also caches what's derived from its date, like the first
+# production year of recent vehicles, so that's computed once per day (and
+# vehicle checks are integer comparisons).
+import contextlib
+import contextvars
+import datetime
+import threading
+from functools import lru_cache
+from .user_data import first_year_within, first_year_under
+
+class EvaluationContext:
+    __slots__ = ('date', '_first_years', '_first_years_under')
+
+    def __init__(self, date):
+        self.date = date
+        self._first_years = {}
+        self._first_years_under = {}
+
+    def first_year_within(self, num_years):
+        """Same as `user_data.first_year_within(num_years, self.date)`."""
+        year = self._first_years.get(num_years)
+        if year is None:
+            year = self._first_years[num_years] = first_year_within(num_years, self.date)
+        return year
+
+    def first_year_under(self, num_years):
+        """Same as `user_data.first_year_under(num_years, self.date)`."""
+        year = self._first_years_under.get(num_years)
+        if year is None:
+            year = self._first_years_under[num_years] = first_year_under(num_years, self.date)
+        return year
+
+_current = contextvars.ContextVar('evaluation_context', default=None)
+_today = EvaluationContext(datetime.date.today())
+_today_lock = threading.Lock()
+
+def _today_context():
+    global _today
+    today = datetime.date.today()
+    context = _today
+    if context.date != today:
+        with _today_lock:
+            if _today.date != today:
+                _today = EvaluationContext(today)
+            context = _today
+    return context
+
+def get_evaluation_context():
+    """Returns the current `EvaluationContext`."""
+    context = _current.get()
+    return _today_context() if context is None else context
+
+def is_date_overridden():
+    """Whether the current context was set by `evaluated_at` or
+    `set_evaluation_date` (rather than being today's)."""
+    return _current.get() is not None
+
+@lru_cache(maxsize=64)
+def _fixed_context(date):
+    return EvaluationContext(date)
+
+def context_for(curr_date):
+    """Returns the `EvaluationContext` of a policy's `curr_date`: the current
+    one if it's None, a (cached) one for that date otherwise."""
+    return get_evaluation_context() if curr_date is None else _fixed_context(curr_date)
+
+def evaluation_date():
+    """Returns the date of the current `EvaluationContext`."""
+    return get_evaluation_context().date
+
+def set_evaluation_date(date):
+    """Makes `date` the date of the current context (None for today's),
+    returning the token to pass to `reset_evaluation_date`."""
+    return _current.set(None if date is None else _fixed_context(date))
+
+def reset_evaluation_date(token):
+    _current.reset(token)
+
+@contextlib.contextmanager
+def evaluated_at(date):
+    """Evaluates policies at `date` (None for today) within the block."""
+    token = set_evaluation_date(date)
+    try:
+        yield
+    finally:
+        reset_evaluation_date(token)
@@ -0,0 +1,295 @@
+# Incremental re-scoring of partially updated user data.
+#
+# Policies only read the user data (never the scores), so applying a policy
+# amounts to a fixed list of `RiskScoring` operations, its trace. A
+# `ScoringState` keeps the serialized user data and the trace of every
+# policy; after an update, only the policies reading a changed field are
+# applied again, and the profile is rebuilt by replaying all the traces.
+#
+# Policies declaring an `item_wise` collection (e.g. `RecentVehiclePolicy`
+# for vehicles) apply to each item on its own, so their traces are kept per
+# item and only the changed items are evaluated again.
+import hashlib
+import marshal
+from .errors import InvalidRiskScoreOperation, WrongKeyTypeDeserializationError
+from .evaluation_context import evaluation_date
+from .line_of_insurance import LOI_ORDINAL
+from .policy_compiler import _add, _add_to_item, slots_as_profile
+from .risk_profile_calculator import CURRENT_RISK_POLICIES, RiskScoreValueMapping
+from .serialization import UserDataDeserializer
+from .user_data import ItemDataCollection, UserData
+
+# Format version of encoded states (and of the marshal data in them).
+STATE_HEADER = b'RPS1' + bytes((marshal.version,))
+USER_DATA_FIELDS = ('age', 'gender', 'marital_status', 'dependents', 'income', 'houses', 'vehicles', 'risk_questions')
+ITEM_FIELDS = ('houses', 'vehicles')
+# Valid stand-ins for the fields not read by the policies applied again.
+PLACEHOLDER_USER_DATA_OBJ = {
+    'age': 0, 'gender': 'male', 'marital_status': 'single', 'dependents': 0, 'income': 0,
+    'houses': [], 'vehicles': [], 'risk_questions': []
+}
+
+# Trace operations are `(code, slot, item key, value)` tuples, slots being
+# `LOI_ORDINAL`s. `CREATE` values are None for multiple item
+# lines; subtractions are recorded as additions of negative points.
+CREATE, CREATE_ITEM, ADD, DISABLE = range(4)
+
+class TraceRecorder:
+    """Stands for a `RiskScoring`, recording the operations applied to it."""
+    def __init__(self):
+        self.ops = []
+
+    def create(self, **kwargs):
+        multiple_items = kwargs['multiple_items'] if 'multiple_items' in kwargs else False
+        self.ops.append((CREATE, LOI_ORDINAL[kwargs['loi']], None, None if multiple_items else kwargs['score']))
+
+    def create_item(self, **kwargs):
+        self.ops.append((CREATE_ITEM, LOI_ORDINAL[kwargs['loi']], kwargs['item'], kwargs['score']))
+
+    def add(self, **kwargs):
+        self.ops.append((ADD, LOI_ORDINAL[kwargs['loi']], kwargs['item'] if 'item' in kwargs else None, kwargs['points']))
+
+    def subtract(self, **kwargs):
+        self.ops.append((ADD, LOI_ORDINAL[kwargs['loi']], kwargs['item'] if 'item' in kwargs else None, -kwargs['points']))
+
+    def disable(self, **kwargs):
+        self.ops.append((DISABLE, LOI_ORDINAL[kwargs['loi']], None, None))
+
+def replay(ops, slots):
+    """Applies recorded operations to a slot array (see `policy_compiler`),
+    with the same results as applying them to a `RiskScoring`."""
+    for code, slot, item, value in ops:
+        if code == ADD:
+            if item is None:
+                _add(slots, slot, value)
+            else:
+                _add_to_item(slots, slot, item, value)
+        elif code == CREATE_ITEM:
+            score = slots[slot]
+            if score is not None:
+                if type(score) is not dict:
+                    raise InvalidRiskScoreOperation
+                score[item] = value
+        elif code == CREATE:
+            slots[slot] = {} if value is None else value
+        else:
+            slots[slot] = None
+
+def policies_signature(policies):
+    """Identifies a policy list, parameters included (e.g. the `curr_date`
+    of `RecentVehiclePolicy`): traces recorded with other policies can't be
+    reused. Private attributes (e.g. compiled code) aren't parameters."""
+    description = [
+        (type(p).__name__, sorted((name, value) for name, value in vars(p).items() if not name.startswith('_')))
+        for p in policies
+    ]
+    return hashlib.blake2b(repr(description).encode('utf-8'), digest_size=16).hexdigest()
+
+def _items_by_key(items_obj):
+    return {item['key']: item for item in items_obj}
+
+def _with_single_item(user_data, field, item):
+    items = ItemDataCollection(item)
+    return UserData(
+        age=user_data.age,
+        gender=user_data.gender,
+        marital_status=user_data.marital_status,
+        dependents=user_data.dependents,
+        income=user_data.income,
+        houses=items if field == 'houses' else ItemDataCollection(),
+        vehicles=items if field == 'vehicles' else ItemDataCollection(),
+        risk_questions=user_data.risk_questions
+    )
+
+def apply_patch(user_data_obj, patch_obj):
+    """Returns a copy of the serialized user data `user_data_obj` updated with
+    `patch_obj`: fields in it replace those of `user_data_obj`, except houses
+    and vehicles, which are added or replaced by key. Keys listed in
+    `removed_houses` and `removed_vehicles` are removed."""
+    obj = dict(user_data_obj)
+    for field in USER_DATA_FIELDS:
+        if field not in patch_obj:
+            continue
+        if field not in ITEM_FIELDS:
+            obj[field] = patch_obj[field]
+            continue
+        if type(patch_obj[field]) is not list:
+            raise WrongKeyTypeDeserializationError(field, type(patch_obj[field]), list)
+        items = list(obj[field])
+        index_for_key = {item['key']: index for index, item in enumerate(items)}
+        for item in patch_obj[field]:
+            key = item.get('key') if type(item) is dict else None
+            # Invalid items are added as they are, for the deserializer to
+            # report them.
+            index = index_for_key.get(key) if type(key) is int else None
+            if index is None:
+                items.append(item)
+            else:
+                items[index] = item
+        obj[field] = items
+    for field in ITEM_FIELDS:
+        removed_field = 'removed_' + field
+        if removed_field not in patch_obj:
+            continue
+        removed = patch_obj[removed_field]
+        if type(removed) is not list:
+            raise WrongKeyTypeDeserializationError(removed_field, type(removed), list)
+        removed = set(key for key in removed if type(key) is int)
+        obj[field] = [item for item in obj[field] if type(item) is not dict or item.get('key') not in removed]
+    return obj
+
+def same_value(a, b):
+    """Whether two deserialized JSON values are equal, with the same types
+    (unlike `==`, `True` isn't `1` and `35.0` isn't `35`, so a value of the
+    wrong type is never taken as unchanged and left unvalidated)."""
+    if type(a) is not type(b):
+        return False
+    if type(a) is list:
+        return len(a) == len(b) and all(same_value(x, y) for x, y in zip(a, b))
+    if type(a) is dict:
+        return a.keys() == b.keys() and all(same_value(a[key], b[key]) for key in a)
+    return a == b
+
+def changed_fields(old_obj, new_obj):
+    """Returns the changed fields and, for houses and vehicles, the keys of
+    the added or changed items. A reordering of items changes the field but
+    no item."""
+    fields = set()
+    changed_keys = {}
+    for field in USER_DATA_FIELDS:
+        if same_value(old_obj[field], new_obj[field]):
+            continue
+        fields.add(field)
+        if field in ITEM_FIELDS:
+            old_items = _items_by_key(old_obj[field])
+            changed_keys[field] = {
+                key for key, item in _items_by_key(new_obj[field]).items()
+                if not same_value(old_items.get(key), item)
+            }
+    return fields, changed_keys
+
+class ScoringState:
+    def __init__(self, signature, user_data_obj, traces):
+        self.signature = signature
+        self.user_data_obj = user_data_obj
+        # One entry per policy: a list of operations, or for item-wise
+        # policies a dict of item key to list of operations.
+        self.traces = traces
+
+    def encode(self):
+        # marshal is much faster than JSON for these nested lists. States
+        # are only read from our own database (see `decode`).
+        return STATE_HEADER + marshal.dumps((self.signature, self.user_data_obj, self.traces))
+
+    @classmethod
+    def decode(cls, data):
+        """Inverse of `encode`. Raises a `ValueError` for data in an unknown
+        format (the profile must then be POSTed again)."""
+        if data[:len(STATE_HEADER)] != STATE_HEADER:
+            raise ValueError('unknown scoring state format')
+        try:
+            signature, user_data_obj, traces = marshal.loads(data[len(STATE_HEADER):])
+        except (EOFError, TypeError, ValueError):
+            raise ValueError('corrupted scoring state')
+        return cls(signature, user_data_obj, traces)
+
+class IncrementalScorer:
+    def __init__(self, policies=CURRENT_RISK_POLICIES, mapping=None):
+        self.policies = list(policies)
+        self.mapping = RiskScoreValueMapping() if mapping is None else mapping
+        self.deserializer = UserDataDeserializer()
+        self.signature = policies_signature(self.policies)
+
+    def _state_signature(self):
+        # Traces also depend on the evaluation date (policies without a
+        # `curr_date` read it from the `EvaluationContext`).
+        return '{}@{}'.format(self.signature, evaluation_date().isoformat())
+
+    def _trace(self, policy, user_data):
+        item_field = getattr(policy, 'item_wise', None)
+        if item_field is None:
+            recorder = TraceRecorder()
+            policy.apply(user_data, recorder)
+            return recorder.ops
+        items = user_data.houses() if item_field == 'houses' else user_data.vehicles()
+        return {item.item_key(): self._item_trace(policy, user_data, item_field, item) for item in items}
+
+    def _item_trace(self, policy, user_data, item_field, item):
+        recorder = TraceRecorder()
+        policy.apply(_with_single_item(user_data, item_field, item), recorder)
+        return recorder.ops
+
+    def _profile(self, traces, user_data_obj):
+        slots = [None] * len(LOI_ORDINAL)
+        for policy, trace in zip(self.policies, traces):
+            if isinstance(trace, dict):
+                # In item order, like applying the policy to all items.
+                for item in user_data_obj[policy.item_wise]:
+                    replay(trace[item['key']], slots)
+            else:
+                replay(trace, slots)
+        return slots_as_profile(slots, self.mapping)
+
+    def score(self, user_data_obj, user_data=None):
+        """Returns the risk profile of the serialized user data
+        `user_data_obj` (deserialized as `user_data`, if given) along with
+        its `ScoringState`. Raises a `DeserializationError` for invalid user
+        data."""
+        if user_data is None:
+            user_data = self.deserializer.load(user_data_obj)
+        user_data_obj = {field: user_data_obj[field] for field in USER_DATA_FIELDS}
+        traces = [self._trace(policy, user_data) for policy in self.policies]
+        state = ScoringState(self._state_signature(), user_data_obj, traces)
+        return self._profile(traces, user_data_obj), state
+
+    def rescore(self, state, patch_obj, collect_errors=False):
+        """Returns the risk profile and `ScoringState` of the user data in
+        `state` updated with `patch_obj` (see `apply_patch`), applying again
+        only the policies that read what changed."""
+        if type(patch_obj) is not dict:
+            raise WrongKeyTypeDeserializationError('patch', type(patch_obj), dict)
+        new_obj = apply_patch(state.user_data_obj, patch_obj)
+        if state.signature != self._state_signature():
+            return self.score(new_obj, self.deserializer.load(new_obj, collect_errors=collect_errors))
+        fields, changed_keys = changed_fields(state.user_data_obj, new_obj)
+
+        # What to do with each trace: keep it, evaluate the policy again for
+        # the changed items only, or evaluate the policy again.
+        actions = []
+        needed = set(fields)
+        for policy, trace in zip(self.policies, state.traces):
+            reads = getattr(policy, 'reads', None)
+            if reads is not None and reads.isdisjoint(fields):
+                actions.append('keep')
+            elif isinstance(trace, dict) and reads == {policy.item_wise}:
+                actions.append('items')
+            else:
+                actions.append('all')
+                needed.update(USER_DATA_FIELDS if reads is None else reads)
+        # Only the fields that changed (which validates them) and those read
+        # by the policies applied again are deserialized. The unchanged
+        # fields were valid already.
+        partial_obj = {
+            field: new_obj[field] if field in needed else PLACEHOLDER_USER_DATA_OBJ[field]
+            for field in USER_DATA_FIELDS
+        }
+        user_data = self.deserializer.load(partial_obj, collect_errors=collect_errors)
+
+        traces = []
+        for policy, trace, action in zip(self.policies, state.traces, actions):
+            if action == 'keep':
+                traces.append(trace)
+            elif action == 'items':
+                items = user_data.houses() if policy.item_wise == 'houses' else user_data.vehicles()
+                keys = changed_keys[policy.item_wise]
+                traces.append({
+                    item.item_key(): (
+                        self._item_trace(policy, user_data, policy.item_wise, item)
+                        if item.item_key() in keys else trace[item.item_key()]
+                    )
+                    for item in items
+                })
+            else:
+                traces.append(self._trace(policy, user_data))
+        new_state = ScoringState(state.signature, new_obj, traces)
+        return self._profile(traces, new_obj), new_state
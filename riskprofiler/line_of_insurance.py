@@ -11,3 +11,6 @@ class Loi(Enum):
     @staticmethod
     def all_lines():
         return (Loi.life, Loi.disability, Loi.home, Loi.auto)
+
+# Position of each line in `Loi.all_lines()`, for array-backed structures.
+LOI_ORDINAL = {loi: i for i, loi in enumerate(Loi.all_lines())}
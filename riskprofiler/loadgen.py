@@ -0,0 +1,294 @@
+# Load generator for `/risk_profile`: POSTs synthetic user data payloads
+# (see `synthetic.py`) from a pool of threads, either to an app in this
+# process (through its WSGI interface, with Flask's test client) or to a
+# server over HTTP, and measures the throughput and latency percentiles.
+#
+# There are two ways to drive the load:
+#
+# - closed loop (no `rate`): each of the `concurrency` threads sends its
+#   next request as soon as the previous one got its response, so the
+#   throughput measured is the one the app sustains at that concurrency;
+# - open loop (a `rate` in requests per second): requests are scheduled at
+#   a fixed rate and their latency is measured from the time they were
+#   scheduled, so a stalled app shows up in the percentiles instead of
+#   slowing the load down (coordinated omission).
+#
+# Payloads are generated and encoded before the run, so that's not timed.
+# Latencies are kept in a `LatencyHistogram`, whose buckets are about 1%
+# wide, so memory use doesn't depend on the number of requests.
+import http.client
+import itertools
+import json
+import math
+import threading
+import time
+from urllib.parse import urlsplit
+from werkzeug.serving import WSGIRequestHandler, make_server
+from .synthetic import GENERATOR_KINDS, SyntheticUserDataGenerator
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Status of the requests that failed before getting a response.
+CONNECTION_ERROR = 'error'
+
+class LatencyHistogram:
+    """Histogram of latencies (in seconds) with log-spaced buckets: bucket
+    `i` holds latencies in `[base ** i, base ** (i + 1))` microseconds."""
+    def __init__(self, base=1.01):
+        self.base = base
+        self._log_base = math.log(base)
+        # bucket index: count
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        index = int(math.log(max(seconds * 1e6, 1.0)) / self._log_base)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def _bucket_bounds(self, index):
+        return self.base ** index / 1e6, self.base ** (index + 1) / 1e6
+
+    def percentile(self, percent):
+        """Returns the latency `percent`% of the latencies are lower than or
+        equal to (within a bucket width), or None if there are none."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def buckets(self, num_buckets=10):
+        """Returns `(upper bound, count)` pairs over `num_buckets` coarser,
+        log-spaced buckets spanning the recorded latencies."""
+        if not self.count:
+            return []
+        low, high = min(self.counts), max(self.counts) + 1
+        step = max(1, math.ceil((high - low) / num_buckets))
+        coarse = {}
+        for index, count in self.counts.items():
+            coarse_index = (index - low) // step
+            coarse[coarse_index] = coarse.get(coarse_index, 0) + count
+        return [
+            (self._bucket_bounds(min(low + (i + 1) * step, high) - 1)[1], coarse.get(i, 0))
+            for i in range((high - low + step - 1) // step)
+        ]
+
+class LoadTestResult:
+    def __init__(self, histogram, statuses, duration):
+        self.histogram = histogram
+        # status code (or `CONNECTION_ERROR`): number of requests
+        self.statuses = statuses
+        self.duration = duration
+
+    @property
+    def requests(self):
+        return self.histogram.count
+
+    @property
+    def throughput(self):
+        """Requests per second."""
+        return self.requests / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def failures(self):
+        """Requests without a response or with a server error status."""
+        return sum(count for status, count in self.statuses.items() if status == CONNECTION_ERROR or status >= 500)
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'duration': self.duration,
+            'throughput': self.throughput,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items(), key=lambda item: str(item[0]))},
+            'latency': {
+                'mean': self.histogram.mean(),
+                'max': self.histogram.max,
+                **{'p{:g}'.format(p): self.histogram.percentile(p) for p in PERCENTILES}
+            }
+        }
+
+    def report(self):
+        """Returns a human readable summary of the run."""
+        lines = [
+            '{} requests in {:.2f} s: {:.1f} requests/s'.format(self.requests, self.duration, self.throughput),
+            'statuses: ' + ', '.join('{}: {}'.format(status, count) for status, count in sorted(self.statuses.items(), key=lambda item: str(item[0]))),
+            'latency: ' + ', '.join('p{:g} {}'.format(p, _format_ms(self.histogram.percentile(p))) for p in PERCENTILES) + ', max {}'.format(_format_ms(self.histogram.max))
+        ]
+        buckets = self.histogram.buckets()
+        widest = max((count for _, count in buckets), default=0)
+        for upper_bound, count in buckets:
+            bar = '#' * (round(40 * count / widest) if widest else 0)
+            lines.append('  <= {:>10} {:>8} {}'.format(_format_ms(upper_bound), count, bar))
+        return '\n'.join(lines)
+
+def _format_ms(seconds):
+    return '-' if seconds is None else '{:.3f} ms'.format(seconds * 1e3)
+
+def parse_mix(mix_arg):
+    """Parses a payload mix like `typical=80,large_fleet=5,invalid=15` into
+    a mapping of synthetic payload kind to weight."""
+    mix = {}
+    for part in mix_arg.split(','):
+        kind, sep, weight = part.strip().partition('=')
+        if kind not in GENERATOR_KINDS:
+            raise ValueError('unknown payload kind "{}" (expected one of {})'.format(kind, ', '.join(GENERATOR_KINDS)))
+        try:
+            mix[kind] = float(weight) if sep else 1.0
+        except ValueError:
+            raise ValueError('invalid weight "{}" for payload kind "{}"'.format(weight, kind))
+        if mix[kind] < 0:
+            raise ValueError('negative weight for payload kind "{}"'.format(kind))
+    if not any(mix.values()):
+        raise ValueError('the payload mix has no weight')
+    return mix
+
+def make_bodies(count, mix=None, seed=0):
+    """Returns `count` JSON encoded synthetic payloads."""
+    generator = SyntheticUserDataGenerator(seed=seed)
+    return [json.dumps(payload).encode('utf-8') for payload in generator.payloads(count, mix)]
+
+class InProcessTarget:
+    """Sends requests to a Flask app through its WSGI interface."""
+    def __init__(self, app, path='/risk_profile'):
+        self.app = app
+        self.path = path
+
+    def connect(self):
+        client = self.app.test_client()
+
+        def post(body):
+            return client.post(self.path, data=body, content_type='application/json').status_code
+        return post
+
+    def close(self):
+        pass
+
+class HttpTarget:
+    """Sends requests to a server over HTTP/1.1, with one persistent
+    connection per thread."""
+    def __init__(self, url, timeout=10.0):
+        parts = urlsplit(url)
+        if parts.scheme != 'http':
+            raise ValueError('only http:// URLs are supported')
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = (parts.path or '/risk_profile') + ('?' + parts.query if parts.query else '')
+        self.timeout = timeout
+
+    def connect(self):
+        state = {'conn': None}
+        headers = {'Content-Type': 'application/json'}
+
+        def post(body):
+            if state['conn'] is None:
+                state['conn'] = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            conn = state['conn']
+            try:
+                conn.request('POST', self.path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                state['conn'] = None
+                raise
+        return post
+
+    def close(self):
+        pass
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+class LocalServerTarget(HttpTarget):
+    """Starts `app` on a free local port (in a background thread, with
+    werkzeug's threaded server) and sends requests to it over HTTP."""
+    def __init__(self, app, path='/risk_profile', timeout=10.0):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietRequestHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name='loadgen-server', daemon=True)
+        self.thread.start()
+        super().__init__('http://127.0.0.1:{}{}'.format(self.server.server_port, path), timeout)
+
+    def close(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+def run_load(target, bodies, requests=None, duration=None, concurrency=1, rate=None, clock=time.perf_counter):
+    """POSTs `bodies` (cycling through them) to `target` from `concurrency`
+    threads, until `requests` were sent or for `duration` seconds. With a
+    `rate` (requests per second), requests are scheduled at that rate (open
+    loop); otherwise each thread sends them back to back (closed loop).
+    Returns a `LoadTestResult`."""
+    if requests is None and duration is None:
+        raise ValueError('either requests or duration is needed')
+    if not bodies:
+        raise ValueError('no payloads to send')
+    # Request numbers, shared by the threads (`next` on `itertools.count`
+    # is atomic).
+    numbers = itertools.count()
+    start = clock()
+    deadline = None if duration is None else start + duration
+    histograms = []
+    statuses = []
+
+    def worker():
+        histogram = LatencyHistogram()
+        status_counts = {}
+        post = target.connect()
+        while True:
+            number = next(numbers)
+            if requests is not None and number >= requests:
+                break
+            if rate is None:
+                scheduled = clock()
+            else:
+                scheduled = start + number / rate
+                delay = scheduled - clock()
+                if delay > 0:
+                    time.sleep(delay)
+            if deadline is not None and scheduled >= deadline:
+                break
+            try:
+                status = post(bodies[number % len(bodies)])
+            except (OSError, http.client.HTTPException):
+                status = CONNECTION_ERROR
+            histogram.record(clock() - scheduled)
+            status_counts[status] = status_counts.get(status, 0) + 1
+        histograms.append(histogram)
+        statuses.append(status_counts)
+
+    threads = [threading.Thread(target=worker, name='loadgen-{}'.format(i)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = clock() - start
+    histogram = LatencyHistogram()
+    status_counts = {}
+    for worker_histogram, worker_statuses in zip(histograms, statuses):
+        histogram.merge(worker_histogram)
+        for status, count in worker_statuses.items():
+            status_counts[status] = status_counts.get(status, 0) + count
+    return LoadTestResult(histogram, status_counts, elapsed)
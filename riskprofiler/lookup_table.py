@@ -0,0 +1,127 @@
+# Precomputed scores of the single item lines of insurance (life and
+# disability). With the built-in policy types, their scores only depend on
+# a few features of the user data:
+#
+# - the base score (the sum of the risk questions), which every policy adds
+#   its points to;
+# - the age bucket of `AgePolicy` (under 30, under 40, 40 to 60, over 60);
+# - whether the income is above zero (`NoIncomePolicy`) and above the
+#   threshold of `LargeIncomePolicy`;
+# - whether there are mortgaged houses, dependents, and whether the user is
+#   married.
+#
+# `build_single_item_line_table` runs the policies over user data made up
+# for every combination of the features other than the base score, and
+# keeps what they add to it (or None if the line ends up disabled or
+# missing). Scoring those lines then takes one index computation instead
+# of applying each policy (see `CompiledPolicyPlan`). Combinations the
+# policies' parameters made unreachable when the table was built (e.g.
+# incomes of at most zero above a negative threshold) have no entry, and
+# are scored by applying the policies.
+from .line_of_insurance import Loi
+from .risk_policies import InitialRiskPolicy, NoIncomePolicy, AgePolicy, LargeIncomePolicy, MortgagedHousePolicy, DependentsPolicy, MaritalStatusPolicy
+from .risk_scoring import RiskScoring
+from .user_data import UserData, ItemDataCollection, HouseItemData, HouseStatus, Gender, MaritalStatus
+
+SINGLE_ITEM_LINES = frozenset((Loi.life, Loi.disability))
+
+# Policy types whose changes to the single item lines only depend on the
+# features above (exact types, since a subclass may override `apply`).
+TABLE_POLICY_TYPES = frozenset((
+    InitialRiskPolicy, NoIncomePolicy, AgePolicy, LargeIncomePolicy,
+    MortgagedHousePolicy, DependentsPolicy, MaritalStatusPolicy
+))
+
+# One age in each bucket of `AgePolicy`.
+AGE_BUCKET_AGES = (20, 35, 50, 70)
+
+class _NoLargeIncome:
+    large_income_thresh = float('inf')
+
+class SingleItemLineTable:
+    """Life and disability score offsets (from the base score) by feature
+    combination, in a flat tuple indexed by `index`."""
+    # Label of the table lookup in policy timings (see `metrics.py`).
+    name = 'single_item_line_table'
+
+    def __init__(self, entries, large_income_policy=None):
+        # (life offset, disability offset) for each index, None for the
+        # combinations that couldn't be built.
+        self.entries = tuple(entries)
+        # Its threshold is read on every lookup, like the compiled steps do.
+        self.large_income_policy = _NoLargeIncome if large_income_policy is None else large_income_policy
+
+    def index(self, user_data):
+        age = user_data.age
+        income = user_data.income
+        return (
+            (0 if age < 30 else 1 if age < 40 else 3 if age > 60 else 2) << 5
+            | (income > 0) << 4
+            | (income > self.large_income_policy.large_income_thresh) << 3
+            | user_data.has_mortgaged_houses() << 2
+            | (user_data.dependents > 0) << 1
+            | user_data.is_married()
+        )
+
+    def lookup(self, user_data):
+        """Returns the `(life offset, disability offset)` entry of
+        `user_data` (each None if that line is missing), or None if the
+        table has none for it."""
+        return self.entries[self.index(user_data)]
+
+def _income_for(has_income, large_income, large_income_thresh):
+    """Returns an income with those features, or None if there's none."""
+    for income in (0, 1, large_income_thresh, large_income_thresh + 1):
+        if (income > 0) == has_income and (income > large_income_thresh) == large_income:
+            return income
+    return None
+
+def _made_up_user_data(index, large_income_thresh):
+    """Returns user data with the features of `index` and a base score of 0,
+    or None if its income can't be made up."""
+    has_income = bool(index >> 4 & 1)
+    large_income = bool(index >> 3 & 1)
+    if large_income_thresh is None:
+        income = None if large_income else (1 if has_income else 0)
+    else:
+        income = _income_for(has_income, large_income, large_income_thresh)
+    if income is None:
+        return None
+    houses = [HouseItemData(0, 0, HouseStatus.mortgaged)] if index >> 2 & 1 else []
+    return UserData(
+        age=AGE_BUCKET_AGES[index >> 5],
+        gender=Gender.female,
+        marital_status=MaritalStatus.married if index & 1 else MaritalStatus.single,
+        dependents=index >> 1 & 1,
+        income=income,
+        houses=ItemDataCollection(*houses),
+        vehicles=ItemDataCollection(),
+        risk_questions=[0, 0, 0]
+    )
+
+def _offset(scoring, loi):
+    return scoring[loi].value if loi in scoring else None
+
+def build_single_item_line_table(policies):
+    """Returns the `SingleItemLineTable` of `policies`, or None if some
+    policy changing the life or disability scores isn't of a type in
+    `TABLE_POLICY_TYPES`, or there's more than one `LargeIncomePolicy`."""
+    single_item_policies = [p for p in policies if not p.writes.isdisjoint(SINGLE_ITEM_LINES)]
+    if any(type(p) not in TABLE_POLICY_TYPES for p in single_item_policies):
+        return None
+    large_income_policies = [p for p in single_item_policies if type(p) is LargeIncomePolicy]
+    if len(large_income_policies) > 1:
+        return None
+    large_income_policy = large_income_policies[0] if large_income_policies else None
+    large_income_thresh = None if large_income_policy is None else large_income_policy.large_income_thresh
+    entries = []
+    for index in range(len(AGE_BUCKET_AGES) << 5):
+        user_data = _made_up_user_data(index, large_income_thresh)
+        if user_data is None:
+            entries.append(None)
+            continue
+        scoring = RiskScoring()
+        for policy in single_item_policies:
+            policy.apply(user_data, scoring)
+        entries.append((_offset(scoring, Loi.life), _offset(scoring, Loi.disability)))
+    return SingleItemLineTable(entries, large_income_policy)
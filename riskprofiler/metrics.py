@@ -0,0 +1,268 @@
+# In-process latency histograms and request/error counters, exported in the
+# Prometheus text format on /metrics.
+#
+# Histograms have fixed buckets and label values come from a small, fixed
+# set (stage names, policy types, policy versions, endpoints and exception
+# types), so memory use is bounded. With `METRICS_ENABLED = False`,
+# `get_metrics()` returns `NULL_METRICS`, whose hooks do nothing.
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import partial
+from flask import current_app, g, request
+from werkzeug.exceptions import HTTPException
+
+# Upper bounds (in seconds) of the histogram buckets.
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0
+)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket, plus one for values above the last bound.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """Returns `(cumulative bucket counts, sum, count)`, the last bucket
+        count being the one of `+Inf`."""
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = []
+        running = 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, total, count
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape_label_value(value)) for name, value in labels) + '}'
+
+def _format_float(value):
+    return repr(float(value))
+
+class Metrics:
+    enabled = True
+
+    # name: (type, help, label names)
+    FAMILIES = {
+        'riskprofiler_request_duration_seconds': ('histogram', 'Time spent handling a request.', ('endpoint',)),
+        'riskprofiler_stage_duration_seconds': ('histogram', 'Time spent in each stage of a /risk_profile request.', ('stage',)),
+        'riskprofiler_policy_duration_seconds': ('histogram', 'Time spent applying each risk policy, by policy version.', ('policy', 'version')),
+        'riskprofiler_policy_version_requests_total': ('counter', 'Requests scored, by policy version.', ('version',)),
+        'riskprofiler_requests_total': ('counter', 'Requests handled, by endpoint, method and status code.', ('endpoint', 'method', 'status')),
+        'riskprofiler_errors_total': ('counter', 'Errors raised while handling requests, by exception type.', ('type',)),
+        'riskprofiler_write_queue_depth': ('gauge', 'Profiles waiting to be written to the database.', ()),
+        'riskprofiler_write_batch_size': ('histogram', 'Profiles written by each flush of the write-behind queue.', ()),
+        'riskprofiler_write_flush_duration_seconds': ('histogram', 'Time spent by each flush of the write-behind queue.', ()),
+        'riskprofiler_write_flush_errors_total': ('counter', 'Flushes of the write-behind queue that failed.', ()),
+        'riskprofiler_policy_reloads_total': ('counter', 'Reloads of the policy file, by result.', ('result',)),
+        'riskprofiler_coalesced_requests_total': ('counter', 'Profile calculations, by role: computed (leader) or shared with a concurrent identical request (follower).', ('role',)),
+        'riskprofiler_shadow_profiles_total': ('counter', 'Profiles scored again with the shadow policy version, by result: unchanged, changed, dropped (queue full) or error.', ('result',)),
+        'riskprofiler_shadow_diffs_total': ('counter', 'Profiles the shadow policy version changed, by line of insurance.', ('line',))
+    }
+
+    # Buckets of the histograms not measuring seconds.
+    FAMILY_BUCKETS = {
+        'riskprofiler_write_batch_size': BATCH_SIZE_BUCKETS
+    }
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # name: {label values: Histogram or int}
+        self._series = {name: {} for name in self.FAMILIES}
+        self._lock = threading.Lock()
+
+    def _histogram(self, name, label_values):
+        series = self._series[name]
+        histogram = series.get(label_values)
+        if histogram is None:
+            with self._lock:
+                histogram = series.setdefault(label_values, Histogram(self.FAMILY_BUCKETS.get(name, self.buckets)))
+        return histogram
+
+    def _increment(self, name, label_values):
+        series = self._series[name]
+        with self._lock:
+            series[label_values] = series.get(label_values, 0) + 1
+
+    def _set(self, name, label_values, value):
+        with self._lock:
+            self._series[name][label_values] = value
+
+    def stage(self, name):
+        """Context manager timing a stage of a request."""
+        return _Timer(self._histogram('riskprofiler_stage_duration_seconds', (name,)))
+
+    def observe_request(self, endpoint, seconds):
+        self._histogram('riskprofiler_request_duration_seconds', (endpoint,)).observe(seconds)
+
+    def observe_policy(self, policy, seconds, version):
+        # Policies defined in a policy file are told apart by name.
+        label = getattr(policy, 'name', None) or type(policy).__name__
+        self._histogram('riskprofiler_policy_duration_seconds', (label, version)).observe(seconds)
+
+    def policy_timer(self, version):
+        """`policy_timer` to pass to `RiskProfileCalculator` for the policies
+        of a policy version."""
+        return partial(self.observe_policy, version=version)
+
+    def count_policy_version(self, version):
+        self._increment('riskprofiler_policy_version_requests_total', (version,))
+
+    def count_request(self, endpoint, method, status):
+        self._increment('riskprofiler_requests_total', (endpoint, method, str(status)))
+
+    def count_error(self, exc):
+        self._increment('riskprofiler_errors_total', (type(exc).__name__,))
+
+    def set_write_queue_depth(self, depth):
+        self._set('riskprofiler_write_queue_depth', (), depth)
+
+    def observe_write_flush(self, batch_size, seconds):
+        self._histogram('riskprofiler_write_batch_size', ()).observe(batch_size)
+        self._histogram('riskprofiler_write_flush_duration_seconds', ()).observe(seconds)
+
+    def count_write_flush_error(self):
+        self._increment('riskprofiler_write_flush_errors_total', ())
+
+    def count_policy_reload(self, succeeded):
+        self._increment('riskprofiler_policy_reloads_total', ('ok' if succeeded else 'error',))
+
+    def count_coalesced_request(self, leader):
+        self._increment('riskprofiler_coalesced_requests_total', ('leader' if leader else 'follower',))
+
+    def count_shadow_profile(self, result):
+        self._increment('riskprofiler_shadow_profiles_total', (result,))
+
+    def count_shadow_diff(self, line):
+        self._increment('riskprofiler_shadow_diffs_total', (line,))
+
+    def render(self):
+        """Returns all the metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, (metric_type, help_text, label_names) in self.FAMILIES.items():
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, metric_type))
+            with self._lock:
+                series = sorted(self._series[name].items())
+            for label_values, value in series:
+                labels = list(zip(label_names, label_values))
+                if metric_type != 'histogram':
+                    lines.append('{}{} {}'.format(name, _format_labels(labels), value))
+                    continue
+                cumulative, total, count = value.snapshot()
+                bounds = [_format_float(b) for b in value.buckets] + ['+Inf']
+                for bound, bucket_count in zip(bounds, cumulative):
+                    lines.append('{}_bucket{} {}'.format(name, _format_labels(labels + [('le', bound)]), bucket_count))
+                lines.append('{}_sum{} {}'.format(name, _format_labels(labels), _format_float(total)))
+                lines.append('{}_count{} {}'.format(name, _format_labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+class NullMetrics:
+    """Stands for `Metrics` when they are disabled."""
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_TIMER
+
+    def policy_timer(self, version):
+        return None
+
+    def count_policy_version(self, version):
+        pass
+
+    def count_error(self, exc):
+        pass
+
+    def set_write_queue_depth(self, depth):
+        pass
+
+    def observe_write_flush(self, batch_size, seconds):
+        pass
+
+    def count_write_flush_error(self):
+        pass
+
+    def count_policy_reload(self, succeeded):
+        pass
+
+    def count_coalesced_request(self, leader):
+        pass
+
+    def count_shadow_profile(self, result):
+        pass
+
+    def count_shadow_diff(self, line):
+        pass
+
+_NULL_TIMER = nullcontext()
+
+NULL_METRICS = NullMetrics()
+
+def get_metrics():
+    """Returns the app's `Metrics`, or `NULL_METRICS` if they're disabled."""
+    return current_app.extensions.get('metrics', NULL_METRICS)
+
+def _request_endpoint():
+    return request.endpoint or 'none'
+
+def init_app(app):
+    app.config.setdefault('METRICS_ENABLED', True)
+    if not app.config['METRICS_ENABLED']:
+        return
+    metrics = app.extensions['metrics'] = Metrics()
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_request_start', None)
+        if start is not None:
+            metrics.observe_request(_request_endpoint(), time.perf_counter() - start)
+        metrics.count_request(_request_endpoint(), request.method, response.status_code)
+        return response
+
+    @app.errorhandler(HTTPException)
+    def count_http_error(err):
+        metrics.count_error(err)
+        return err
+
+    @app.teardown_request
+    def count_unhandled_error(exc):
+        if exc is not None:
+            metrics.count_error(exc)
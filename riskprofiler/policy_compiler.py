@@ -0,0 +1,326 @@
+# Compiles a list of risk policies into a `CompiledPolicyPlan`, which does
+# the same work as applying each policy to a `RiskScoring` but over a plain
+# per-line slot array, without any kwargs unpacking or score objects.
+#
+# Only the policy types in `risk_policies.py` and those registered with
+# `register_step_builder` (e.g. `policy_rules.RulePolicy`) can be compiled
+# (exact types, since a subclass may override `apply`); `compile_policies`
+# returns None for any other list, and callers should fall back to applying
+# the policies.
+#
+# When the policies allow it (see `lookup_table.py`), a plan scores life and
+# disability with a `SingleItemLineTable` built along with the plan, and
+# only runs the steps of the policies that change home and auto.
+import time
+from functools import lru_cache
+from .line_of_insurance import Loi, LOI_ORDINAL
+from .errors import InvalidRiskScoreOperation
+from .lookup_table import SINGLE_ITEM_LINES, build_single_item_line_table
+from .risk_policies import InitialRiskPolicy, NoIncomePolicy, NoVehiclePolicy, NoHousePolicy, AgePolicy, LargeIncomePolicy, MortgagedHousePolicy, DependentsPolicy, MaritalStatusPolicy, RecentVehiclePolicy, SingleHousePolicy, SingleVehiclePolicy
+
+# Slot indexes (same layout as `RiskScoring`). A slot holds None (line not
+# created, or disabled), an int (single item line) or a dict of item key to
+# int (multiple item line).
+LIFE = LOI_ORDINAL[Loi.life]
+DISABILITY = LOI_ORDINAL[Loi.disability]
+HOME = LOI_ORDINAL[Loi.home]
+AUTO = LOI_ORDINAL[Loi.auto]
+SLOT_LOIS = Loi.all_lines()
+
+def _add(slots, slot, points):
+    score = slots[slot]
+    if score is None:
+        return
+    if type(score) is dict:
+        for key in score:
+            score[key] += points
+    else:
+        slots[slot] = score + points
+
+def _add_to_item(slots, slot, key, points):
+    score = slots[slot]
+    if score is None:
+        return
+    if type(score) is not dict:
+        raise InvalidRiskScoreOperation
+    score[key] += points
+
+def _add_to_all(slots, points):
+    for slot in range(4):
+        _add(slots, slot, points)
+
+# One step builder per policy type, called with the policy and the set of
+# slots the plan computes. A step takes the user data and the slot array;
+# policy parameters are read from the policy when the step runs, so a plan
+# stays in sync with its policies.
+
+def _initial_step(policy, slots_wanted):
+    if len(slots_wanted) < len(SLOT_LOIS):
+        # Slots left out stay None, which every other step skips.
+        def partial_step(user_data, slots):
+            base_score_value = user_data.base_score()
+            for slot in (LIFE, DISABILITY):
+                if slot in slots_wanted:
+                    slots[slot] = base_score_value
+            if HOME in slots_wanted:
+                slots[HOME] = {house.item_key(): base_score_value for house in user_data.houses()}
+            if AUTO in slots_wanted:
+                slots[AUTO] = {vehicle.item_key(): base_score_value for vehicle in user_data.vehicles()}
+        return partial_step
+
+    def step(user_data, slots):
+        base_score_value = user_data.base_score()
+        slots[LIFE] = base_score_value
+        slots[DISABILITY] = base_score_value
+        slots[HOME] = {house.item_key(): base_score_value for house in user_data.houses()}
+        slots[AUTO] = {vehicle.item_key(): base_score_value for vehicle in user_data.vehicles()}
+    return step
+
+def _no_income_step(policy, slots_wanted):
+    def step(user_data, slots):
+        if not user_data.has_income():
+            slots[DISABILITY] = None
+    return step
+
+def _no_vehicle_step(policy, slots_wanted):
+    def step(user_data, slots):
+        if not user_data.has_vehicles():
+            slots[AUTO] = None
+    return step
+
+def _no_house_step(policy, slots_wanted):
+    def step(user_data, slots):
+        if not user_data.has_houses():
+            slots[HOME] = None
+    return step
+
+def _age_step(policy, slots_wanted):
+    def step(user_data, slots):
+        if user_data.is_under_age(30):
+            _add_to_all(slots, -2)
+        elif user_data.is_under_age(40):
+            _add_to_all(slots, -1)
+        elif user_data.is_over_age(60):
+            slots[DISABILITY] = None
+            slots[LIFE] = None
+    return step
+
+def _large_income_step(policy, slots_wanted):
+    def step(user_data, slots):
+        if user_data.is_income_above(policy.large_income_thresh):
+            _add_to_all(slots, -1)
+    return step
+
+def _mortgaged_house_step(policy, slots_wanted):
+    def step(user_data, slots):
+        mortgaged_houses = user_data.get_mortgaged_houses()
+        if mortgaged_houses:
+            _add(slots, DISABILITY, 1)
+            for house in mortgaged_houses:
+                _add_to_item(slots, HOME, house.item_key(), 1)
+    return step
+
+def _dependents_step(policy, slots_wanted):
+    def step(user_data, slots):
+        if user_data.has_dependents():
+            _add(slots, DISABILITY, 1)
+            _add(slots, LIFE, 1)
+    return step
+
+def _marital_status_step(policy, slots_wanted):
+    def step(user_data, slots):
+        if user_data.is_married():
+            _add(slots, LIFE, 1)
+            _add(slots, DISABILITY, -1)
+    return step
+
+def _recent_vehicle_step(policy, slots_wanted):
+    def step(user_data, slots):
+        for vehicle in user_data.get_vehicles_since_year(policy.first_recent_year()):
+            _add_to_item(slots, AUTO, vehicle.item_key(), 1)
+    return step
+
+def _single_house_step(policy, slots_wanted):
+    def step(user_data, slots):
+        if user_data.houses_count() == 1:
+            _add_to_item(slots, HOME, user_data.get_house_at(0).item_key(), 1)
+    return step
+
+def _single_vehicle_step(policy, slots_wanted):
+    def step(user_data, slots):
+        if user_data.vehicles_count() == 1:
+            _add_to_item(slots, AUTO, user_data.get_vehicle_at(0).item_key(), 1)
+    return step
+
+STEP_BUILDERS = {
+    InitialRiskPolicy: _initial_step,
+    NoIncomePolicy: _no_income_step,
+    NoVehiclePolicy: _no_vehicle_step,
+    NoHousePolicy: _no_house_step,
+    AgePolicy: _age_step,
+    LargeIncomePolicy: _large_income_step,
+    MortgagedHousePolicy: _mortgaged_house_step,
+    DependentsPolicy: _dependents_step,
+    MaritalStatusPolicy: _marital_status_step,
+    RecentVehiclePolicy: _recent_vehicle_step,
+    SingleHousePolicy: _single_house_step,
+    SingleVehiclePolicy: _single_vehicle_step
+}
+
+class CompiledPolicyPlan:
+    def __init__(self, policies, steps, step_slots=None):
+        self.policies = tuple(policies)
+        self.steps = tuple(steps)
+        # Only set for plans computing some of the lines: the slots each step
+        # writes to (None for steps creating slots). A step is skipped when
+        # all of them are missing, as it would be a no-op.
+        self.step_slots = None if step_slots is None else tuple(step_slots)
+        # Set by `use_table`.
+        self.table = None
+        self.table_rest = None
+        self.table_slots = ()
+
+    def use_table(self, table, rest, slots):
+        """Makes the plan score `slots` (life and/or disability) with
+        `table`, and the other lines with the plan `rest` (None if there are
+        none). The steps still run for users the table has no entry for."""
+        self.table = table
+        self.table_rest = rest
+        self.table_slots = tuple(slots)
+
+    def _fill_from_table(self, user_data, slots, entry):
+        base_score_value = user_data.base_score()
+        for slot in self.table_slots:
+            offset = entry[slot]
+            slots[slot] = None if offset is None else base_score_value + offset
+        return slots
+
+    def _is_noop(self, index, slots):
+        written = self.step_slots[index]
+        return written is not None and all(slots[slot] is None for slot in written)
+
+    def run(self, user_data):
+        """Returns the slot array after applying every step."""
+        if self.table is not None:
+            entry = self.table.lookup(user_data)
+            if entry is not None:
+                slots = [None, None, None, None] if self.table_rest is None else self.table_rest.run(user_data)
+                return self._fill_from_table(user_data, slots, entry)
+        slots = [None, None, None, None]
+        if self.step_slots is None:
+            for step in self.steps:
+                step(user_data, slots)
+            return slots
+        for index, step in enumerate(self.steps):
+            if not self._is_noop(index, slots):
+                step(user_data, slots)
+        return slots
+
+    def run_timed(self, user_data, policy_timer):
+        """Same as `run`, calling `policy_timer(policy, seconds)` with the
+        time spent on the step of each policy (and on the table lookup, as
+        `policy_timer(table, seconds)`)."""
+        if self.table is not None:
+            start = time.perf_counter()
+            entry = self.table.lookup(user_data)
+            if entry is not None:
+                lookup_seconds = time.perf_counter() - start
+                slots = [None, None, None, None] if self.table_rest is None else self.table_rest.run_timed(user_data, policy_timer)
+                start = time.perf_counter()
+                self._fill_from_table(user_data, slots, entry)
+                policy_timer(self.table, lookup_seconds + time.perf_counter() - start)
+                return slots
+        slots = [None, None, None, None]
+        for index, (policy, step) in enumerate(zip(self.policies, self.steps)):
+            if self.step_slots is not None and self._is_noop(index, slots):
+                continue
+            start = time.perf_counter()
+            step(user_data, slots)
+            policy_timer(policy, time.perf_counter() - start)
+        return slots
+
+    def evaluate(self, user_data, mapping, policy_timer=None):
+        """Same as applying the policies to a new `RiskScoring` and calling
+        `as_profile(mapping)` on it."""
+        slots = self.run(user_data) if policy_timer is None else self.run_timed(user_data, policy_timer)
+        return slots_as_profile(slots, mapping)
+
+def slots_as_profile(slots, mapping):
+    """Same as `RiskScoring.as_profile` for a slot array."""
+    map_score_value = mapping.map_score_value
+    profile = {}
+    for loi, score in zip(SLOT_LOIS, slots):
+        if score is None:
+            continue
+        if type(score) is dict:
+            profile[loi] = {key: map_score_value(value) for key, value in score.items()}
+        else:
+            profile[loi] = map_score_value(score)
+    return profile
+
+def register_step_builder(policy_type, builder):
+    """Makes policies of exactly `policy_type` compilable, `builder` being
+    called like the step builders above."""
+    STEP_BUILDERS[policy_type] = builder
+    _compile.cache_clear()
+
+def is_compilable(policies):
+    return all(type(policy) in STEP_BUILDERS for policy in policies)
+
+def affects_lines(policy, lines):
+    """Whether applying `policy` may change the scores of any of `lines`."""
+    return not policy.writes.isdisjoint(lines)
+
+ALL_SLOTS = frozenset(range(len(SLOT_LOIS)))
+
+@lru_cache(maxsize=32)
+def _single_item_line_table(policies):
+    return build_single_item_line_table(policies)
+
+def _rest_plan(policies, lines):
+    """Returns the plan computing `lines` (none of them scored by the
+    table) along a table, or None if there are none."""
+    if not lines:
+        return None
+    slots_wanted = frozenset(LOI_ORDINAL[loi] for loi in lines)
+    kept = [policy for policy in policies if affects_lines(policy, lines)]
+    # Without step slots: the slots of the other lines stay None, which
+    # every step skips, and checking for no-op steps would cost more than
+    # running them.
+    return CompiledPolicyPlan(kept, [STEP_BUILDERS[type(policy)](policy, slots_wanted) for policy in kept])
+
+@lru_cache(maxsize=32)
+def _compile(policies, lines):
+    if not is_compilable(policies):
+        return None
+    if lines is None:
+        plan = CompiledPolicyPlan(policies, [STEP_BUILDERS[type(policy)](policy, ALL_SLOTS) for policy in policies])
+    else:
+        slots_wanted = frozenset(LOI_ORDINAL[loi] for loi in lines)
+        kept = [policy for policy in policies if affects_lines(policy, lines)]
+        plan = CompiledPolicyPlan(
+            kept,
+            [STEP_BUILDERS[type(policy)](policy, slots_wanted) for policy in kept],
+            [
+                None if policy.creates else frozenset(LOI_ORDINAL[loi] for loi in policy.writes & lines)
+                for policy in kept
+            ]
+        )
+    all_lines = frozenset(SLOT_LOIS)
+    table_lines = SINGLE_ITEM_LINES & (all_lines if lines is None else lines)
+    if table_lines:
+        table = _single_item_line_table(policies)
+        if table is not None:
+            other_lines = (all_lines if lines is None else lines) - SINGLE_ITEM_LINES
+            plan.use_table(table, _rest_plan(policies, other_lines), sorted(LOI_ORDINAL[loi] for loi in table_lines))
+    return plan
+
+def compile_policies(policies, lines=None):
+    """Returns a (cached) `CompiledPolicyPlan` for `policies`, or None if
+    some of them can't be compiled. With `lines`, the plan only computes
+    (and only runs the policies affecting) those lines of insurance."""
+    if lines is not None:
+        lines = frozenset(lines)
+        if lines == frozenset(SLOT_LOIS):
+            lines = None
+    return _compile(tuple(policies), lines)
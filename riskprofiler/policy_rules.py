@@ -0,0 +1,387 @@
+# Risk policies defined as data (e.g. `riskprofiler/policies.json`) rather
+# than as `BaseRiskPolicy` subclasses, so that rules and thresholds can be
+# changed without a deploy (`policy_set.py` reloads them).
+#
+# A definition is a JSON object listing policies, each with a name and a
+# list of rules:
+#
+#     {"policies": [
+#         {"name": "age", "rules": [
+#             {"if": {"age": {"<": 30}}, "then": [{"add": -2}]},
+#             {"if": {"age": {">=": 30, "<": 40}}, "then": [{"add": -1}]},
+#             {"if": {"age": {">": 60}}, "then": [{"disable": ["disability", "life"]}]}
+#         ]},
+#         ...
+#     ]}
+#
+# `if` maps user data fields (see `USER_FIELDS`) to conditions, all of which
+# must hold. `then` lists actions: `{"add": <points>, "lines": [...]}` (all
+# lines when `lines` is left out, negative points subtract),
+# `{"disable": [...]}` and `{"create": [...]}` (scores equal to the sum of
+# the risk questions, one per item for home and auto). A rule with
+# `"for_each": "houses"` (or "vehicles") runs its actions once for each item
+# matching its `where` conditions (see `ITEM_FIELDS`); its only action is
+# `{"add": <points>}`, to the item's score.
+#
+# Each policy is compiled to Python code when it's built, with conditions
+# and points inlined: a function applying it to a `RiskScoring` and steps
+# for `policy_compiler`, so rule policies run as fast as the built-in ones.
+import json
+import math
+from .errors import PolicyDefinitionError
+from .evaluation_context import context_for
+from .line_of_insurance import Loi, LOI_ORDINAL
+from .policy_compiler import _add, _add_to_item, register_step_builder
+from .risk_policies import BaseRiskPolicy
+from .user_data import Gender, MaritalStatus, HouseStatus
+
+# field: (Python expression, `UserData` field read, value type)
+USER_FIELDS = {
+    'age': ('user_data.age', 'age', int),
+    'gender': ('user_data.gender', 'gender', Gender),
+    'marital_status': ('user_data.marital_status', 'marital_status', MaritalStatus),
+    'dependents': ('user_data.dependents', 'dependents', int),
+    'income': ('user_data.income', 'income', int),
+    'base_score': ('user_data.base_score()', 'risk_questions', int),
+    'houses_count': ('user_data.houses_count()', 'houses', int),
+    'mortgaged_houses_count': ('user_data.mortgaged_houses_count()', 'houses', int),
+    'vehicles_count': ('user_data.vehicles_count()', 'vehicles', int)
+}
+
+# collection: {field: (Python expression, value type)}
+ITEM_FIELDS = {
+    'houses': {
+        'key': ('item.item_key()', int),
+        'zip_code': ('item.zip_code', int),
+        'status': ('item.status', HouseStatus)
+    },
+    'vehicles': {
+        'key': ('item.item_key()', int),
+        'make': ('item.make', str),
+        'model': ('item.model', str),
+        'year': ('item.year', int),
+        # Counted up to the policy's `curr_date` (see `evaluation_context`).
+        'years_since_production': ('item.years_since_production(curr_date)', float)
+    }
+}
+
+# `years_since_production` tests, as equivalent comparisons of the production
+# year with the first year within (`<=`) or under (`<`) some number of years
+# (cached per date): integer comparisons, that hold for years `datetime.date`
+# doesn't accept too.
+_YEAR_TESTS = {
+    '<=': 'item.year >= context.first_year_within({0})',
+    '>': 'item.year < context.first_year_within({0})',
+    '<': 'item.year >= context.first_year_under({0})',
+    '>=': 'item.year < context.first_year_under({0})',
+    '==': 'context.first_year_within({0}) <= item.year < context.first_year_under({0})',
+    '!=': 'not context.first_year_within({0}) <= item.year < context.first_year_under({0})'
+}
+
+# Line of insurance holding the scores of each collection's items.
+COLLECTION_LINES = {'houses': Loi.home, 'vehicles': Loi.auto}
+
+ENUM_TYPES = (Gender, MaritalStatus, HouseStatus)
+ORDERING_OPERATORS = ('<', '<=', '>', '>=')
+EQUALITY_OPERATORS = ('==', '!=')
+
+# Names the generated code refers to.
+_NAMESPACE = {
+    'Loi': Loi,
+    'Gender': Gender,
+    'MaritalStatus': MaritalStatus,
+    'HouseStatus': HouseStatus,
+    '_add': _add,
+    '_add_to_item': _add_to_item,
+    'context_for': context_for
+}
+
+def _is_number(value, value_type):
+    if type(value) is int:
+        return True
+    return value_type is float and type(value) is float and math.isfinite(value)
+
+def _literal(value, value_type, where):
+    """Returns the Python source of a condition value, checking its type."""
+    if value_type in ENUM_TYPES:
+        for member in value_type:
+            if type(value) is str and member.value == value:
+                return '{}.{}'.format(value_type.__name__, member.name)
+        valid = ', '.join('"{}"'.format(member.value) for member in value_type)
+        raise PolicyDefinitionError(where, 'expected one of {}'.format(valid))
+    if value_type is str:
+        if type(value) is not str:
+            raise PolicyDefinitionError(where, 'expected a string')
+        return repr(value)
+    if not _is_number(value, value_type):
+        raise PolicyDefinitionError(where, 'expected {}'.format('a number' if value_type is float else 'an integer'))
+    return repr(value)
+
+def _condition(conditions, fields, where):
+    """Returns the Python source of `conditions` (None if there are none) and
+    the `USER_FIELDS` or `ITEM_FIELDS` entries they use."""
+    if not isinstance(conditions, dict):
+        raise PolicyDefinitionError(where, 'expected an object of conditions by field')
+    terms = []
+    used = []
+    for field, tests in conditions.items():
+        if field not in fields:
+            raise PolicyDefinitionError('{}.{}'.format(where, field), 'unknown field')
+        expression, value_type = fields[field][0], fields[field][-1]
+        used.append(fields[field])
+        if not isinstance(tests, dict) or not tests:
+            raise PolicyDefinitionError('{}.{}'.format(where, field), 'expected an object of values by operator')
+        for operator, value in tests.items():
+            test_where = '{}.{}.{}'.format(where, field, operator)
+            literal = _literal(value, value_type, test_where)
+            is_enum = value_type in ENUM_TYPES
+            if operator in EQUALITY_OPERATORS:
+                if is_enum:
+                    operator = 'is' if operator == '==' else 'is not'
+            elif operator not in ORDERING_OPERATORS or is_enum or value_type is str:
+                raise PolicyDefinitionError(test_where, 'unsupported operator')
+            if field == 'years_since_production':
+                terms.append(_YEAR_TESTS[operator].format(literal))
+            else:
+                terms.append('{} {} {}'.format(expression, operator, literal))
+    return (' and '.join(terms) if terms else None), used
+
+def _lines(names, where):
+    if not isinstance(names, list) or not names:
+        raise PolicyDefinitionError(where, 'expected a list of lines of insurance')
+    valid = set(loi.value for loi in Loi.all_lines())
+    if not all(type(name) is str and name in valid for name in names):
+        raise PolicyDefinitionError(where, 'unknown line of insurance')
+    # Always in the same order, that of the built-in policies.
+    return tuple(loi for loi in Loi.all_lines() if loi.value in names)
+
+def _points(action, where):
+    points = action['add']
+    if type(points) is not int:
+        raise PolicyDefinitionError(where + '.add', 'expected an integer')
+    return points
+
+class _Rules:
+    """The validated rules of a policy, compiling them to functions."""
+
+    def __init__(self, name, rules):
+        self.name = name
+        reads = set()
+        writes = set()
+        creates = set()
+        self.uses_curr_date = False
+        # (condition, collection, item condition, actions) tuples, actions
+        # being ('add', points, lines), ('disable', lines), ('create', lines)
+        # or, for items, ('add', points).
+        self.rules = []
+        # Fields read by the conditions of the rules.
+        condition_reads = set()
+        if not isinstance(rules, list):
+            raise PolicyDefinitionError(name + '.rules', 'expected a list of rules')
+        for index, rule in enumerate(rules):
+            where = '{}.rules[{}]'.format(name, index)
+            if not isinstance(rule, dict):
+                raise PolicyDefinitionError(where, 'expected an object')
+            for key in rule:
+                if key not in ('if', 'for_each', 'where', 'then'):
+                    raise PolicyDefinitionError('{}.{}'.format(where, key), 'unknown key')
+            condition, used = _condition(rule.get('if', {}), USER_FIELDS, where + '.if')
+            reads.update(field for _, field, _ in used)
+            condition_reads.update(field for _, field, _ in used)
+            collection = rule.get('for_each')
+            item_condition = None
+            if collection is not None:
+                if type(collection) is not str or collection not in ITEM_FIELDS:
+                    raise PolicyDefinitionError(where + '.for_each', 'expected "houses" or "vehicles"')
+                item_condition, item_used = _condition(rule.get('where', {}), ITEM_FIELDS[collection], where + '.where')
+                self.uses_curr_date |= any('curr_date' in expression for expression, _ in item_used)
+                reads.add(collection)
+            elif 'where' in rule:
+                raise PolicyDefinitionError(where + '.where', 'only allowed along with "for_each"')
+            actions = rule.get('then')
+            if not isinstance(actions, list) or not actions:
+                raise PolicyDefinitionError(where + '.then', 'expected a list of actions')
+            actions = [_action(action, collection, '{}.then[{}]'.format(where, i)) for i, action in enumerate(actions)]
+            for action in actions:
+                lines = (COLLECTION_LINES[collection],) if collection is not None else action[-1]
+                writes.update(lines)
+                if action[0] == 'create':
+                    creates.update(lines)
+                    reads.add('risk_questions')
+                    reads.update(c for c, loi in COLLECTION_LINES.items() if loi in lines)
+            self.rules.append((condition, collection, item_condition, actions))
+        self.reads = frozenset(reads)
+        self.writes = frozenset(writes)
+        self.creates = frozenset(creates)
+        # Applying the policy to each item alone is the same as applying it
+        # to all of them when every rule runs for each item of the same
+        # collection, the conditions not reading that collection otherwise.
+        collections = set(collection for _, collection, _, _ in self.rules)
+        self.item_wise = None
+        if len(collections) == 1 and None not in collections and not collections & condition_reads:
+            self.item_wise = collections.pop()
+
+    def source(self, target, slots_wanted=None):
+        """Returns the source of a `build(policy)` function, returning a
+        function applying the rules to a `RiskScoring` (`target` 'scoring')
+        or to a slot array (`target` 'slots', creating only `slots_wanted`;
+        see `policy_compiler`)."""
+        code = ['def build(policy):', '    def run(user_data, {}):'.format(target)]
+        if self.uses_curr_date:
+            code.append('        context = context_for(policy.curr_date)')
+            code.append('        curr_date = context.date')
+        for condition, collection, item_condition, actions in self.rules:
+            indent = '        '
+            if condition is not None:
+                code.append(indent + 'if {}:'.format(condition))
+                indent += '    '
+            if collection is None:
+                for action in actions:
+                    code.extend(indent + line for line in _action_source(target, action, slots_wanted))
+                continue
+            code.append(indent + 'for item in user_data.{}():'.format(collection))
+            indent += '    '
+            if item_condition is not None:
+                code.append(indent + 'if {}:'.format(item_condition))
+                indent += '    '
+            for _, points in actions:
+                code.append(indent + _item_add_source(target, COLLECTION_LINES[collection], points))
+        if len(code) == 2:
+            code.append('        pass')
+        code.append('    return run')
+        return '\n'.join(code) + '\n'
+
+    def build(self, policy, target, slots_wanted=None):
+        namespace = dict(_NAMESPACE)
+        exec(compile(self.source(target, slots_wanted), '<policy {}>'.format(self.name), 'exec'), namespace)
+        return namespace['build'](policy)
+
+def _action(action, collection, where):
+    if not isinstance(action, dict):
+        raise PolicyDefinitionError(where, 'expected an object')
+    if collection is not None:
+        if set(action) != {'add'}:
+            raise PolicyDefinitionError(where, 'expected {"add": <points>}, the only action on items')
+        return ('add', _points(action, where))
+    if 'add' in action:
+        if set(action) - {'add', 'lines'}:
+            raise PolicyDefinitionError(where, 'unknown key in "add" action')
+        lines = Loi.all_lines() if 'lines' not in action else _lines(action['lines'], where + '.lines')
+        return ('add', _points(action, where), lines)
+    if len(action) != 1 or next(iter(action)) not in ('disable', 'create'):
+        raise PolicyDefinitionError(where, 'expected an "add", "disable" or "create" action')
+    kind, names = next(iter(action.items()))
+    return (kind, _lines(names, '{}.{}'.format(where, kind)))
+
+def _points_source(points):
+    # `RiskScoring` is given positive points, like by the built-in policies.
+    return ('add', points) if points >= 0 else ('subtract', -points)
+
+def _item_add_source(target, loi, points):
+    if target == 'slots':
+        return '_add_to_item(slots, {}, item.item_key(), {})'.format(LOI_ORDINAL[loi], points)
+    method, points = _points_source(points)
+    return 'scoring.{}(points={}, loi=Loi.{}, item=item.item_key())'.format(method, points, loi.name)
+
+def _action_source(target, action, slots_wanted):
+    """Returns the lines of source of an action (not item-wise)."""
+    kind, lines = action[0], action[-1]
+    if kind == 'add':
+        if target == 'slots':
+            return ['_add(slots, {}, {})'.format(LOI_ORDINAL[loi], action[1]) for loi in lines]
+        method, points = _points_source(action[1])
+        return ['scoring.{}(points={}, loi=Loi.{})'.format(method, points, loi.name) for loi in lines]
+    if kind == 'disable':
+        if target == 'slots':
+            return ['slots[{}] = None'.format(LOI_ORDINAL[loi]) for loi in lines]
+        return ['scoring.disable(loi=Loi.{})'.format(loi.name) for loi in lines]
+    code = ['base_score_value = user_data.base_score()']
+    for loi in lines:
+        collection = next((c for c, line in COLLECTION_LINES.items() if line == loi), None)
+        if target == 'slots':
+            if slots_wanted is not None and LOI_ORDINAL[loi] not in slots_wanted:
+                continue
+            if collection is None:
+                code.append('slots[{}] = base_score_value'.format(LOI_ORDINAL[loi]))
+            else:
+                code.append('slots[{}] = {{item.item_key(): base_score_value for item in user_data.{}()}}'.format(LOI_ORDINAL[loi], collection))
+        elif collection is None:
+            code.append('scoring.create(loi=Loi.{}, score=base_score_value)'.format(loi.name))
+        else:
+            code.append('scoring.create(loi=Loi.{}, multiple_items=True)'.format(loi.name))
+            code.append('for item in user_data.{}():'.format(collection))
+            code.append('    scoring.create_item(loi=Loi.{}, item=item.item_key(), score=base_score_value)'.format(loi.name))
+    return code
+
+class RulePolicy(BaseRiskPolicy):
+    """A policy defined by a list of rules (see the top of this module).
+    Raises a `PolicyDefinitionError` for invalid rules."""
+
+    def __init__(self, name, rules, curr_date=None):
+        self.name = name
+        self.rules = rules
+        # None evaluates at the date of the current `EvaluationContext`.
+        self.curr_date = curr_date
+        self._rules = _Rules(name, rules)
+        self._apply = self._rules.build(self, 'scoring')
+
+    @property
+    def reads(self):
+        return self._rules.reads
+
+    @property
+    def writes(self):
+        return self._rules.writes
+
+    @property
+    def creates(self):
+        return self._rules.creates
+
+    @property
+    def item_wise(self):
+        return self._rules.item_wise
+
+    def apply(self, user_data, scoring):
+        self._apply(user_data, scoring)
+
+    def __repr__(self):
+        return 'RulePolicy({!r})'.format(self.name)
+
+def _rule_step(policy, slots_wanted):
+    return policy._rules.build(policy, 'slots', slots_wanted)
+
+register_step_builder(RulePolicy, _rule_step)
+
+def policies_from_definition(definition, curr_date=None):
+    """Returns the list of `RulePolicy`s of a policy definition (see the top
+    of this module). Raises a `PolicyDefinitionError` if it's invalid."""
+    if not isinstance(definition, dict) or not isinstance(definition.get('policies'), list):
+        raise PolicyDefinitionError('policies', 'expected an object with a list of policies')
+    policies = []
+    names = set()
+    for index, entry in enumerate(definition['policies']):
+        where = 'policies[{}]'.format(index)
+        if not isinstance(entry, dict) or type(entry.get('name')) is not str or 'rules' not in entry:
+            raise PolicyDefinitionError(where, 'expected an object with a "name" and "rules"')
+        # A description may document the policy.
+        for key in entry:
+            if key not in ('name', 'description', 'rules'):
+                raise PolicyDefinitionError('{}.{}'.format(where, key), 'unknown key')
+        if entry['name'] in names:
+            raise PolicyDefinitionError(where + '.name', 'duplicated policy name')
+        names.add(entry['name'])
+        policies.append(RulePolicy(entry['name'], entry['rules'], curr_date))
+    return policies
+
+def parse_policies(data, curr_date=None):
+    """Same as `policies_from_definition` for a JSON document."""
+    try:
+        definition = json.loads(data)
+    except ValueError as err:
+        raise PolicyDefinitionError('policies', 'malformed JSON ({})'.format(err))
+    return policies_from_definition(definition, curr_date)
+
+def load_policies(path, curr_date=None):
+    """Same as `policies_from_definition` for a JSON file."""
+    with open(path, 'rb') as f:
+        return parse_policies(f.read(), curr_date)
@@ -0,0 +1,188 @@
+# The risk policies requests are scored with: the built-in
+# `CURRENT_RISK_POLICIES`, or those of the policy definition file at the
+# `POLICY_FILE` config key (see `policy_rules.py`). The file is checked for
+# changes at most every `POLICY_RELOAD_INTERVAL` seconds, before requests,
+# and reloaded when it changed.
+#
+# A reload compiles the new policies aside and swaps them in with a single
+# assignment. Requests read the active policies once (`get_active_policies`),
+# so those in flight finish with the policies they started with. Whatever
+# is cached per policy list (profile cache entries, compiled plans, stored
+# scoring states) isn't used with the new policies. A file that fails to
+# load is logged and the current policies are kept.
+#
+# Several named policy versions can be served at once (e.g. per state
+# regulation, or a pending change), each from its own file listed in the
+# `POLICY_VERSIONS` config key. Requests select one with the
+# `X-Policy-Version` header or the `policy_version` querystring argument;
+# without either, they're scored with the default version (`POLICY_FILE`,
+# or the built-in policies). Every version is compiled when it's loaded,
+# so switching from one to another rebuilds nothing.
+import hashlib
+import logging
+import os
+import threading
+import time
+from http import HTTPStatus
+from flask import current_app, g, request
+from werkzeug.exceptions import abort
+from .errors import PolicyDefinitionError
+from .incremental import IncrementalScorer
+from .metrics import NULL_METRICS, get_metrics
+from .policy_compiler import compile_policies
+from .policy_rules import parse_policies
+from .risk_profile_calculator import CURRENT_RISK_POLICIES
+
+logger = logging.getLogger(__name__)
+
+BUILTIN_VERSION = 'builtin'
+DEFAULT_POLICY_VERSION = 'default'
+POLICY_VERSION_HEADER = 'X-Policy-Version'
+
+class ActivePolicies:
+    """A policy list along with what's built for it."""
+    def __init__(self, policies, version, name=DEFAULT_POLICY_VERSION, definition=None):
+        self.policies = policies
+        # 'builtin', or a digest of the definition file.
+        self.version = version
+        # The policy version requests select these policies by.
+        self.name = name
+        # The contents of the definition file the policies were parsed from
+        # (None for the built-in policies), e.g. to parse them again in
+        # other processes.
+        self.definition = definition
+        self.incremental_scorer = IncrementalScorer(policies)
+        # Compiled plans by lines of insurance (None for all of them), kept
+        # along with the policies rather than only in the bounded cache of
+        # `compile_policies`, which many versions could thrash.
+        self._plans = {None: compile_policies(policies)}
+
+    def plan_for(self, lines=None):
+        """Returns the (cached) compiled plan computing `lines`, or None if
+        the policies can't be compiled."""
+        try:
+            return self._plans[lines]
+        except KeyError:
+            plan = self._plans[lines] = compile_policies(self.policies, lines)
+            return plan
+
+BUILTIN_POLICIES = ActivePolicies(CURRENT_RISK_POLICIES, BUILTIN_VERSION)
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+class PolicySet:
+    def __init__(self, path=None, name=DEFAULT_POLICY_VERSION, reload_interval=1.0, clock=time.monotonic, metrics=NULL_METRICS):
+        self.path = path
+        self.name = name
+        self.reload_interval = reload_interval
+        self.clock = clock
+        self.metrics = metrics
+        self.active = BUILTIN_POLICIES if name == DEFAULT_POLICY_VERSION else ActivePolicies(CURRENT_RISK_POLICIES, BUILTIN_VERSION, name)
+        self._file_signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        if path is not None:
+            # Unlike reloads, a file that fails to load at startup raises.
+            self.active = self._load(_file_signature(path))
+
+    def _load(self, file_signature):
+        self._file_signature = file_signature
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        active = ActivePolicies(parse_policies(data), hashlib.blake2b(data, digest_size=8).hexdigest(), self.name, data)
+        logger.info('loaded %d risk policies of %s from %s (version %s)', len(active.policies), self.name, self.path, active.version)
+        return active
+
+    def reload(self):
+        """Loads the policy file again if it changed since it was last loaded.
+        Returns whether the active policies changed."""
+        if self.path is None:
+            return False
+        # Another thread may be reloading, in which case this one goes on
+        # with the current policies.
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            try:
+                file_signature = _file_signature(self.path)
+                if file_signature == self._file_signature:
+                    return False
+                active = self._load(file_signature)
+            except (OSError, PolicyDefinitionError) as err:
+                logger.error('failed to reload the risk policies from %s, keeping version %s: %s', self.path, self.active.version, err)
+                self.metrics.count_policy_reload(False)
+                return False
+            self.active = active
+            self.metrics.count_policy_reload(True)
+            return True
+        finally:
+            self._lock.release()
+
+    def reload_if_due(self):
+        """Calls `reload` if it wasn't for `reload_interval` seconds."""
+        if self.path is None or self.reload_interval <= 0:
+            return
+        now = self.clock()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        self.reload()
+
+def get_policy_version():
+    """Returns the policy version the current request asked for, with the
+    `X-Policy-Version` header or the `policy_version` querystring argument
+    (the default one if neither is given)."""
+    return request.headers.get(POLICY_VERSION_HEADER) or request.args.get('policy_version') or DEFAULT_POLICY_VERSION
+
+def find_active_policies(name):
+    """Returns the current `ActivePolicies` of the policy version `name`, or
+    None if there's no such version."""
+    policy_set = current_app.extensions.get('policy_sets', {}).get(name)
+    if policy_set is not None:
+        return policy_set.active
+    if name == DEFAULT_POLICY_VERSION:
+        return BUILTIN_POLICIES
+    return None
+
+def get_active_policies():
+    """Returns the `ActivePolicies` of the current request: those of the
+    version it asked for (a `400` if there's no such version), the same ones
+    for the whole request, even if the policies are reloaded meanwhile."""
+    if 'active_policies' not in g:
+        name = get_policy_version()
+        active = find_active_policies(name)
+        if active is None:
+            abort(HTTPStatus.BAD_REQUEST, 'unknown policy version "{}"'.format(name))
+        g.active_policies = active
+        get_metrics().count_policy_version(name)
+    return g.active_policies
+
+def init_app(app):
+    app.config.setdefault('POLICY_FILE', None) # None uses the built-in policies
+    app.config.setdefault('POLICY_VERSIONS', {}) # name: policy file (None for the built-in policies)
+    app.config.setdefault('POLICY_RELOAD_INTERVAL', 1.0) # 0 never reloads
+    versions = dict(app.config['POLICY_VERSIONS'])
+    if app.config['POLICY_FILE'] is not None:
+        if DEFAULT_POLICY_VERSION in versions:
+            raise ValueError('the "{}" policy version is set by POLICY_FILE'.format(DEFAULT_POLICY_VERSION))
+        versions[DEFAULT_POLICY_VERSION] = app.config['POLICY_FILE']
+    if not versions:
+        return
+    policy_sets = app.extensions['policy_sets'] = {
+        name: PolicySet(
+            path,
+            name=name,
+            reload_interval=app.config['POLICY_RELOAD_INTERVAL'],
+            metrics=app.extensions.get('metrics', NULL_METRICS)
+        )
+        for name, path in versions.items()
+    }
+    if DEFAULT_POLICY_VERSION in policy_sets:
+        app.extensions['policy_set'] = policy_sets[DEFAULT_POLICY_VERSION]
+
+    @app.before_request
+    def reload_policies():
+        for policy_set in policy_sets.values():
+            policy_set.reload_if_due()
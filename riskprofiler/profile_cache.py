@@ -0,0 +1,162 @@
+import hashlib
+import marshal
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from .evaluation_context import evaluation_date
+from .line_of_insurance import Loi
+from .risk_profile_calculator import RiskProfileCalculator
+
+def user_data_fingerprint(user_data):
+    """Returns a digest identifying the answers in `user_data`. Houses and
+    vehicles are sorted by key, so resubmitting the same items in another
+    order gives the same fingerprint."""
+    houses = [(h.item_key(), h.zip_code, h.status.value) for h in user_data.houses()]
+    vehicles = [(v.item_key(), v.make, v.model, v.year) for v in user_data.vehicles()]
+    try:
+        # Keys are unique, so only they are compared.
+        houses.sort()
+        vehicles.sort()
+    except TypeError:
+        # Keys of different types (not from deserialized user data).
+        houses.sort(key=repr)
+        vehicles.sort(key=repr)
+    canonical = (
+        user_data.age,
+        user_data.gender.value,
+        user_data.marital_status.value,
+        user_data.dependents,
+        user_data.income,
+        tuple(user_data.risk_questions),
+        tuple(houses),
+        tuple(vehicles)
+    )
+    try:
+        # Version 2 doesn't depend on which objects are shared, unlike later
+        # ones, and is much faster than `repr`.
+        data = marshal.dumps(canonical, 2)
+    except ValueError:
+        data = repr(canonical).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def in_item_order(risk_profile, user_data):
+    """Copy of `risk_profile` with its items in the order of `user_data`'s
+    (a cached profile may come from a submission listing them in another
+    order)."""
+    profile = dict(risk_profile)
+    if Loi.home in profile:
+        scores = profile[Loi.home]
+        profile[Loi.home] = {h.item_key(): scores[h.item_key()] for h in user_data.houses()}
+    if Loi.auto in profile:
+        scores = profile[Loi.auto]
+        profile[Loi.auto] = {v.item_key(): scores[v.item_key()] for v in user_data.vehicles()}
+    return profile
+
+class ProfileCache:
+    """In-process LRU cache of risk profiles, bounded in size and with a TTL
+    per entry.
+
+    Entries are keyed by `user_data_fingerprint` within a namespace (e.g.
+    the policy version, see `policy_set.py`). The entries of a namespace are
+    invalidated when the policy list it is asked about changes (policy
+    objects are treated as immutable: build new ones to change a rule) or
+    when the evaluation date changes, since `RecentVehiclePolicy` depends on
+    it."""
+
+    def __init__(self, maxsize=10000, ttl=300, clock=time.monotonic, today=evaluation_date):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.today = today
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        # namespace: (policies, date) of its entries
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_generation(self, policies, namespace):
+        # Must be called with the lock held.
+        generation = (tuple(policies), self.today())
+        if generation != self._generations.get(namespace):
+            stale = [key for key in self._entries if key[0] == namespace]
+            if stale:
+                self.invalidations += 1
+                for key in stale:
+                    del self._entries[key]
+            self._generations[namespace] = generation
+
+    def get(self, user_data, policies, fingerprint=None, namespace=None):
+        """Returns the cached profile for `user_data`, or None."""
+        key = (namespace, user_data_fingerprint(user_data) if fingerprint is None else fingerprint)
+        with self._lock:
+            self._check_generation(policies, namespace)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            risk_profile, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return in_item_order(risk_profile, user_data)
+
+    def put(self, user_data, policies, risk_profile, fingerprint=None, namespace=None):
+        key = (namespace, user_data_fingerprint(user_data) if fingerprint is None else fingerprint)
+        with self._lock:
+            self._check_generation(policies, namespace)
+            self._entries[key] = (risk_profile, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_calculate(self, user_data, policies, policy_timer=None):
+        fingerprint = user_data_fingerprint(user_data)
+        risk_profile = self.get(user_data, policies, fingerprint)
+        if risk_profile is None:
+            risk_profile = RiskProfileCalculator(user_data=user_data, risk_policies=policies, policy_timer=policy_timer).calculate()
+            self.put(user_data, policies, risk_profile, fingerprint)
+        return risk_profile
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+def get_profile_cache():
+    """Returns the app's profile cache, or None if it's disabled."""
+    return current_app.extensions.get('profile_cache')
+
+def init_app(app):
+    app.config.setdefault('PROFILE_CACHE_SIZE', 10000)
+    app.config.setdefault('PROFILE_CACHE_TTL', 300)
+    if app.config['PROFILE_CACHE_SIZE'] > 0:
+        app.extensions['profile_cache'] = ProfileCache(
+            maxsize=app.config['PROFILE_CACHE_SIZE'],
+            ttl=app.config['PROFILE_CACHE_TTL']
+        )
@@ -0,0 +1,77 @@
+# Compact binary encoding of risk profiles (as returned by
+# `RiskProfileCalculator.calculate`), for storage.
+#
+# Layout: a format version byte, then one tag byte per line of insurance (in
+# `Loi.all_lines()` order): 0 if the line isn't in the profile, the code of
+# its risk aversion for single item lines, or `ITEMS_TAG` followed by the
+# item count and `(key, aversion code)` pairs. Counts and keys are varints
+# (keys zigzag encoded, so negative ones work too).
+from .line_of_insurance import Loi
+from .risk_profile_calculator import RiskAversion
+
+FORMAT_VERSION = 1
+
+ABSENT_TAG = 0
+ITEMS_TAG = 0xff
+AVERSION_FOR_CODE = {code: aversion for code, aversion in enumerate(RiskAversion, start=1)}
+CODE_FOR_AVERSION = {aversion: code for code, aversion in AVERSION_FOR_CODE.items()}
+
+def _write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(data, pos):
+    n = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+def encode_profile(risk_profile):
+    out = bytearray((FORMAT_VERSION,))
+    for loi in Loi.all_lines():
+        val = risk_profile.get(loi)
+        if val is None:
+            out.append(ABSENT_TAG)
+        elif isinstance(val, dict):
+            out.append(ITEMS_TAG)
+            _write_varint(out, len(val))
+            for key, aversion in val.items():
+                _write_varint(out, key << 1 if key >= 0 else (-key << 1) - 1)
+                out.append(CODE_FOR_AVERSION[aversion])
+        else:
+            out.append(CODE_FOR_AVERSION[val])
+    return bytes(out)
+
+def decode_profile(data):
+    """Inverse of `encode_profile`. Raises a `ValueError` for data in an
+    unknown format."""
+    if not data or data[0] != FORMAT_VERSION:
+        raise ValueError('unknown risk profile format')
+    risk_profile = {}
+    pos = 1
+    try:
+        for loi in Loi.all_lines():
+            tag = data[pos]
+            pos += 1
+            if tag == ABSENT_TAG:
+                continue
+            if tag != ITEMS_TAG:
+                risk_profile[loi] = AVERSION_FOR_CODE[tag]
+                continue
+            count, pos = _read_varint(data, pos)
+            items = {}
+            for _ in range(count):
+                zigzag, pos = _read_varint(data, pos)
+                items[zigzag >> 1 if not zigzag & 1 else -((zigzag + 1) >> 1)] = AVERSION_FOR_CODE[data[pos]]
+                pos += 1
+            risk_profile[loi] = items
+    except (IndexError, KeyError):
+        raise ValueError('truncated or corrupted risk profile')
+    return risk_profile
@@ -0,0 +1,67 @@
+# Encodes risk profiles straight to JSON bytes, from fragments encoded once
+# for every (line of insurance, risk aversion) pair.
+#
+# The output is the same JSON `jsonify(RiskProfileSerializer().to_dict(p))`
+# gives with Flask's default (non-debug) settings, byte for byte: keys are
+# sorted, separators are compact and there's a trailing newline. Unlike
+# `jsonify`, it stays compact in debug mode.
+import json
+from flask import current_app
+from .line_of_insurance import Loi
+from .risk_profile_calculator import RiskAversion
+
+class StdlibJsonCodec:
+    """Default JSON codec. Any object with the same `loads` method (e.g.
+    wrapping orjson) can be set as the app's `JSON_CODEC`."""
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+STDLIB_JSON_CODEC = StdlibJsonCodec()
+
+def get_json_codec():
+    return current_app.config.get('JSON_CODEC') or STDLIB_JSON_CODEC
+
+def _encode_str(s):
+    return json.dumps(s).encode('utf-8')
+
+class RiskProfileEncoder:
+    def __init__(self):
+        # Lines in the order their (sorted) keys appear in the output.
+        self.lois = tuple(sorted(Loi.all_lines(), key=lambda loi: loi.value))
+        self.loi_prefixes = {loi: _encode_str(loi.value) + b':' for loi in self.lois}
+        self.single_fragments = {
+            (loi, aversion): self.loi_prefixes[loi] + _encode_str(aversion.value)
+            for loi in self.lois for aversion in RiskAversion
+        }
+        self.item_suffixes = {
+            aversion: b',"value":' + _encode_str(aversion.value) + b'}'
+            for aversion in RiskAversion
+        }
+
+    def _encode_item_key(self, key):
+        if type(key) is int:
+            return str(key).encode('ascii')
+        return json.dumps(key).encode('utf-8')
+
+    def encode(self, risk_profile):
+        """Returns the JSON bytes of a risk profile (as returned by
+        `RiskProfileCalculator.calculate`)."""
+        parts = []
+        for loi in self.lois:
+            if loi not in risk_profile:
+                continue
+            val = risk_profile[loi]
+            if isinstance(val, dict):
+                items = b','.join([
+                    b'{"key":' + self._encode_item_key(item_key) + self.item_suffixes[aversion]
+                    for item_key, aversion in val.items()
+                ])
+                parts.append(self.loi_prefixes[loi] + b'[' + items + b']')
+            else:
+                parts.append(self.single_fragments[(loi, val)])
+        return b'{' + b','.join(parts) + b'}\n'
+
+RISK_PROFILE_ENCODER = RiskProfileEncoder()
@@ -1,11 +1,28 @@
 from .line_of_insurance import Loi
-import datetime
+from .evaluation_context import context_for
+
+ALL_LINES = frozenset(Loi.all_lines())
 
 class BaseRiskPolicy:
+    # The `UserData` fields a policy reads (None if unknown), the lines of
+    # insurance whose scores it may change, and the lines it creates scores
+    # for. A policy that doesn't create any line is a no-op for lines that
+    # are missing (not created yet, or disabled).
+    reads = None
+    writes = ALL_LINES
+    creates = frozenset()
+    # Item collection ('houses' or 'vehicles') such that applying the policy
+    # is the same as applying it to each of its items alone, if any.
+    item_wise = None
+
     def apply(self, user_data, risk_scoring):
         raise NotImplementedError('subclass must implement "apply" method')
 
 class InitialRiskPolicy(BaseRiskPolicy):
+    reads = frozenset(('risk_questions', 'houses', 'vehicles'))
+    writes = ALL_LINES
+    creates = ALL_LINES
+
     def apply(self, user_data, scoring):
         base_score_value = user_data.base_score()
 
@@ -21,21 +38,33 @@ class InitialRiskPolicy(BaseRiskPolicy):
             scoring.create_item(loi=Loi.auto, item=vehicle.item_key(), score=base_score_value)
 
 class NoIncomePolicy(BaseRiskPolicy):
+    reads = frozenset(('income',))
+    writes = frozenset((Loi.disability,))
+
     def apply(self, user_data, scoring):
         if not user_data.has_income():
             scoring.disable(loi=Loi.disability)
 
 class NoVehiclePolicy(BaseRiskPolicy):
+    reads = frozenset(('vehicles',))
+    writes = frozenset((Loi.auto,))
+
     def apply(self, user_data, scoring):
         if not user_data.has_vehicles():
             scoring.disable(loi=Loi.auto)
 
 class NoHousePolicy(BaseRiskPolicy):
+    reads = frozenset(('houses',))
+    writes = frozenset((Loi.home,))
+
     def apply(self, user_data, scoring):
         if not user_data.has_houses():
             scoring.disable(loi=Loi.home)
 
 class AgePolicy(BaseRiskPolicy):
+    reads = frozenset(('age',))
+    writes = ALL_LINES
+
     def apply(self, user_data, scoring):
         if user_data.is_under_age(30):
             for loi in Loi.all_lines():
@@ -48,6 +77,9 @@ class AgePolicy(BaseRiskPolicy):
             scoring.disable(loi=Loi.life)
 
 class LargeIncomePolicy(BaseRiskPolicy):
+    reads = frozenset(('income',))
+    writes = ALL_LINES
+
     LARGE_INCOME_THRESH = 200000
 
     def __init__(self, large_income_thresh=LARGE_INCOME_THRESH):
@@ -59,6 +91,9 @@ class LargeIncomePolicy(BaseRiskPolicy):
                 scoring.subtract(points=1, loi=loi)
 
 class MortgagedHousePolicy(BaseRiskPolicy):
+    reads = frozenset(('houses',))
+    writes = frozenset((Loi.disability, Loi.home))
+
     def apply(self, user_data, scoring):
         if user_data.has_mortgaged_houses():
             scoring.add(points=1, loi=Loi.disability)
@@ -66,35 +101,55 @@ class MortgagedHousePolicy(BaseRiskPolicy):
                 scoring.add(points=1, loi=Loi.home, item=house.item_key())
 
 class DependentsPolicy(BaseRiskPolicy):
+    reads = frozenset(('dependents',))
+    writes = frozenset((Loi.disability, Loi.life))
+
     def apply(self, user_data, scoring):
         if user_data.has_dependents():
             scoring.add(points=1, loi=Loi.disability)
             scoring.add(points=1, loi=Loi.life)
 
 class MaritalStatusPolicy(BaseRiskPolicy):
+    reads = frozenset(('marital_status',))
+    writes = frozenset((Loi.life, Loi.disability))
+
     def apply(self, user_data, scoring):
         if user_data.is_married():
             scoring.add(points=1, loi=Loi.life)
             scoring.subtract(points=1, loi=Loi.disability)
 
 class RecentVehiclePolicy(BaseRiskPolicy):
+    reads = frozenset(('vehicles',))
+    writes = frozenset((Loi.auto,))
+    item_wise = 'vehicles'
+
     NUM_RECENT_YEARS = 5
     def __init__(self, curr_date=None, num_recent_years=NUM_RECENT_YEARS):
-        self.curr_date = datetime.date.today() if curr_date is None else curr_date
+        # None evaluates at the date of the current `EvaluationContext`.
+        self.curr_date = curr_date
         self.num_recent_years = num_recent_years
 
+    def first_recent_year(self):
+        """Returns the first production year of recent vehicles."""
+        return context_for(self.curr_date).first_year_within(self.num_recent_years)
+
     def apply(self, user_data, scoring):
-        for vehicle in user_data.vehicles():
-            if vehicle.years_since_production(self.curr_date) <= self.num_recent_years:
-                scoring.add(points=1, loi=Loi.auto, item=vehicle.item_key())
+        for vehicle in user_data.get_vehicles_since_year(self.first_recent_year()):
+            scoring.add(points=1, loi=Loi.auto, item=vehicle.item_key())
 
 class SingleHousePolicy(BaseRiskPolicy):
+    reads = frozenset(('houses',))
+    writes = frozenset((Loi.home,))
+
     def apply(self, user_data, scoring):
         if user_data.houses_count() == 1:
             house = user_data.get_house_at(0)
             scoring.add(points=1, loi=Loi.home, item=house.item_key())
 
 class SingleVehiclePolicy(BaseRiskPolicy):
+    reads = frozenset(('vehicles',))
+    writes = frozenset((Loi.auto,))
+
     def apply(self, user_data, scoring):
         if user_data.vehicles_count() == 1:
             vehicle = user_data.get_vehicle_at(0)
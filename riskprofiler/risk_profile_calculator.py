@@ -1,6 +1,8 @@
+import time
 from enum import Enum, unique
 from .risk_scoring import RiskScoring
-from .risk_policies import InitialRiskPolicy, NoIncomePolicy, NoVehiclePolicy, NoHousePolicy, AgePolicy, LargeIncomePolicy, MortgagedHousePolicy, DependentsPolicy, MaritalStatusPolicy, RecentVehiclePolicy, SingleHousePolicy, SingleVehiclePolicy
+from .policy_compiler import compile_policies
+from .risk_policies import ALL_LINES, InitialRiskPolicy, NoIncomePolicy, NoVehiclePolicy, NoHousePolicy, AgePolicy, LargeIncomePolicy, MortgagedHousePolicy, DependentsPolicy, MaritalStatusPolicy, RecentVehiclePolicy, SingleHousePolicy, SingleVehiclePolicy
 
 CURRENT_RISK_POLICIES = [
     InitialRiskPolicy(),
@@ -38,8 +40,46 @@ class RiskProfileCalculator:
         self.policies = CURRENT_RISK_POLICIES if 'risk_policies' not in kwargs else kwargs['risk_policies']
         self.scoring = RiskScoring() if 'risk_scoring' not in kwargs else kwargs['risk_scoring']
         self.mapping = RiskScoreValueMapping() if 'risk_score_value_mapping' not in kwargs else kwargs['risk_score_value_mapping']
+        # Lines of insurance to compute (all of them by default). Policies
+        # that can't change any of them aren't applied.
+        self.lines = None if kwargs.get('lines') is None else frozenset(kwargs['lines'])
+        # The compiled plan can't be used when the caller wants the policies
+        # applied to its own scoring object, or for unknown policy types. A
+        # `plan` compiled beforehand (for the same policies and lines) saves
+        # looking it up.
+        if 'risk_scoring' in kwargs:
+            self.plan = None
+        else:
+            self.plan = compile_policies(self.policies, self.lines) if 'plan' not in kwargs else kwargs['plan']
+        # Called as `policy_timer(policy, seconds)` after each policy is
+        # applied (e.g. `Metrics.observe_policy`).
+        self.policy_timer = None if 'policy_timer' not in kwargs else kwargs['policy_timer']
     
     def calculate(self):
+        if self.plan is not None:
+            return self.plan.evaluate(self.user_data, self.mapping, self.policy_timer)
+        policies = self.policies if self.lines is None else self._policies_for_lines()
+        if self.policy_timer is None:
+            for policy in policies:
+                policy.apply(self.user_data, self.scoring)
+        else:
+            for policy in policies:
+                start = time.perf_counter()
+                policy.apply(self.user_data, self.scoring)
+                self.policy_timer(policy, time.perf_counter() - start)
+        risk_profile = self.scoring.as_profile(self.mapping)
+        if self.lines is None:
+            return risk_profile
+        return {loi: val for loi, val in risk_profile.items() if loi in self.lines}
+
+    def _policies_for_lines(self):
+        """Yields the policies to apply to compute `self.lines`, skipping
+        those only changing other lines or lines already missing from the
+        scoring (which would be no-ops)."""
         for policy in self.policies:
-            policy.apply(self.user_data, self.scoring)
-        return self.scoring.as_profile(self.mapping)
+            writes = getattr(policy, 'writes', ALL_LINES) & self.lines
+            if not writes:
+                continue
+            if not getattr(policy, 'creates', None) and not any(loi in self.scoring for loi in writes):
+                continue
+            yield policy
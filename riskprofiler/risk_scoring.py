@@ -1,7 +1,11 @@
+from collections.abc import Mapping
 from enum import Enum, unique
 from .errors import InvalidRiskScoreOperation
+from .line_of_insurance import LOI_ORDINAL
 
 class _SingleItemRiskScore:
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -21,67 +25,115 @@ class _SingleItemRiskScore:
     def mapped_with(self, mapping):
         return mapping.map_score_value(self.value)
 
-class _MultipleItemRiskScore(dict):
+class _MultipleItemRiskScore(Mapping):
+    """Scores by item key. Points added to every item are kept aside in
+    `offset` rather than added to each one; `_values` holds the scores minus
+    `offset`. It's a read-only mapping (`get`, `items`, `==`... go through
+    `__getitem__`, which adds the offset back); scores only change through
+    the methods below."""
+    __slots__ = ('_values', 'offset')
+
+    def __init__(self, scores=None):
+        self._values = {} if scores is None else dict(scores)
+        self.offset = 0
+
+    def __getitem__(self, key):
+        return self._values[key] + self.offset
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(self.items()))
+
     def create_item(self, key, value):
-        self[key] = value
+        self._values[key] = value - self.offset
 
     def subtract_from(self, key, points):
-        self[key] -= points
+        self._values[key] -= points
 
     def add(self, points, key):
         if key is None:
-            for key, _ in self.items():
-                self[key] += points
+            self.offset += points
         else:
-            self[key] += points
+            self._values[key] += points
 
     def subtract(self, points, key):
         if key is None:
-            for key, _ in self.items():
-                self[key] -= points
+            self.offset -= points
         else:
-            self[key] -= points
+            self._values[key] -= points
 
     def mapped_with(self, mapping):
-        mapped = {}
-        for key, value in self.items():
-            mapped[key] = mapping.map_score_value(value)
-        return mapped
+        offset = self.offset
+        map_score_value = mapping.map_score_value
+        return {key: map_score_value(value + offset) for key, value in self._values.items()}
+
+class RiskScoring:
+    """Scores of each line of insurance, stored in a fixed array indexed by
+    `LOI_ORDINAL`. A None entry means the line wasn't created or was
+    disabled."""
+    __slots__ = ('_scores',)
+
+    def __init__(self, scores=None):
+        self._scores = [None] * len(LOI_ORDINAL)
+        if scores is not None:
+            for loi, score in scores.items():
+                self._scores[LOI_ORDINAL[loi]] = score
+
+    def __getitem__(self, loi):
+        score = self._scores[LOI_ORDINAL[loi]]
+        if score is None:
+            raise KeyError(loi)
+        return score
+
+    def __contains__(self, loi):
+        return self._scores[LOI_ORDINAL[loi]] is not None
+
+    def __len__(self):
+        return sum(1 for score in self._scores if score is not None)
+
+    def items(self):
+        """Yields (loi, score) pairs of the enabled lines, in `Loi.all_lines()`
+        order."""
+        for loi, i in LOI_ORDINAL.items():
+            score = self._scores[i]
+            if score is not None:
+                yield loi, score
 
-class RiskScoring(dict):
     def create(self, **kwargs):
         loi = kwargs['loi']
         multiple_items = kwargs['multiple_items'] if 'multiple_items' in kwargs else False
         if multiple_items:
-            self[loi] = _MultipleItemRiskScore()
+            self._scores[LOI_ORDINAL[loi]] = _MultipleItemRiskScore()
         else:
-            score = kwargs['score']
-            self[loi] = _SingleItemRiskScore(score)
+            self._scores[LOI_ORDINAL[loi]] = _SingleItemRiskScore(kwargs['score'])
 
     def create_item(self, **kwargs):
-        loi = kwargs['loi']
-        item = kwargs['item']
-        score = kwargs['score']
-        if loi in self:
-            self[loi].create_item(item, score)
+        score = self._scores[LOI_ORDINAL[kwargs['loi']]]
+        if score is not None:
+            score.create_item(kwargs['item'], kwargs['score'])
 
     def add(self, **kwargs):
-        loi = kwargs['loi']
-        points = kwargs['points']
-        item = kwargs['item'] if 'item' in kwargs else None
-        if loi in self:
-            self[loi].add(points, item)
+        score = self._scores[LOI_ORDINAL[kwargs['loi']]]
+        if score is not None:
+            score.add(kwargs['points'], kwargs['item'] if 'item' in kwargs else None)
 
     def subtract(self, **kwargs):
-        loi = kwargs['loi']
-        points = kwargs['points']
-        item = kwargs['item'] if 'item' in kwargs else None
-        if loi in self:
-            self[loi].subtract(points, item)
+        score = self._scores[LOI_ORDINAL[kwargs['loi']]]
+        if score is not None:
+            score.subtract(kwargs['points'], kwargs['item'] if 'item' in kwargs else None)
     
     def disable(self, **kwargs):
-        loi = kwargs['loi']
-        del self[loi]
+        # More than one policy may disable the same line (e.g. no income
+        # and over 60 both disable disability), so this must be idempotent.
+        self._scores[LOI_ORDINAL[kwargs['loi']]] = None
     
     def as_profile(self, mapping):
         profile = {}
@@ -0,0 +1,12 @@
+DROP TABLE IF EXISTS risk_profile;
+
+-- Profiles are `profile_codec` blobs and states are encoded
+-- `incremental.ScoringState`s (NULL when the profile can't be updated
+-- incrementally). The primary key is the lookup index (WITHOUT ROWID
+-- stores the rows in it, so a lookup is a single b-tree search).
+CREATE TABLE risk_profile (
+  user_id TEXT PRIMARY KEY NOT NULL,
+  profile BLOB NOT NULL,
+  updated_at REAL NOT NULL,
+  state BLOB
+) WITHOUT ROWID;
@@ -2,8 +2,8 @@
 # serialization lib (e.g. marshmallow) and use it. Writing a "quick and 
 # dirty" serializer for this from scratch only made sense here
 # because I'm under a time constraint.
-from riskprofiler.user_data import UserData, ItemData, ItemDataCollection, VehicleItemData, HouseItemData, Gender, MaritalStatus, HouseStatus
-from .errors import MissingKeyDeserializationError, WrongKeyTypeDeserializationError
+from riskprofiler.user_data import UserData, ItemData, ItemDataCollection, VehicleItemData, HouseItemData, Gender, MaritalStatus, HouseStatus, GENDER_FOR_STR, MARITAL_STATUS_FOR_STR, HOUSE_STATUS_FOR_STR
+from .errors import MissingKeyDeserializationError, WrongKeyTypeDeserializationError, InvalidValueDeserializationError, DeserializationErrors
 
 def fetch(obj, key, _type):
     if key in obj:
@@ -14,33 +14,195 @@ def fetch(obj, key, _type):
     else:
         raise MissingKeyDeserializationError(key)
 
+_MISSING = object()
+
+def _key_path(parent, index, key):
+    return '{}[{}].{}'.format(parent, index, key) if parent is not None else key
+
+def _compile_fast_check(fields):
+    """Returns a function `check(obj, errors, parent, index)` returning the
+    converted values of `obj`, or None when some field is missing, has a
+    wrong type or an invalid enum value (the full checks then find out
+    which)."""
+    namespace = {'_key_path': _key_path}
+    lines = [
+        'def check(obj, errors, parent, index):',
+        '    if type(obj) is not dict:',
+        '        return None',
+        '    try:'
+    ]
+    for i, (key, _type, convert) in enumerate(fields):
+        namespace['key{}'.format(i)] = key
+        namespace['type{}'.format(i)] = _type
+        lines.append('        v{0} = obj[key{0}]'.format(i))
+    lines += [
+        '    except KeyError:',
+        '        return None',
+        '    if {}:'.format(' or '.join('type(v{0}) is not type{0}'.format(i) for i in range(len(fields)))),
+        '        return None'
+    ]
+    loaders = []
+    for i, (key, _type, convert) in enumerate(fields):
+        namespace['convert{}'.format(i)] = convert
+        if isinstance(convert, dict):
+            lines += [
+                '    v{0} = convert{0}.get(v{0})'.format(i),
+                '    if v{} is None:'.format(i),
+                '        return None'
+            ]
+        elif convert is not None:
+            loaders.append('    v{0} = convert{0}(v{0}, _key_path(parent, index, key{0}), errors)'.format(i))
+    # Loaders (which may raise or collect errors) only run once every enum
+    # lookup succeeded, so they never run twice for the same object.
+    lines += loaders
+    lines.append('    return [{}]'.format(', '.join('v{}'.format(i) for i in range(len(fields)))))
+    exec('\n'.join(lines), namespace)
+    return namespace['check']
+
+class ObjectSchema:
+    """The keys of a serialized object, checked in a single pass.
+
+    `fields` are `(key, type, convert)` tuples, where `convert` is None, a
+    lookup table from serialized strings to enum members, or a function
+    `convert(value, key_path, errors)` (see `check`).
+
+    Valid objects take a fast path, compiled from the fields into a single
+    function (see `_compile_fast_check`). Anything else goes through the
+    field by field checks, which report errors."""
+
+    def __init__(self, *fields):
+        self.fields = tuple(
+            (key, _type, convert, self._choices_reason(convert))
+            for key, _type, convert in fields
+        )
+        self._check_fast = _compile_fast_check(fields)
+
+    @staticmethod
+    def _choices_reason(convert):
+        if not isinstance(convert, dict):
+            return None
+        return 'expected one of {}'.format(', '.join('"{}"'.format(c) for c in convert))
+
+    def check(self, obj, errors=None, parent=None, index=None):
+        """Returns the list of field values of `obj`, in field order.
+
+        If `errors` is None, the first invalid field raises a
+        `DeserializationError`. Otherwise, errors are appended to it and the
+        return value is None if there was any. `parent` and `index` locate
+        items of a list in error messages (e.g. `houses[3].status`)."""
+        values = self._check_fast(obj, errors, parent, index)
+        if values is not None:
+            return values
+        if type(obj) is not dict:
+            if parent is not None:
+                err = WrongKeyTypeDeserializationError('{}[{}]'.format(parent, index), type(obj), dict)
+                if errors is None:
+                    raise err
+                errors.append(err)
+                return None
+            obj = {}
+        values = []
+        valid = True
+        for key, _type, convert, choices_reason in self.fields:
+            value = obj.get(key, _MISSING)
+            if value is _MISSING:
+                err = MissingKeyDeserializationError(_key_path(parent, index, key))
+            elif type(value) is not _type:
+                err = WrongKeyTypeDeserializationError(_key_path(parent, index, key), type(value), _type)
+            elif convert is None:
+                values.append(value)
+                continue
+            elif choices_reason is not None:
+                member = convert.get(value)
+                if member is not None:
+                    values.append(member)
+                    continue
+                err = InvalidValueDeserializationError(_key_path(parent, index, key), value, choices_reason)
+            else:
+                values.append(convert(value, _key_path(parent, index, key), errors))
+                continue
+            if errors is None:
+                raise err
+            errors.append(err)
+            valid = False
+        return values if valid else None
+
+HOUSE_SCHEMA = ObjectSchema(
+    ('key', int, None),
+    ('zip_code', int, None),
+    ('status', str, HOUSE_STATUS_FOR_STR)
+)
+
+VEHICLE_SCHEMA = ObjectSchema(
+    ('key', int, None),
+    ('make', str, None),
+    ('model', str, None),
+    ('year', int, None)
+)
+
+def _item_collection_loader(schema, build):
+    def load(items_obj, key_path, errors):
+        item_data_for_key = {}
+        for index, item_obj in enumerate(items_obj):
+            values = schema.check(item_obj, errors, key_path, index)
+            if values is None:
+                continue
+            item_key = values[0]
+            if item_key in item_data_for_key:
+                err = InvalidValueDeserializationError(_key_path(key_path, index, 'key'), item_key, 'duplicated item key')
+                if errors is None:
+                    raise err
+                errors.append(err)
+                continue
+            item_data_for_key[item_key] = build(*values)
+        return ItemDataCollection.from_dict(item_data_for_key)
+    return load
+
+def _load_risk_questions(risk_questions, key_path, errors):
+    for index, answer in enumerate(risk_questions):
+        if type(answer) is not int:
+            err = WrongKeyTypeDeserializationError('{}[{}]'.format(key_path, index), type(answer), int)
+            if errors is None:
+                raise err
+            errors.append(err)
+    return risk_questions
+
+# Fields are checked in this order, so the first error reported is the
+# same as when each key was fetched one after the other.
+USER_DATA_SCHEMA = ObjectSchema(
+    ('age', int, None),
+    ('gender', str, GENDER_FOR_STR),
+    ('marital_status', str, MARITAL_STATUS_FOR_STR),
+    ('dependents', int, None),
+    ('income', int, None),
+    ('houses', list, _item_collection_loader(HOUSE_SCHEMA, HouseItemData)),
+    ('vehicles', list, _item_collection_loader(VEHICLE_SCHEMA, VehicleItemData)),
+    ('risk_questions', list, _load_risk_questions)
+)
+
+def _check(schema, obj, collect_errors):
+    if not collect_errors:
+        return schema.check(obj)
+    errors = []
+    values = schema.check(obj, errors)
+    if errors:
+        raise DeserializationErrors(errors)
+    return values
+
 class VehicleItemDataDeserializer:
-    def load(self, obj):
-        key = fetch(obj, 'key', int)
-        make = fetch(obj, 'make', str)
-        model = fetch(obj, 'model', str)
-        year = fetch(obj, 'year', int)
-        return VehicleItemData(key, make=make, model=model, year=year)
+    def load(self, obj, collect_errors=False):
+        return VehicleItemData(*_check(VEHICLE_SCHEMA, obj, collect_errors))
 
 class HouseItemDataDeserializer:
-    def load(self, obj):
-        key = fetch(obj, 'key', int)
-        zip_code = fetch(obj, 'zip_code', int)
-        status = HouseStatus.from_str(fetch(obj, 'status', str))
-        return HouseItemData(key, zip_code=zip_code, status=status)
+    def load(self, obj, collect_errors=False):
+        return HouseItemData(*_check(HOUSE_SCHEMA, obj, collect_errors))
 
 class UserDataDeserializer:
-    def load(self, obj):
-        age = fetch(obj, 'age', int)
-        gender = Gender.from_str(fetch(obj, 'gender', str))
-        marital_status = MaritalStatus.from_str(fetch(obj, 'marital_status', str))
-        dependents = fetch(obj, 'dependents', int)
-        income = fetch(obj, 'income', int)
-        houses_obj = fetch(obj, 'houses', list)
-        houses = ItemDataCollection(*[HouseItemDataDeserializer().load(h) for h in houses_obj])
-        vehicles_obj = fetch(obj, 'vehicles', list)
-        vehicles = ItemDataCollection(*[VehicleItemDataDeserializer().load(v) for v in vehicles_obj])
-        risk_questions = fetch(obj, 'risk_questions', list)
+    def load(self, obj, collect_errors=False):
+        """Returns the `UserData` in `obj`. Raises the first
+        `DeserializationError` found or, with `collect_errors`, a single
+        `DeserializationErrors` holding all of them."""
+        age, gender, marital_status, dependents, income, houses, vehicles, risk_questions = _check(USER_DATA_SCHEMA, obj, collect_errors)
         return UserData(
             age=age,
             gender=gender,
@@ -52,6 +214,20 @@ class UserDataDeserializer:
             risk_questions=risk_questions
         )
 
+class UserDataSerializer:
+    """Inverse of `UserDataDeserializer`."""
+    def to_dict(self, user_data):
+        return {
+            'age': user_data.age,
+            'gender': user_data.gender.value,
+            'marital_status': user_data.marital_status.value,
+            'dependents': user_data.dependents,
+            'income': user_data.income,
+            'risk_questions': list(user_data.risk_questions),
+            'houses': [{'key': h.item_key(), 'zip_code': h.zip_code, 'status': h.status.value} for h in user_data.houses()],
+            'vehicles': [{'key': v.item_key(), 'make': v.make, 'model': v.model, 'year': v.year} for v in user_data.vehicles()]
+        }
+
 class RiskProfileSerializer:
     def to_dict(self, risk_profile):
         obj = {}
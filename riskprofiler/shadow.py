@@ -0,0 +1,187 @@
+# Shadow evaluation of a candidate policy version: profiles returned by
+# `/risk_profile` (scored with the default version) are scored again with
+# the candidate policies, off the request path, to see how many of them a
+# policy change would change before it's shipped.
+#
+# Requests only hand the deserialized user data and their profile to a
+# bounded queue, read by a small pool of background threads. When the
+# queue is full, the work is dropped (and counted) rather than slowing
+# requests down. Per line of insurance diff counts and a random sample of
+# the changed profiles are returned by `stats`.
+import atexit
+import logging
+import queue
+import random
+import threading
+from flask import current_app
+from .evaluation_context import evaluated_at, evaluation_date
+from .line_of_insurance import Loi
+from .metrics import NULL_METRICS
+from .risk_profile_calculator import RiskProfileCalculator
+from .serialization import RiskProfileSerializer, UserDataSerializer
+
+logger = logging.getLogger(__name__)
+
+class ShadowEvaluator:
+    def __init__(self, candidate, workers=1, queue_size=1000, sample_size=20, metrics=NULL_METRICS, rng=None):
+        if queue_size < 1:
+            # A `queue.Queue` of size 0 would never be full.
+            raise ValueError('the shadow queue size must be at least 1')
+        # `PolicySet` of the candidate policies (reloads are followed).
+        self.candidate = candidate
+        self.workers = workers
+        self.sample_size = sample_size
+        self.metrics = metrics
+        self.rng = random.Random() if rng is None else rng
+        self.compared = 0
+        self.changed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.diff_counts = {loi: 0 for loi in Loi}
+        # (user data, live profile, candidate profile, changed lines)
+        self.samples = []
+        self._queue = queue.Queue(queue_size)
+        self._threads = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # The worker threads start with the first profile submitted.
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name='shadow-evaluator-{}'.format(i), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, user_data, risk_profile, lines=None):
+        """Queues `user_data` to be scored with the candidate policies and
+        compared to `risk_profile` (computing `lines`, all of them if None),
+        at the current evaluation date. Never blocks: returns whether it was
+        queued, or dropped because the queue is full."""
+        if self._closed:
+            return False
+        if not self._threads:
+            self._start()
+        try:
+            self._queue.put_nowait((user_data, risk_profile, lines, evaluation_date()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            self.metrics.count_shadow_profile('dropped')
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._evaluate(*job)
+            except Exception:
+                logger.exception('failed to score a shadow profile with the candidate policies')
+                with self._lock:
+                    self.errors += 1
+                self.metrics.count_shadow_profile('error')
+            finally:
+                self._queue.task_done()
+
+    def _evaluate(self, user_data, risk_profile, lines, date):
+        active = self.candidate.active
+        with evaluated_at(date):
+            calculator = RiskProfileCalculator(user_data=user_data, risk_policies=active.policies, plan=active.plan_for(lines), lines=lines)
+            candidate_profile = calculator.calculate()
+        changed = [loi for loi in Loi if risk_profile.get(loi) != candidate_profile.get(loi)]
+        with self._lock:
+            self.compared += 1
+            if changed:
+                self.changed += 1
+                for loi in changed:
+                    self.diff_counts[loi] += 1
+                # Reservoir sampling: every changed profile is as likely to
+                # be in the sample.
+                sample = (user_data, risk_profile, candidate_profile, changed)
+                if len(self.samples) < self.sample_size:
+                    self.samples.append(sample)
+                else:
+                    i = self.rng.randrange(self.changed)
+                    if i < self.sample_size:
+                        self.samples[i] = sample
+        self.metrics.count_shadow_profile('changed' if changed else 'unchanged')
+        for loi in changed:
+            self.metrics.count_shadow_diff(loi.value)
+
+    def flush(self):
+        """Blocks until every queued profile was compared."""
+        self._queue.join()
+
+    def close(self):
+        """Stops the worker threads, dropping the queued profiles."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def stats(self):
+        user_data_serializer = UserDataSerializer()
+        profile_serializer = RiskProfileSerializer()
+        with self._lock:
+            samples = list(self.samples)
+            stats = {
+                'candidate': self.candidate.name,
+                'version': self.candidate.active.version,
+                'queued': self._queue.qsize(),
+                'compared': self.compared,
+                'changed': self.changed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'diffs': {loi.value: count for loi, count in self.diff_counts.items()}
+            }
+        stats['samples'] = [
+            {
+                'user_data': user_data_serializer.to_dict(user_data),
+                'changed': [loi.value for loi in changed],
+                'live': profile_serializer.to_dict(risk_profile),
+                'candidate': profile_serializer.to_dict(candidate_profile)
+            }
+            for user_data, risk_profile, candidate_profile, changed in samples
+        ]
+        return stats
+
+def get_shadow_evaluator():
+    """Returns the app's `ShadowEvaluator`, or None if shadow evaluation is
+    disabled."""
+    return current_app.extensions.get('shadow_evaluator')
+
+def init_app(app):
+    app.config.setdefault('SHADOW_POLICY_VERSION', None) # None disables shadow evaluation
+    app.config.setdefault('SHADOW_WORKERS', 1)
+    app.config.setdefault('SHADOW_QUEUE_SIZE', 1000)
+    app.config.setdefault('SHADOW_SAMPLE_SIZE', 20)
+    name = app.config['SHADOW_POLICY_VERSION']
+    if name is None:
+        return
+    candidate = app.extensions.get('policy_sets', {}).get(name)
+    if candidate is None:
+        raise ValueError('the shadow policy version "{}" is not in POLICY_VERSIONS'.format(name))
+    shadow_evaluator = app.extensions['shadow_evaluator'] = ShadowEvaluator(
+        candidate,
+        workers=app.config['SHADOW_WORKERS'],
+        queue_size=app.config['SHADOW_QUEUE_SIZE'],
+        sample_size=app.config['SHADOW_SAMPLE_SIZE'],
+        metrics=app.extensions.get('metrics', NULL_METRICS)
+    )
+    atexit.register(shadow_evaluator.close)
@@ -0,0 +1,216 @@
+# What-if grids: the risk profiles of one user over ranges of values of
+# some of the user data fields (e.g. every age from 20 to 80 and a list of
+# incomes).
+#
+# Policies only read the user data, so each one amounts to its trace (see
+# `incremental.py`), which only changes with the fields it reads. Policies
+# not reading any swept field are applied once. The others are applied once
+# per value of the swept fields they read: the policies reading `age` for
+# each age, those reading `income` for each income, and so on (fields read
+# together by a policy are swept together). A cell's profile only depends
+# on the traces of its values; there are few distinct traces along each
+# axis (`AgePolicy` has 4 outcomes whatever the number of ages), so the
+# traces are only replayed once per distinct combination of them.
+import itertools
+from .errors import InvalidValueDeserializationError, WrongKeyTypeDeserializationError
+from .incremental import TraceRecorder, replay
+from .line_of_insurance import LOI_ORDINAL
+from .policy_compiler import slots_as_profile
+from .serialization import USER_DATA_SCHEMA
+from .user_data import UserData
+
+SWEEPABLE_FIELDS = ('age', 'income', 'dependents', 'marital_status')
+# Upper bound of the number of cells (the product of the axis lengths).
+MAX_SWEEP_CELLS = 100000
+
+_FIELD_SCHEMAS = {key: (_type, convert) for key, _type, convert, _ in USER_DATA_SCHEMA.fields}
+
+class SweepAxis:
+    def __init__(self, field, values):
+        self.field = field
+        # As serialized (e.g. 'married'), and as in `UserData`.
+        self.values = values
+        _type, convert = _FIELD_SCHEMAS[field]
+        self.user_data_values = values if convert is None else [convert[value] for value in values]
+
+    @classmethod
+    def load(cls, field, obj):
+        """Builds an axis from `{"values": [...]}` or `{"from": <int>, "to":
+        <int>, "step": <int>}` (inclusive range, step 1 by default). Raises a
+        `DeserializationError` for an invalid one."""
+        key_path = 'sweep.' + field
+        if field not in SWEEPABLE_FIELDS:
+            raise InvalidValueDeserializationError(key_path, field, 'expected one of {}'.format(', '.join(SWEEPABLE_FIELDS)))
+        if type(obj) is not dict:
+            raise WrongKeyTypeDeserializationError(key_path, type(obj), dict)
+        _type, convert = _FIELD_SCHEMAS[field]
+        if 'values' in obj:
+            values = obj['values']
+            if type(values) is not list or not values:
+                raise InvalidValueDeserializationError(key_path + '.values', values, 'expected a non-empty list')
+        else:
+            for key in ('from', 'to', 'step'):
+                if (key in obj or key != 'step') and type(obj.get(key)) is not int:
+                    raise WrongKeyTypeDeserializationError('{}.{}'.format(key_path, key), type(obj.get(key)), int)
+            step = obj['step'] if 'step' in obj else 1
+            if step <= 0:
+                raise InvalidValueDeserializationError(key_path + '.step', step, 'expected a positive step')
+            if _type is not int:
+                raise InvalidValueDeserializationError(key_path, obj, 'expected a list of values')
+            if (obj['to'] - obj['from']) // step >= MAX_SWEEP_CELLS:
+                raise InvalidValueDeserializationError(key_path, obj, 'more than {} values'.format(MAX_SWEEP_CELLS))
+            values = list(range(obj['from'], obj['to'] + 1, step))
+            if not values:
+                raise InvalidValueDeserializationError(key_path, obj, 'empty range')
+        for index, value in enumerate(values):
+            item_path = '{}.values[{}]'.format(key_path, index)
+            if type(value) is not _type:
+                raise WrongKeyTypeDeserializationError(item_path, type(value), _type)
+            if convert is not None and value not in convert:
+                raise InvalidValueDeserializationError(item_path, value, 'expected one of {}'.format(', '.join('"{}"'.format(c) for c in convert)))
+        return cls(field, values)
+
+def load_axes(sweep_obj):
+    """Returns the `SweepAxis` list of a `{field: axis}` object, in key order."""
+    if type(sweep_obj) is not dict:
+        raise WrongKeyTypeDeserializationError('sweep', type(sweep_obj), dict)
+    if not sweep_obj:
+        raise InvalidValueDeserializationError('sweep', sweep_obj, 'expected at least one field')
+    axes = [SweepAxis.load(field, obj) for field, obj in sweep_obj.items()]
+    cells = 1
+    for axis in axes:
+        cells *= len(axis.values)
+    if cells > MAX_SWEEP_CELLS:
+        raise InvalidValueDeserializationError('sweep', cells, 'more than {} cells'.format(MAX_SWEEP_CELLS))
+    return axes
+
+def _with_fields(user_data, values_for_field):
+    fields = {name: getattr(user_data, name) for name in ('age', 'gender', 'marital_status', 'dependents', 'income', 'risk_questions')}
+    fields.update(values_for_field)
+    return UserData(houses=user_data.house_collec, vehicles=user_data.vehicle_collec, **fields)
+
+def _trace(policy, user_data):
+    recorder = TraceRecorder()
+    policy.apply(user_data, recorder)
+    return tuple(recorder.ops)
+
+class _Group:
+    """Swept fields read together by some policies, and the distinct traces
+    of those policies over the combinations of their values."""
+
+    def __init__(self, axis_indexes):
+        self.axis_indexes = axis_indexes
+        # Indexes (in the policy list) of the policies reading the fields.
+        self.policy_indexes = []
+        # Index of the distinct traces of each combination of values, by
+        # combination (in `itertools.product` order of the axes).
+        self.trace_ids = []
+        self.traces = []
+
+    def evaluate(self, policies, user_data, axes):
+        trace_id_for_traces = {}
+        value_lists = [axes[i].user_data_values for i in self.axis_indexes]
+        for combination in itertools.product(*value_lists):
+            cell_user_data = _with_fields(user_data, {axes[i].field: value for i, value in zip(self.axis_indexes, combination)})
+            traces = tuple(_trace(policies[i], cell_user_data) for i in self.policy_indexes)
+            trace_id = trace_id_for_traces.get(traces)
+            if trace_id is None:
+                trace_id = trace_id_for_traces[traces] = len(self.traces)
+                self.traces.append(traces)
+            self.trace_ids.append(trace_id)
+
+def _groups(policies, axes):
+    """Splits the axes into `_Group`s: fields read by the same policy end
+    up in the same group. Policies reading no swept field are in none."""
+    swept = {axis.field: i for i, axis in enumerate(axes)}
+    group_for_axis = list(range(len(axes)))
+    policy_axes = []
+    for policy in policies:
+        reads = policy.reads if getattr(policy, 'reads', None) is not None else swept
+        read_axes = sorted(swept[field] for field in reads if field in swept)
+        policy_axes.append(read_axes)
+        # Merges the groups of the fields read together.
+        for i in read_axes[1:]:
+            old, new = group_for_axis[i], group_for_axis[read_axes[0]]
+            group_for_axis = [new if g == old else g for g in group_for_axis]
+    groups = {}
+    for axis_index, group in enumerate(group_for_axis):
+        groups.setdefault(group, _Group([]))
+        groups[group].axis_indexes.append(axis_index)
+    for policy_index, read_axes in enumerate(policy_axes):
+        if read_axes:
+            groups[group_for_axis[read_axes[0]]].policy_indexes.append(policy_index)
+    return list(groups.values())
+
+def _profile_key(profile):
+    return tuple((loi, tuple(value.items()) if type(value) is dict else value) for loi, value in profile.items())
+
+def sweep_profiles(user_data, axes, policies, mapping):
+    """Returns the distinct risk profiles of `user_data` over the values of
+    `axes`, and the grid of their indexes: `grid[i][j]` is the index of the
+    profile for the i-th value of the first axis and the j-th one of the
+    second (nested tuples, one level per axis)."""
+    groups = _groups(policies, axes)
+    for group in groups:
+        group.evaluate(policies, user_data, axes)
+    swept_policies = set(i for group in groups for i in group.policy_indexes)
+    fixed_traces = {i: _trace(policy, user_data) for i, policy in enumerate(policies) if i not in swept_policies}
+
+    profiles = []
+    profile_index_for_key = {}
+    profile_index_for_trace_ids = {}
+
+    def profile_index(trace_ids):
+        index = profile_index_for_trace_ids.get(trace_ids)
+        if index is None:
+            traces = dict(fixed_traces)
+            for group, trace_id in zip(groups, trace_ids):
+                traces.update(zip(group.policy_indexes, group.traces[trace_id]))
+            slots = [None] * len(LOI_ORDINAL)
+            for i in range(len(policies)):
+                replay(traces[i], slots)
+            profile = slots_as_profile(slots, mapping)
+            key = _profile_key(profile)
+            index = profile_index_for_key.get(key)
+            if index is None:
+                index = profile_index_for_key[key] = len(profiles)
+                profiles.append(profile)
+            profile_index_for_trace_ids[trace_ids] = index
+        return index
+
+    # Position of each group's combination of values in its `trace_ids`,
+    # from the indexes of the values of all the axes.
+    strides = []
+    for group in groups:
+        stride = 1
+        group_strides = {}
+        for axis_index in reversed(group.axis_indexes):
+            group_strides[axis_index] = stride
+            stride *= len(axes[axis_index].values)
+        strides.append(group_strides)
+
+    # A subgrid only depends on the traces of the groups whose values are
+    # all set already, and on the positions of the others, so equal ones
+    # are only built once (and shared, hence tuples).
+    last_axes = [group.axis_indexes[-1] for group in groups]
+    subgrids = {}
+
+    def build(depth, positions):
+        if depth == len(axes):
+            return profile_index(tuple(group.trace_ids[p] for group, p in zip(groups, positions)))
+        key = (depth,) + tuple(
+            group.trace_ids[p] if last_axis < depth else p
+            for group, p, last_axis in zip(groups, positions, last_axes)
+        )
+        subgrid = subgrids.get(key)
+        if subgrid is None:
+            subgrid = subgrids[key] = tuple(
+                build(depth + 1, [
+                    position + value_index * group_strides.get(depth, 0)
+                    for position, group_strides in zip(positions, strides)
+                ])
+                for value_index in range(len(axes[depth].values))
+            )
+        return subgrid
+
+    return profiles, build(0, [0] * len(groups))
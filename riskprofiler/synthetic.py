@@ -0,0 +1,90 @@
+# Seeded generator of synthetic user data payloads (the JSON objects POSTed
+# to /risk_profile), for benchmarks and load tests.
+import datetime
+import random
+
+GENERATOR_KINDS = ('typical', 'no_items', 'all_mortgaged', 'landlord', 'large_fleet', 'invalid')
+
+MAKES_AND_MODELS = (
+    ('Toyota', 'Corolla'), ('Honda', 'Civic'), ('Ford', 'F-150'), ('Tesla', 'Model 3'),
+    ('Chevrolet', 'Silverado'), ('Volkswagen', 'Golf'), ('Nissan', 'Leaf')
+)
+
+class SyntheticUserDataGenerator:
+    """Generates user data payloads of a given kind:
+
+    - `typical`: a realistic mix of ages, incomes, households and cars;
+    - `no_items`: no houses nor vehicles;
+    - `all_mortgaged`: 2 to 5 houses, all of them mortgaged;
+    - `landlord`: 50 houses;
+    - `large_fleet`: 500 vehicles;
+    - `invalid`: a typical payload with a missing key or a wrong type, which
+      the deserializer rejects."""
+
+    def __init__(self, seed=0, curr_year=None):
+        self.random = random.Random(seed)
+        self.curr_year = datetime.date.today().year if curr_year is None else curr_year
+
+    def _house(self, key, mortgaged_ratio=0.3):
+        return {
+            'key': key,
+            'zip_code': self.random.randint(1000, 99999),
+            'status': 'mortgaged' if self.random.random() < mortgaged_ratio else 'owned'
+        }
+
+    def _vehicle(self, key):
+        make, model = self.random.choice(MAKES_AND_MODELS)
+        return {
+            'key': key,
+            'make': make,
+            'model': model,
+            'year': self.curr_year - min(int(self.random.expovariate(1 / 6)), 40)
+        }
+
+    def _income(self):
+        if self.random.random() < 0.1:
+            return 0
+        return int(self.random.lognormvariate(11, 0.7))
+
+    def payload(self, kind='typical'):
+        rnd = self.random
+        obj = {
+            'age': rnd.randint(18, 85),
+            'gender': rnd.choice(('male', 'female')),
+            'marital_status': rnd.choice(('single', 'married')),
+            'dependents': rnd.choice((0, 0, 0, 1, 2, 3, 4)),
+            'income': self._income(),
+            'risk_questions': [rnd.randint(0, 1) for _ in range(3)],
+            'houses': [],
+            'vehicles': []
+        }
+        if kind in ('typical', 'invalid'):
+            obj['houses'] = [self._house(key) for key in range(rnd.choice((0, 1, 1, 1, 2, 3)))]
+            obj['vehicles'] = [self._vehicle(key) for key in range(rnd.choice((0, 1, 1, 2, 2, 3)))]
+        elif kind == 'all_mortgaged':
+            obj['houses'] = [self._house(key, mortgaged_ratio=1) for key in range(rnd.randint(2, 5))]
+            obj['vehicles'] = [self._vehicle(key) for key in range(rnd.randint(0, 2))]
+        elif kind == 'landlord':
+            obj['houses'] = [self._house(key) for key in range(50)]
+        elif kind == 'large_fleet':
+            obj['vehicles'] = [self._vehicle(key) for key in range(500)]
+        elif kind != 'no_items':
+            raise ValueError('unknown kind "{}"'.format(kind))
+
+        if kind == 'invalid':
+            key = rnd.choice(sorted(obj))
+            if rnd.random() < 0.5:
+                del obj[key]
+            else:
+                obj[key] = {'value': obj[key]}
+        return obj
+
+    def payloads(self, count, mix=None):
+        """Yields `count` payloads. `mix` maps kinds to weights (all typical
+        by default)."""
+        if mix is None:
+            mix = {'typical': 1}
+        kinds = list(mix)
+        weights = [mix[kind] for kind in kinds]
+        for _ in range(count):
+            yield self.payload(self.random.choices(kinds, weights)[0])
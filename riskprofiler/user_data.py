@@ -1,4 +1,6 @@
+import bisect
 import datetime
+import operator
 from enum import Enum, unique, auto
 from .errors import ItemDataKeyNotUnique
 
@@ -9,12 +11,10 @@ class Gender(Enum):
 
     @staticmethod
     def from_str(s):
-        if s == 'male':
-            return Gender.male
-        elif s == 'female':
-            return Gender.female
-        else:
-            raise ValueError('gender should be eitehr "male" or "female"')
+        try:
+            return GENDER_FOR_STR[s]
+        except KeyError:
+            raise ValueError('gender should be either "male" or "female"')
 
 @unique
 class MaritalStatus(Enum):
@@ -23,11 +23,9 @@ class MaritalStatus(Enum):
 
     @staticmethod
     def from_str(s):
-        if s == 'single':
-            return MaritalStatus.single
-        elif s == 'married':
-            return MaritalStatus.married
-        else:
+        try:
+            return MARITAL_STATUS_FOR_STR[s]
+        except KeyError:
             raise ValueError('marital_status should be either "single" or "married"')
 
 @unique
@@ -37,31 +35,108 @@ class HouseStatus(Enum):
 
     @staticmethod
     def from_str(s):
-        if s == 'owned':
-            return HouseStatus.owned
-        elif s == 'mortgaged':
-            return HouseStatus.mortgaged
-        else:
+        try:
+            return HOUSE_STATUS_FOR_STR[s]
+        except KeyError:
             raise ValueError('status should be either "owned" or "mortgaged"')
 
+# Lookup tables for the `from_str` methods (and the deserializer).
+GENDER_FOR_STR = {g.value: g for g in Gender}
+MARITAL_STATUS_FOR_STR = {m.value: m for m in MaritalStatus}
+HOUSE_STATUS_FOR_STR = {h.value: h for h in HouseStatus}
+
 class ItemDataCollection:
+    """Item data by key, in insertion order, along with indexes of the items:
+    their list, by `status` (items that have one) and sorted by `year` (items
+    that have one). The last two are built on first use, so collections only
+    pay for those they're queried with. The lists returned are those of the
+    indexes, and shouldn't be modified."""
+    __slots__ = ('_item_data_for_key', '_items', '_items_for_status', '_items_by_year', '_years')
+
     def __init__(self, *args):
         self._item_data_for_key = {}
         for item_data in args:
-            self.add(item_data)
+            if item_data.item_key() in self._item_data_for_key:
+                raise ItemDataKeyNotUnique
+            self._item_data_for_key[item_data.item_key()] = item_data
+        self._reset_indexes()
 
     def __len__(self):
         return len(self._item_data_for_key)
 
+    @classmethod
+    def from_dict(cls, item_data_for_key):
+        """Builds a collection from a dict of item data by key (so keys are
+        already known to be unique)."""
+        collec = cls.__new__(cls)
+        collec._item_data_for_key = item_data_for_key
+        collec._reset_indexes()
+        return collec
+
+    def _reset_indexes(self):
+        self._items = list(self._item_data_for_key.values())
+        self._items_for_status = None
+        self._items_by_year = None
+        self._years = None
+
     def add(self, item_data):
         if item_data.item_key() in self._item_data_for_key:
             raise ItemDataKeyNotUnique
         self._item_data_for_key[item_data.item_key()] = item_data
+        self._items.append(item_data)
+        self._items_for_status = None
+        self._items_by_year = None
+        self._years = None
 
     def items(self):
-        return [v for v in self._item_data_for_key.values()]
+        return self._items
+
+    def item_at(self, index):
+        return self._items[index]
+
+    def _status_index(self):
+        if self._items_for_status is None:
+            # Grouped by the identity of the status, as hashing an `Enum`
+            # member is slower than going through the items.
+            items_for_status = {}
+            items_for_status_id = {}
+            for item_data in self._items:
+                status = getattr(item_data, 'status', None)
+                if status is not None:
+                    status_items = items_for_status_id.get(id(status))
+                    if status_items is None:
+                        status_items = items_for_status_id[id(status)] = items_for_status[status] = []
+                    status_items.append(item_data)
+            self._items_for_status = items_for_status
+        return self._items_for_status
+
+    def items_with_status(self, status):
+        """Returns the items whose `status` is `status`, in insertion order."""
+        return self._status_index().get(status, _NO_ITEMS)
+
+    def count_with_status(self, status):
+        return len(self._status_index().get(status, _NO_ITEMS))
+
+    def items_by_year(self):
+        """Returns the items that have a `year`, sorted by it (items of the
+        same year in insertion order)."""
+        if self._items_by_year is None:
+            self._items_by_year = sorted([i for i in self._items if getattr(i, 'year', None) is not None], key=_item_year)
+            self._years = [item_data.year for item_data in self._items_by_year]
+        return self._items_by_year
+
+    def items_since_year(self, year):
+        """Returns the items whose `year` is at least `year`, sorted by it."""
+        items_by_year = self.items_by_year()
+        return items_by_year[bisect.bisect_left(self._years, year):]
+
+_NO_ITEMS = ()
+
+_item_year = operator.attrgetter('year')
 
 class ItemData:
+    __slots__ = ('_key',)
+
     def __init__(self, key):
         self._key = key
 
@@ -69,37 +144,70 @@ class ItemData:
         return self._key
 
 class HouseItemData(ItemData):
-    def __init__(self, key, **kwargs):
-        super().__init__(key)
-        self.zip_code = kwargs['zip_code']
-        self.status = kwargs['status']
+    __slots__ = ('zip_code', 'status')
+
+    def __init__(self, key, zip_code, status):
+        self._key = key
+        self.zip_code = zip_code
+        self.status = status
 
 class VehicleItemData(ItemData):
-    def __init__(self, key, **kwargs):
-        super().__init__(key)
-        self.make = kwargs['make']
-        self.model = kwargs['model']
-        self.year = kwargs['year']
+    __slots__ = ('make', 'model', 'year')
+
+    def __init__(self, key, make, model, year):
+        self._key = key
+        self.make = make
+        self.model = model
+        self.year = year
     
     def years_since_production(self, curr_date):
         """Returns a decimal (float) number of years, 
         counted in days since `curr_date`."""
-        production_date = datetime.date(self.year, 1, 1)
-        delta = curr_date - production_date
-        years = delta.days / 365.0
-        return years
+        return years_since_year(self.year, curr_date)
+
+def years_since_year(year, curr_date):
+    """Same as `VehicleItemData.years_since_production` for a vehicle
+    produced in `year`."""
+    production_date = datetime.date(year, 1, 1)
+    delta = curr_date - production_date
+    years = delta.days / 365.0
+    return years
+
+def first_year_within(num_years, curr_date):
+    """Returns the first year such that vehicles produced that year or later
+    are at most `num_years` old (`years_since_production`) at `curr_date`
+    (`datetime.MAXYEAR + 1` if there's none)."""
+    year = min(max(curr_date.year - int(num_years), datetime.MINYEAR), datetime.MAXYEAR)
+    while year > datetime.MINYEAR and years_since_year(year - 1, curr_date) <= num_years:
+        year -= 1
+    while year <= datetime.MAXYEAR and years_since_year(year, curr_date) > num_years:
+        year += 1
+    return year
+
+def first_year_under(num_years, curr_date):
+    """Returns the first year such that vehicles produced that year or later
+    are less than `num_years` old (`years_since_production`) at `curr_date`
+    (`datetime.MAXYEAR + 1` if there's none)."""
+    year = min(max(curr_date.year - int(num_years), datetime.MINYEAR), datetime.MAXYEAR)
+    while year > datetime.MINYEAR and years_since_year(year - 1, curr_date) < num_years:
+        year -= 1
+    while year <= datetime.MAXYEAR and years_since_year(year, curr_date) >= num_years:
+        year += 1
+    return year
 
 class UserData:
-    def __init__(self, **kwargs):
-        self.age = kwargs['age']
-        self.gender = kwargs['gender']
-        self.marital_status = kwargs['marital_status']
-        self.dependents = kwargs['dependents']
-        self.income = kwargs['income']
-        self.risk_questions = kwargs['risk_questions']
+    __slots__ = ('age', 'gender', 'marital_status', 'dependents', 'income', 'risk_questions', 'house_collec', 'vehicle_collec')
+
+    def __init__(self, age, gender, marital_status, dependents, income, houses, vehicles, risk_questions):
+        self.age = age
+        self.gender = gender
+        self.marital_status = marital_status
+        self.dependents = dependents
+        self.income = income
+        self.risk_questions = risk_questions
         # Why inject ItemDataCollection?
-        self.house_collec = kwargs['houses']
-        self.vehicle_collec = kwargs['vehicles']
+        self.house_collec = houses
+        self.vehicle_collec = vehicles
 
     def base_score(self):
         return sum(self.risk_questions)
@@ -126,18 +234,19 @@ class UserData:
         return len(self.house_collec) > 0
 
     def get_mortgaged_houses(self):
-        return [h for h in self.house_collec.items() if h.status == HouseStatus.mortgaged]
+        return self.house_collec.items_with_status(HouseStatus.mortgaged)
     
     def get_house_at(self, index):
-        house_items = [h for h in self.house_collec.items()]
-        return house_items[index]
+        return self.house_collec.item_at(index)
     
     def get_vehicle_at(self, index):
-        vehicle_items = [v for v in self.vehicle_collec.items()]
-        return vehicle_items[index]
+        return self.vehicle_collec.item_at(index)
     
     def has_mortgaged_houses(self):
-        return len(self.get_mortgaged_houses()) > 0
+        return self.house_collec.count_with_status(HouseStatus.mortgaged) > 0
+
+    def mortgaged_houses_count(self):
+        return self.house_collec.count_with_status(HouseStatus.mortgaged)
 
     def houses(self):
         return self.house_collec.items()
@@ -151,5 +260,9 @@ class UserData:
     def vehicles_count(self):
         return len(self.vehicle_collec)
 
+    def get_vehicles_since_year(self, year):
+        """Returns the vehicles produced in `year` or later, sorted by year."""
+        return self.vehicle_collec.items_since_year(year)
+
     def has_dependents(self):
         return self.dependents > 0
\ No newline at end of file
@@ -0,0 +1,247 @@
+# Columnar scoring engine for large batches of users. It hard-codes the
+# rules of `CURRENT_RISK_POLICIES` as masked array operations, so it can
+# only stand in for a policy list made of exactly those policy types (see
+# `VectorizedRiskProfileCalculator.supports`). NumPy is an optional
+# dependency (`pip install riskprofiler[vectorized]`).
+import datetime
+import numpy as np
+from .line_of_insurance import Loi
+from .evaluation_context import context_for
+from .user_data import HouseStatus
+from .risk_policies import InitialRiskPolicy, NoIncomePolicy, NoVehiclePolicy, NoHousePolicy, AgePolicy, LargeIncomePolicy, MortgagedHousePolicy, DependentsPolicy, MaritalStatusPolicy, RecentVehiclePolicy, SingleHousePolicy, SingleVehiclePolicy
+from .risk_profile_calculator import CURRENT_RISK_POLICIES, RiskAversion, RiskProfileCalculator
+
+VECTORIZED_POLICY_TYPES = (
+    InitialRiskPolicy,
+    NoIncomePolicy,
+    NoVehiclePolicy,
+    NoHousePolicy,
+    AgePolicy,
+    LargeIncomePolicy,
+    MortgagedHousePolicy,
+    DependentsPolicy,
+    MaritalStatusPolicy,
+    RecentVehiclePolicy,
+    SingleHousePolicy,
+    SingleVehiclePolicy
+)
+
+# Indexed by the codes returned by `VectorizedRiskScoreValueMapping`.
+AVERSION_FOR_CODE = (RiskAversion.adventurous, RiskAversion.average, RiskAversion.conservative)
+
+# Users with values outside of this range (Python ints are unbounded) are
+# scored by the per-user calculator instead.
+_MAX_ABS_VALUE = 2 ** 62
+
+class VectorizedRiskScoreValueMapping:
+    """Array version of `RiskScoreValueMapping`, returning indexes into
+    `AVERSION_FOR_CODE`."""
+    def map_score_values(self, score_values):
+        return np.select(
+            [score_values <= 0, (score_values == 1) | (score_values == 2)],
+            [0, 1],
+            default=2
+        )
+
+def _is_small_int(value):
+    return isinstance(value, int) and -_MAX_ABS_VALUE < value < _MAX_ABS_VALUE
+
+def _is_valid_year(year):
+    # `VehicleItemData.years_since_production` only accepts valid dates.
+    return isinstance(year, int) and datetime.MINYEAR <= year <= datetime.MAXYEAR
+
+class UserDataColumns:
+    """Columnar view of many users, built in a single pass over them.
+
+    Houses and vehicles are flattened into item arrays: user `u` owns houses
+    `house_offsets[u]` up to `house_offsets[u + 1]` and `house_owner[i]` is
+    the index of the user owning house `i` (same for vehicles).
+
+    Users holding values the arrays can't represent (e.g. integers larger
+    than 64 bits) are left out; `vectorizable[i]` tells whether the i-th
+    user data was loaded."""
+
+    def __init__(self, user_datas):
+        self.vectorizable = []
+        age, income, dependents, married, base_score = [], [], [], [], []
+        house_counts, vehicle_counts = [], []
+        self.house_keys, house_mortgaged = [], []
+        self.vehicle_keys, vehicle_year = [], []
+        mortgaged = HouseStatus.mortgaged
+
+        for u in user_datas:
+            houses = u.house_collec.items()
+            vehicles = u.vehicle_collec.items()
+            ok = (
+                _is_small_int(u.age) and _is_small_int(u.income) and _is_small_int(u.dependents)
+                and _is_small_int(u.base_score()) and all(_is_valid_year(v.year) for v in vehicles)
+            )
+            self.vectorizable.append(ok)
+            if not ok:
+                continue
+            age.append(u.age)
+            income.append(u.income)
+            dependents.append(u.dependents)
+            married.append(u.is_married())
+            base_score.append(u.base_score())
+            house_counts.append(len(houses))
+            for h in houses:
+                self.house_keys.append(h.item_key())
+                house_mortgaged.append(h.status == mortgaged)
+            vehicle_counts.append(len(vehicles))
+            for v in vehicles:
+                self.vehicle_keys.append(v.item_key())
+                vehicle_year.append(v.year)
+
+        self.size = len(age)
+        self.age = np.array(age, np.int64)
+        self.income = np.array(income, np.int64)
+        self.dependents = np.array(dependents, np.int64)
+        self.married = np.array(married, np.bool_)
+        self.base_score = np.array(base_score, np.int64)
+        self.house_counts, self.house_offsets, self.house_owner = self._item_layout(house_counts)
+        self.house_mortgaged = np.array(house_mortgaged, np.bool_)
+        self.vehicle_counts, self.vehicle_offsets, self.vehicle_owner = self._item_layout(vehicle_counts)
+        self.vehicle_year = np.array(vehicle_year, np.int64)
+
+    @staticmethod
+    def _item_layout(counts):
+        counts = np.array(counts, np.int64)
+        offsets = np.zeros(len(counts) + 1, np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        owner = np.repeat(np.arange(len(counts)), counts)
+        return counts, offsets, owner
+
+class VectorizedRiskProfileCalculator:
+    """Scores many users at once, returning the same risk profiles (in the
+    same order) as running `RiskProfileCalculator` on each of them."""
+
+    def __init__(self, **kwargs):
+        self.user_datas = kwargs['user_datas']
+        # None evaluates at the date of the current `EvaluationContext`.
+        self.curr_date = kwargs.get('curr_date')
+        self.large_income_thresh = kwargs.get('large_income_thresh', LargeIncomePolicy.LARGE_INCOME_THRESH)
+        self.num_recent_years = kwargs.get('num_recent_years', RecentVehiclePolicy.NUM_RECENT_YEARS)
+        self.mapping = VectorizedRiskScoreValueMapping()
+        self.risk_policies = kwargs.get('risk_policies')
+
+    @staticmethod
+    def supports(risk_policies):
+        return tuple(type(p) for p in risk_policies) == VECTORIZED_POLICY_TYPES
+
+    @classmethod
+    def from_policies(cls, risk_policies, **kwargs):
+        """Builds a calculator using the parameters of `risk_policies`, which
+        must be supported (see `supports`)."""
+        if not cls.supports(risk_policies):
+            raise ValueError('risk policies are not supported by the vectorized calculator')
+        large_income_policy = risk_policies[VECTORIZED_POLICY_TYPES.index(LargeIncomePolicy)]
+        recent_vehicle_policy = risk_policies[VECTORIZED_POLICY_TYPES.index(RecentVehiclePolicy)]
+        return cls(
+            large_income_thresh=large_income_policy.large_income_thresh,
+            curr_date=recent_vehicle_policy.curr_date,
+            num_recent_years=recent_vehicle_policy.num_recent_years,
+            risk_policies=risk_policies,
+            **kwargs
+        )
+
+    def calculate(self):
+        cols = UserDataColumns(self.user_datas)
+        profiles = self._build_profiles(cols)
+        if cols.size == len(self.user_datas):
+            return profiles
+        profiles = iter(profiles)
+        fallback_policies = self._fallback_policies() if self.risk_policies is None else self.risk_policies
+        return [
+            next(profiles) if ok else RiskProfileCalculator(user_data=u, risk_policies=fallback_policies).calculate()
+            for u, ok in zip(self.user_datas, cols.vectorizable)
+        ]
+
+    def _fallback_policies(self):
+        return [
+            InitialRiskPolicy(),
+            NoIncomePolicy(),
+            NoVehiclePolicy(),
+            NoHousePolicy(),
+            AgePolicy(),
+            LargeIncomePolicy(large_income_thresh=self.large_income_thresh),
+            MortgagedHousePolicy(),
+            DependentsPolicy(),
+            MaritalStatusPolicy(),
+            RecentVehiclePolicy(curr_date=self.curr_date, num_recent_years=self.num_recent_years),
+            SingleHousePolicy(),
+            SingleVehiclePolicy()
+        ]
+
+    def calculate_columns(self, cols):
+        """Returns a dict of arrays: per-user scores and enabled masks for the
+        single item lines, and per-item scores for the multiple item ones."""
+        age = cols.age
+        under_30 = age < 30
+        under_40 = ~under_30 & (age < 40)
+        over_60 = ~under_30 & ~under_40 & (age > 60)
+        has_dependents = cols.dependents > 0
+        has_mortgaged_houses = np.bincount(cols.house_owner[cols.house_mortgaged], minlength=cols.size) > 0
+
+        # Points that every line (and every item) of a user gets.
+        common = cols.base_score - 2 * under_30 - under_40 - (cols.income > self.large_income_thresh)
+
+        life = common + has_dependents + cols.married
+        disability = common + has_mortgaged_houses + has_dependents - cols.married
+
+        recent_vehicle = cols.vehicle_year >= context_for(self.curr_date).first_year_within(self.num_recent_years)
+
+        home = common[cols.house_owner] + cols.house_mortgaged + (cols.house_counts == 1)[cols.house_owner]
+        auto = common[cols.vehicle_owner] + recent_vehicle + (cols.vehicle_counts == 1)[cols.vehicle_owner]
+
+        return {
+            'life': life,
+            'life_enabled': ~over_60,
+            'disability': disability,
+            'disability_enabled': (cols.income > 0) & ~over_60,
+            'home': home,
+            'home_enabled': cols.house_counts > 0,
+            'auto': auto,
+            'auto_enabled': cols.vehicle_counts > 0
+        }
+
+    def _build_profiles(self, cols):
+        scores = self.calculate_columns(cols)
+        life = self.mapping.map_score_values(scores['life']).tolist()
+        disability = self.mapping.map_score_values(scores['disability']).tolist()
+        home = self.mapping.map_score_values(scores['home']).tolist()
+        auto = self.mapping.map_score_values(scores['auto']).tolist()
+        life_enabled = scores['life_enabled'].tolist()
+        disability_enabled = scores['disability_enabled'].tolist()
+        home_enabled = scores['home_enabled'].tolist()
+        auto_enabled = scores['auto_enabled'].tolist()
+        house_offsets = cols.house_offsets.tolist()
+        vehicle_offsets = cols.vehicle_offsets.tolist()
+        house_keys = cols.house_keys
+        vehicle_keys = cols.vehicle_keys
+
+        profiles = []
+        for u in range(cols.size):
+            profile = {}
+            if life_enabled[u]:
+                profile[Loi.life] = AVERSION_FOR_CODE[life[u]]
+            if disability_enabled[u]:
+                profile[Loi.disability] = AVERSION_FOR_CODE[disability[u]]
+            if home_enabled[u]:
+                profile[Loi.home] = {
+                    house_keys[i]: AVERSION_FOR_CODE[home[i]]
+                    for i in range(house_offsets[u], house_offsets[u + 1])
+                }
+            if auto_enabled[u]:
+                profile[Loi.auto] = {
+                    vehicle_keys[i]: AVERSION_FOR_CODE[auto[i]]
+                    for i in range(vehicle_offsets[u], vehicle_offsets[u + 1])
+                }
+            profiles.append(profile)
+        return profiles
+
+def calculate_many(user_datas, risk_policies=CURRENT_RISK_POLICIES):
+    """Scores many users, vectorized when `risk_policies` allows it."""
+    if VectorizedRiskProfileCalculator.supports(risk_policies):
+        return VectorizedRiskProfileCalculator.from_policies(risk_policies, user_datas=user_datas).calculate()
+    return [RiskProfileCalculator(user_data=u, risk_policies=risk_policies).calculate() for u in user_datas]
@@ -0,0 +1,172 @@
+# Compact binary encoding of `/risk_profile` requests and responses, for
+# high-volume clients (content type `BINARY_MIMETYPE`, see `api.py`).
+#
+# User data (little-endian, laid out so that it's decoded with a handful of
+# `struct` calls):
+#
+# - a header: format version (u8), age (i32), gender (u8), marital status
+#   (u8), dependents (i32), income (i64), and the counts (u32) of risk
+#   questions, houses and vehicles;
+# - the risk question answers (i32 each);
+# - one packed record per house: key (i64), zip code (i32), status (u8);
+# - one packed record per vehicle: key (i64), year (i32), and the lengths
+#   (u16, in characters) of its make and model;
+# - the makes and models of the vehicles, one after the other, in UTF-8.
+#
+# Enums are encoded as their position in `GENDERS`, `MARITAL_STATUSES` and
+# `HOUSE_STATUSES`. Numbers that don't fit their field can't be encoded
+# (use JSON for those).
+#
+# Risk profiles are encoded like stored ones (see `profile_codec.py`).
+#
+# `encode_user_data` and `decode_risk_profile` work with the same objects as
+# JSON clients do (e.g. `{"gender": "male", ...}`), and are meant to be used
+# by clients; the app uses `decode_user_data` and `encode_risk_profile`.
+import struct
+from .errors import InvalidValueDeserializationError, DeserializationErrors
+from .profile_codec import encode_profile, decode_profile
+from .serialization import RiskProfileSerializer
+from .user_data import UserData, ItemDataCollection, HouseItemData, VehicleItemData, Gender, MaritalStatus, HouseStatus
+
+BINARY_MIMETYPE = 'application/x-riskprofiler-binary'
+
+FORMAT_VERSION = 1
+
+GENDERS = tuple(Gender)
+MARITAL_STATUSES = tuple(MaritalStatus)
+HOUSE_STATUSES = tuple(HouseStatus)
+
+HEADER = struct.Struct('<BiBBiqIII')
+HOUSE_RECORD = struct.Struct('<qiB')
+VEHICLE_RECORD = struct.Struct('<qiHH')
+
+def _enum_code(members, value, key):
+    for code, member in enumerate(members):
+        if member.value == value:
+            return code
+    raise ValueError('invalid value {!r} for "{}"'.format(value, key))
+
+def encode_user_data(user_data_obj):
+    """Returns the binary encoding of a serialized user data object (as sent
+    to the JSON API). Raises a `ValueError` if it can't be encoded (e.g. a
+    missing key or a number too large for its field)."""
+    try:
+        risk_questions = user_data_obj['risk_questions']
+        houses = user_data_obj['houses']
+        vehicles = user_data_obj['vehicles']
+        out = bytearray(HEADER.pack(
+            FORMAT_VERSION,
+            user_data_obj['age'],
+            _enum_code(GENDERS, user_data_obj['gender'], 'gender'),
+            _enum_code(MARITAL_STATUSES, user_data_obj['marital_status'], 'marital_status'),
+            user_data_obj['dependents'],
+            user_data_obj['income'],
+            len(risk_questions),
+            len(houses),
+            len(vehicles)
+        ))
+        out += struct.pack('<{}i'.format(len(risk_questions)), *risk_questions)
+        for house in houses:
+            out += HOUSE_RECORD.pack(house['key'], house['zip_code'], _enum_code(HOUSE_STATUSES, house['status'], 'status'))
+        for vehicle in vehicles:
+            out += VEHICLE_RECORD.pack(vehicle['key'], vehicle['year'], len(vehicle['make']), len(vehicle['model']))
+        out += ''.join(vehicle['make'] + vehicle['model'] for vehicle in vehicles).encode('utf-8')
+    except (KeyError, TypeError, struct.error) as err:
+        raise ValueError('user data that can\'t be encoded: {}'.format(err))
+    return bytes(out)
+
+def _choices_reason(members):
+    return 'expected one of {}'.format(', '.join('{} ("{}")'.format(code, member.value) for code, member in enumerate(members)))
+
+GENDER_REASON = _choices_reason(GENDERS)
+MARITAL_STATUS_REASON = _choices_reason(MARITAL_STATUSES)
+HOUSE_STATUS_REASON = _choices_reason(HOUSE_STATUSES)
+
+def _member(members, code, key, reason, errors):
+    if code < len(members):
+        return members[code]
+    err = InvalidValueDeserializationError(key, code, reason)
+    if errors is None:
+        raise err
+    errors.append(err)
+    return None
+
+def _duplicated_key(key_path, index, item_key, errors):
+    err = InvalidValueDeserializationError('{}[{}].key'.format(key_path, index), item_key, 'duplicated item key')
+    if errors is None:
+        raise err
+    errors.append(err)
+
+def decode_user_data(data, collect_errors=False):
+    """Returns the `UserData` encoded in `data`. Raises a `ValueError` if
+    it's not in the format above, and the same `DeserializationError` as
+    `UserDataDeserializer.load` for invalid user data (enum codes out of
+    range and duplicated item keys: every other field has the right type by
+    construction)."""
+    try:
+        version, age, gender_code, marital_status_code, dependents, income, num_risk_questions, num_houses, num_vehicles = HEADER.unpack_from(data)
+        if version != FORMAT_VERSION:
+            raise ValueError('unknown user data format')
+        pos = HEADER.size
+        risk_questions = list(struct.unpack_from('<{}i'.format(num_risk_questions), data, pos))
+        pos += 4 * num_risk_questions
+        end = pos + HOUSE_RECORD.size * num_houses
+        house_records = list(HOUSE_RECORD.iter_unpack(data[pos:end]))
+        pos = end
+        end = pos + VEHICLE_RECORD.size * num_vehicles
+        vehicle_records = list(VEHICLE_RECORD.iter_unpack(data[pos:end]))
+        if len(house_records) != num_houses or len(vehicle_records) != num_vehicles:
+            raise ValueError('truncated user data')
+        strings = data[end:].decode('utf-8')
+    except (struct.error, UnicodeDecodeError):
+        raise ValueError('truncated or corrupted user data')
+    if sum(make_length + model_length for _, _, make_length, model_length in vehicle_records) != len(strings):
+        raise ValueError('truncated or corrupted user data')
+
+    # Checked in the same order as `USER_DATA_SCHEMA`.
+    errors = [] if collect_errors else None
+    gender = _member(GENDERS, gender_code, 'gender', GENDER_REASON, errors)
+    marital_status = _member(MARITAL_STATUSES, marital_status_code, 'marital_status', MARITAL_STATUS_REASON, errors)
+    houses = {}
+    for index, (key, zip_code, status_code) in enumerate(house_records):
+        status = _member(HOUSE_STATUSES, status_code, 'houses[{}].status'.format(index), HOUSE_STATUS_REASON, errors)
+        if status is None:
+            continue
+        if key in houses:
+            _duplicated_key('houses', index, key, errors)
+            continue
+        houses[key] = HouseItemData(key, zip_code, status)
+    vehicles = {}
+    pos = 0
+    for index, (key, year, make_length, model_length) in enumerate(vehicle_records):
+        make = strings[pos:pos + make_length]
+        pos += make_length
+        model = strings[pos:pos + model_length]
+        pos += model_length
+        if key in vehicles:
+            _duplicated_key('vehicles', index, key, errors)
+            continue
+        vehicles[key] = VehicleItemData(key, make, model, year)
+    if errors:
+        raise DeserializationErrors(errors)
+    return UserData(
+        age=age,
+        gender=gender,
+        marital_status=marital_status,
+        dependents=dependents,
+        income=income,
+        houses=ItemDataCollection.from_dict(houses),
+        vehicles=ItemDataCollection.from_dict(vehicles),
+        risk_questions=risk_questions
+    )
+
+def encode_risk_profile(risk_profile):
+    """Returns the binary encoding of a risk profile (as returned by
+    `RiskProfileCalculator.calculate`)."""
+    return encode_profile(risk_profile)
+
+def decode_risk_profile(data):
+    """Returns the serialized risk profile (the same object as the JSON
+    response) encoded in `data`. Raises a `ValueError` if it's not in the
+    format above."""
+    return RiskProfileSerializer().to_dict(decode_profile(data))
@@ -0,0 +1,186 @@
+# Write-behind layer over `ProfileStore`: `put` only queues the profile and
+# a background thread writes queued profiles in batches, each in a single
+# transaction, once `batch_size` of them are queued or `flush_interval`
+# seconds after the first one was.
+#
+# Queued (and in flight) profiles are returned by `get`, so clients read
+# their own writes. The queue is bounded: `put` blocks while it's full and
+# raises `WriteQueueFullError` after `put_timeout` seconds. The queue is
+# drained by `close`, which runs at interpreter exit.
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from .db import get_profile_store
+from .errors import WriteQueueFullError
+from .metrics import NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindProfileStore:
+    def __init__(self, store, maxsize=10000, batch_size=500, flush_interval=0.05, put_timeout=1.0, metrics=NULL_METRICS):
+        self.store = store
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.metrics = metrics
+        # user id: (profile, encoded scoring state). Writing the same user id
+        # again replaces its queued entry (which keeps its place in the
+        # queue).
+        self._pending = OrderedDict()
+        # Batch being written by the writer thread.
+        self._in_flight = {}
+        self._cond = threading.Condition()
+        self._flushing = 0
+        self._closed = False
+        self._thread = None
+
+    def _start(self):
+        # The writer thread starts on the first write.
+        self._thread = threading.Thread(target=self._run, name='profile-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, user_id, risk_profile, state=None):
+        with self._cond:
+            if self._closed:
+                # Too late to queue it, write it right away.
+                self.store.put(user_id, risk_profile, state)
+                return
+            if self._thread is None:
+                self._start()
+            if user_id not in self._pending and len(self._pending) >= self.maxsize:
+                deadline = time.monotonic() + self.put_timeout
+                while len(self._pending) >= self.maxsize:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._closed:
+                        raise WriteQueueFullError
+                    self._cond.wait(remaining)
+            self._pending[user_id] = (risk_profile, state)
+            self.metrics.set_write_queue_depth(len(self._pending))
+            self._cond.notify_all()
+
+    def _queued(self, user_id):
+        with self._cond:
+            entry = self._pending.get(user_id)
+            return self._in_flight.get(user_id) if entry is None else entry
+
+    def get(self, user_id):
+        entry = self._queued(user_id)
+        return self.store.get(user_id) if entry is None else entry[0]
+
+    def get_state(self, user_id):
+        entry = self._queued(user_id)
+        return self.store.get_state(user_id) if entry is None else entry[1]
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending) + len(self._in_flight)
+
+    def _take_batch(self):
+        """Waits for a batch to write and moves it to `_in_flight`. Returns
+        None once the queue is closed and drained."""
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.batch_size and not self._closed and not self._flushing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            for _ in range(min(self.batch_size, len(self._pending))):
+                user_id, entry = self._pending.popitem(last=False)
+                self._in_flight[user_id] = entry
+            self.metrics.set_write_queue_depth(len(self._pending))
+            # Room was made for blocked writers.
+            self._cond.notify_all()
+            return dict(self._in_flight)
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            self.store.put_many((user_id, risk_profile, state) for user_id, (risk_profile, state) in batch.items())
+        except Exception:
+            logger.exception('failed to write %d risk profiles, retrying', len(batch))
+            self.metrics.count_write_flush_error()
+            with self._cond:
+                # Requeue the profiles that weren't written again since.
+                for user_id, entry in batch.items():
+                    self._pending.setdefault(user_id, entry)
+                self._in_flight.clear()
+                self._cond.notify_all()
+                if not self._closed:
+                    self._cond.wait(self.flush_interval)
+            return False
+        self.metrics.observe_write_flush(len(batch), time.perf_counter() - start)
+        with self._cond:
+            self._in_flight.clear()
+            self._cond.notify_all()
+        return True
+
+    def _run(self):
+        failures = 0
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            if self._write(batch):
+                failures = 0
+            else:
+                failures += 1
+                if self._closed and failures >= 3:
+                    logger.error('dropping %d risk profiles that could not be written', len(self))
+                    with self._cond:
+                        self._pending.clear()
+                        self._cond.notify_all()
+                    return
+
+    def flush(self):
+        """Blocks until every queued profile was written."""
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while (self._pending or self._in_flight) and self._thread is not None and self._thread.is_alive():
+                    self._cond.wait(0.1)
+            finally:
+                self._flushing -= 1
+
+    def close(self):
+        """Writes every queued profile and stops the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+def get_profile_writer():
+    """Returns the store profiles are read from and written to: the app's
+    write-behind store, or its `ProfileStore` if writes are synchronous."""
+    write_behind = current_app.extensions.get('write_behind')
+    return get_profile_store() if write_behind is None else write_behind
+
+def init_app(app):
+    app.config.setdefault('WRITE_QUEUE_SIZE', 10000) # 0 writes each profile synchronously
+    app.config.setdefault('WRITE_BATCH_SIZE', 500)
+    app.config.setdefault('WRITE_FLUSH_INTERVAL', 0.05)
+    app.config.setdefault('WRITE_QUEUE_TIMEOUT', 1.0)
+    if app.config['WRITE_QUEUE_SIZE'] > 0:
+        write_behind = WriteBehindProfileStore(
+            app.extensions['profile_store'],
+            maxsize=app.config['WRITE_QUEUE_SIZE'],
+            batch_size=app.config['WRITE_BATCH_SIZE'],
+            flush_interval=app.config['WRITE_FLUSH_INTERVAL'],
+            put_timeout=app.config['WRITE_QUEUE_TIMEOUT'],
+            metrics=app.extensions.get('metrics', NULL_METRICS)
+        )
+        app.extensions['write_behind'] = write_behind
+        atexit.register(write_behind.close)
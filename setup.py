@@ -9,4 +9,7 @@ setup(
     install_requires=[
         'flask',
     ],
+    extras_require={
+        'vectorized': ['numpy'],
+    },
 )
\ No newline at end of file
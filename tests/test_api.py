@@ -1,5 +1,10 @@
+import json
 import pytest
 from http import HTTPStatus
+from riskprofiler import create_app
+import io
+from riskprofiler.db import get_profile_store
+from riskprofiler.batch import BatchScorer, OversizedLine, decode_ndjson_line, iter_stream_lines
 
 @pytest.mark.parametrize(('deleted_key'), (
     ('age'), ('gender'), ('marital_status'), ('dependents'),
@@ -53,3 +58,189 @@ def test_risk_profile_post_disabled_field_payload(client, user_data_json):
     assert isinstance(resp_json['auto'], list)
     assert 'home' in resp_json
     assert isinstance(resp_json['home'], list)
+
+def test_risk_profiles_batch_json_array(client, user_data_json):
+    old_user_data_json = {**user_data_json, 'age': 90}
+    resp = client.post('/risk_profiles/batch', json=[user_data_json, old_user_data_json])
+    assert resp.status_code == HTTPStatus.OK
+    resp_json = resp.get_json()
+    assert len(resp_json) == 2
+    single_resp = client.post('/risk_profile', json=user_data_json)
+    assert resp_json[0] == {'profile': single_resp.get_json()}
+    assert 'life' not in resp_json[1]['profile']
+
+def test_risk_profiles_batch_keeps_going_after_bad_records(client, user_data_json):
+    missing_age = {k: v for k, v in user_data_json.items() if k != 'age'}
+    bad_gender = {**user_data_json, 'gender': 'other'}
+    resp = client.post('/risk_profiles/batch', json=[missing_age, 42, bad_gender, user_data_json])
+    assert resp.status_code == HTTPStatus.OK
+    resp_json = resp.get_json()
+    assert len(resp_json) == 4
+    assert 'missing key' in resp_json[0]['error']
+    assert 'invalid record' in resp_json[1]['error']
+    assert 'gender' in resp_json[2]['error']
+    assert 'profile' in resp_json[3]
+
+def test_risk_profiles_batch_ndjson(client, user_data_json):
+    body = '\n'.join([json.dumps(user_data_json), '', '{not json', json.dumps(user_data_json)]) + '\n'
+    resp = client.post('/risk_profiles/batch', data=body, content_type='application/x-ndjson')
+    assert resp.status_code == HTTPStatus.OK
+    resp_json = resp.get_json()
+    assert len(resp_json) == 3
+    assert 'profile' in resp_json[0]
+    assert 'malformed JSON' in resp_json[1]['error']
+    assert resp_json[2] == resp_json[0]
+
+def test_risk_profiles_batch_not_a_list(client, user_data_json):
+    resp = client.post('/risk_profiles/batch', json=user_data_json)
+    assert resp.status_code == HTTPStatus.BAD_REQUEST
+
+def test_risk_profiles_batch_streamed(client, user_data_json):
+    body = '\n'.join([json.dumps(user_data_json), '', '{not json', json.dumps({**user_data_json, 'age': 90})]) + '\n'
+    expected = client.post('/risk_profiles/batch', data=body, content_type='application/x-ndjson').get_json()
+    resp = client.post('/risk_profiles/batch', data=body, content_type='application/x-ndjson', headers={'Accept': 'application/x-ndjson'})
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.mimetype == 'application/x-ndjson'
+    assert resp.is_streamed
+    assert [json.loads(line) for line in resp.get_data().splitlines()] == expected
+    # JSON arrays too.
+    resp = client.post('/risk_profiles/batch', json=[user_data_json, 42], headers={'Accept': 'application/x-ndjson'})
+    assert [json.loads(line) for line in resp.get_data().splitlines()] == [expected[0], {'error': 'invalid record: expected a JSON object'}]
+    resp = client.post('/risk_profiles/batch', json=user_data_json, headers={'Accept': 'application/x-ndjson'})
+    assert resp.status_code == HTTPStatus.BAD_REQUEST
+
+def test_risk_profiles_batch_streamed_as_of(client, user_data_json):
+    body = json.dumps(user_data_json) + '\n'
+    expected = client.post('/risk_profiles/batch?as_of=2012-01-01', data=body, content_type='application/x-ndjson').get_json()
+    assert expected != client.post('/risk_profiles/batch', data=body, content_type='application/x-ndjson').get_json()
+    resp = client.post('/risk_profiles/batch?as_of=2012-01-01', data=body, content_type='application/x-ndjson', headers={'Accept': 'application/x-ndjson'})
+    assert [json.loads(line) for line in resp.get_data().splitlines()] == expected
+
+def test_batch_scorer_streams_chunks(user_data_json):
+    read = []
+
+    def records():
+        for i in range(5):
+            read.append(i)
+            yield json.dumps(user_data_json)
+    blocks = BatchScorer(chunk_size=2).stream_ndjson(records(), decode=decode_ndjson_line)
+    # Records are read and results written one chunk at a time.
+    assert len(next(blocks).splitlines()) == 2
+    assert read == [0, 1]
+    assert [len(block.splitlines()) for block in blocks] == [2, 1]
+    assert read == list(range(5))
+
+def test_profile_cache_stats(client, user_data_json):
+    client.post('/risk_profile', json=user_data_json)
+    client.post('/risk_profile', json=user_data_json)
+    resp = client.get('/profile_cache/stats')
+    assert resp.status_code == HTTPStatus.OK
+    stats = resp.get_json()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+def test_profile_cache_disabled(user_data_json):
+    app = create_app({'TESTING': True, 'PROFILE_CACHE_SIZE': 0})
+    client = app.test_client()
+    assert client.post('/risk_profile', json=user_data_json).status_code == HTTPStatus.CREATED
+    assert client.get('/profile_cache/stats').status_code == HTTPStatus.NOT_FOUND
+
+def test_risk_profile_post_invalid_value(client, user_data_json):
+    user_data_json['houses'][1]['status'] = 'rented'
+    resp = client.post('/risk_profile', json=user_data_json)
+    assert resp.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert 'houses[1].status' in resp.get_json()['error']
+
+def test_risk_profile_post_all_errors(client, user_data_json):
+    del user_data_json['age']
+    user_data_json['income'] = 1.5
+    resp = client.post('/risk_profile?errors=all', json=user_data_json)
+    assert resp.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    resp_json = resp.get_json()
+    assert 'missing key "age"' in resp_json['error']
+    assert len(resp_json['errors']) == 2
+    assert 'income' in resp_json['errors'][1]
+
+def test_risk_profile_stored_by_user_id(client, user_data_json):
+    assert client.get('/risk_profile?user_id=alice').status_code == HTTPStatus.NOT_FOUND
+    post_resp = client.post('/risk_profile?user_id=alice', json=user_data_json)
+    assert post_resp.status_code == HTTPStatus.CREATED
+    client.post('/risk_profile?user_id=bob', json={**user_data_json, 'age': 90})
+    resp = client.get('/risk_profile?user_id=alice')
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.data == post_resp.data
+
+def test_risk_profile_stored_by_user_id_with_lines(client, user_data_json):
+    full = client.post('/risk_profile', json=user_data_json).get_json()
+    resp = client.post('/risk_profile?user_id=alice&lines=auto', json=user_data_json)
+    assert resp.status_code == HTTPStatus.CREATED
+    assert resp.get_json() == {'auto': full['auto']}
+    # The whole profile is stored, and can still be updated.
+    assert client.get('/risk_profile?user_id=alice').get_json() == full
+    assert client.patch('/risk_profile?user_id=alice', json={'age': 70}).status_code == HTTPStatus.OK
+
+def test_risk_profile_stored_by_user_id_corrupted(app, client, user_data_json):
+    client.post('/risk_profile?user_id=alice', json=user_data_json)
+    with app.app_context():
+        app.extensions['write_behind'].flush()
+        conn = get_profile_store().connection()
+    with conn:
+        conn.execute('UPDATE risk_profile SET profile = ? WHERE user_id = ?', (b'not a profile', 'alice'))
+    resp = client.get('/risk_profile?user_id=alice')
+    assert resp.status_code == HTTPStatus.NOT_FOUND
+    assert resp.get_json() == {'error': 'no risk profile for user "alice"'}
+
+def test_risk_profile_not_stored_without_user_id(client, user_data_json):
+    client.post('/risk_profile', json=user_data_json)
+    assert client.get('/risk_profile?user_id=').status_code == HTTPStatus.BAD_REQUEST
+    assert client.get('/risk_profile').status_code == HTTPStatus.BAD_REQUEST
+
+def test_risk_profile_user_id_too_long(client, user_data_json):
+    resp = client.post('/risk_profile?user_id=' + 'a' * 257, json=user_data_json)
+    assert resp.status_code == HTTPStatus.BAD_REQUEST
+
+@pytest.mark.parametrize('cache_size', (0, 100))
+def test_risk_profile_post_lines(user_data_json, cache_size):
+    client = create_app({'TESTING': True, 'PROFILE_CACHE_SIZE': cache_size}).test_client()
+    for _ in range(2): # The second time, the whole profile may be cached.
+        resp = client.post('/risk_profile?lines=auto,home', json=user_data_json)
+        assert resp.status_code == HTTPStatus.CREATED
+        full = client.post('/risk_profile', json=user_data_json).get_json()
+        assert resp.get_json() == {'auto': full['auto'], 'home': full['home']}
+
+@pytest.mark.parametrize('lines', ('', 'auto,boat', 'Auto'))
+def test_risk_profile_post_invalid_lines(client, user_data_json, lines):
+    resp = client.post('/risk_profile?lines=' + lines, json=user_data_json)
+    assert resp.status_code == HTTPStatus.BAD_REQUEST
+
+@pytest.mark.parametrize('block_size', (1, 3, 64 * 1024))
+def test_iter_stream_lines(block_size):
+    lines = iter_stream_lines(io.BytesIO(b'{"a": 1}\n\n{"b": 22}\nlast'), block_size=block_size)
+    assert list(lines) == [b'{"a": 1}', b'', b'{"b": 22}', b'last']
+
+@pytest.mark.parametrize('block_size', (1, 3, 7, 64 * 1024))
+def test_iter_stream_lines_too_long(block_size):
+    data = b'12345678\n123456789\n\n' + b'x' * 100 + b'\n1234\n' + b'y' * 20
+    lines = list(iter_stream_lines(io.BytesIO(data), max_line_size=8, block_size=block_size))
+    assert lines[0] == b'12345678'
+    assert isinstance(lines[1], OversizedLine) and lines[1].limit == 8
+    assert lines[2] == b''
+    assert isinstance(lines[3], OversizedLine)
+    assert lines[4] == b'1234'
+    assert isinstance(lines[5], OversizedLine)
+    assert len(lines) == 6
+
+def test_iter_stream_lines_long_line():
+    line = b'x' * (1024 * 1024)
+    lines = iter_stream_lines(io.BytesIO(line + b'\nend'), block_size=1024)
+    assert list(lines) == [line, b'end']
+
+def test_risk_profiles_batch_streamed_line_too_long(app, client, user_data_json):
+    app.config['BATCH_MAX_LINE_SIZE'] = 1024
+    too_long = dict(user_data_json, padding='x' * 1024)
+    body = '\n'.join(json.dumps(record) for record in (user_data_json, too_long, user_data_json))
+    resp = client.post('/risk_profiles/batch', data=body, headers={'Content-Type': 'application/x-ndjson', 'Accept': 'application/x-ndjson'})
+    assert resp.status_code == HTTPStatus.OK
+    entries = [json.loads(line) for line in resp.get_data().splitlines()]
+    assert [list(entry) for entry in entries] == [['profile'], ['error'], ['profile']]
+    assert entries[1]['error'] == 'invalid record: line longer than 1024 bytes'
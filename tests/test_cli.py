@@ -0,0 +1,105 @@
+import pytest
+import csv
+import json
+import os
+from riskprofiler import create_app
+from riskprofiler.cli import decode_csv_row
+
+POLICY_FILE = os.path.join(os.path.dirname(__file__), '..', 'riskprofiler', 'policies.json')
+
+@pytest.fixture
+def ndjson_input(tmp_path, user_data_json):
+    lines = []
+    for age in range(20, 70):
+        lines.append(json.dumps({**user_data_json, 'age': age}))
+        if age % 10 == 0:
+            lines.append(json.dumps({**user_data_json, 'age': str(age)}))
+    lines.insert(3, '{oops')
+    path = tmp_path / 'users.ndjson'
+    path.write_text('\n'.join(lines) + '\n')
+    return path
+
+def read_ndjson(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+@pytest.mark.parametrize('workers', (1, 2))
+def test_score_ndjson(runner, tmp_path, ndjson_input, workers):
+    output = tmp_path / 'profiles.ndjson'
+    errors = tmp_path / 'errors.ndjson'
+    result = runner.invoke(args=[
+        'riskprofiler', 'score', str(ndjson_input), str(output),
+        '--workers', str(workers), '--chunk-size', '7', '--errors', str(errors)
+    ])
+    assert result.exit_code == 0, result.output
+    profiles = read_ndjson(output)
+    assert len(profiles) == 50
+    records = [p['record'] for p in profiles]
+    assert records == sorted(records)
+    assert 'life' in profiles[0]['profile']
+    assert 'life' not in profiles[-1]['profile'] # over 60
+    error_lines = read_ndjson(errors)
+    assert [e['record'] for e in error_lines] == [2, 4, 14, 25, 36, 47]
+    assert 'wrong type' in error_lines[0]['error']
+    assert 'malformed JSON' in error_lines[1]['error']
+    assert 'scored 50 records, 6 errors' in result.output
+
+def write_policies(path, large_income_thresh):
+    with open(POLICY_FILE) as f:
+        definition = json.load(f)
+    for policy in definition['policies']:
+        if policy['name'] == 'large_income':
+            policy['rules'][0]['if']['income']['>'] = large_income_thresh
+    with open(path, 'w') as f:
+        json.dump(definition, f)
+
+@pytest.mark.parametrize('workers', (1, 2))
+def test_score_with_app_policies(tmp_path, user_data_json, workers):
+    # Incomes above 100 lower every score with the default version, and
+    # above 10 with the "low" one.
+    write_policies(tmp_path / 'default.json', 100)
+    write_policies(tmp_path / 'low.json', 10)
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': str(tmp_path / 'test.sqlite'),
+        'POLICY_FILE': str(tmp_path / 'default.json'),
+        'POLICY_VERSIONS': {'low': str(tmp_path / 'low.json')}
+    })
+    users = [{**user_data_json, 'income': income} for income in (50, 150)]
+    input_path = tmp_path / 'users.ndjson'
+    input_path.write_text(''.join(json.dumps(user) + '\n' for user in users))
+    client = app.test_client()
+    for version in ('default', 'low'):
+        output = tmp_path / '{}.ndjson'.format(version)
+        result = app.test_cli_runner().invoke(args=[
+            'riskprofiler', 'score', str(input_path), str(output), '--workers', str(workers), '--policy-version', version
+        ])
+        assert result.exit_code == 0, result.output
+        expected = client.post('/risk_profiles/batch', json=users, headers={'X-Policy-Version': version}).get_json()
+        assert [line['profile'] for line in read_ndjson(output)] == [entry['profile'] for entry in expected]
+    assert read_ndjson(tmp_path / 'default.ndjson') != read_ndjson(tmp_path / 'low.ndjson')
+    result = app.test_cli_runner().invoke(args=['riskprofiler', 'score', str(input_path), '-', '--policy-version', 'nope'])
+    assert result.exit_code != 0
+    assert 'unknown policy version' in result.output
+    app.extensions['write_behind'].close()
+
+def test_score_csv(runner, tmp_path, user_data_json):
+    path = tmp_path / 'users.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(user_data_json))
+        writer.writeheader()
+        for income in (0, 100, 'lots'):
+            writer.writerow({
+                k: json.dumps(v) if isinstance(v, list) else v
+                for k, v in {**user_data_json, 'income': income}.items()
+            })
+    output = tmp_path / 'profiles.ndjson'
+    result = runner.invoke(args=['riskprofiler', 'score', str(path), str(output)])
+    assert result.exit_code == 0, result.output
+    profiles = read_ndjson(output)
+    assert [p['record'] for p in profiles] == [1, 2]
+    assert 'disability' not in profiles[0]['profile']
+    assert 'disability' in profiles[1]['profile']
+
+def test_decode_csv_row():
+    obj = decode_csv_row({'age': '35', 'gender': 'male', 'houses': '[]', 'income': 'x'})
+    assert obj == {'age': 35, 'gender': 'male', 'houses': [], 'income': 'x'}
@@ -0,0 +1,97 @@
+import threading
+import time
+from riskprofiler import api, create_app
+from riskprofiler.coalescing import Coalescer
+from riskprofiler.risk_profile_calculator import RiskProfileCalculator
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def run_in_thread(func, results):
+    def target():
+        try:
+            results.append(func())
+        except Exception as err:
+            results.append(err)
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+def test_followers_share_the_leader_result():
+    coalescer = Coalescer()
+    calls = []
+
+    def calculate():
+        calls.append(None)
+        # Returns once the other call waits for this one.
+        wait_until(lambda: coalescer.followers == 1)
+        return {'profile': 1}
+
+    results = []
+    leader = run_in_thread(lambda: coalescer.run('key', calculate), results)
+    wait_until(lambda: len(coalescer) == 1)
+    follower = run_in_thread(lambda: coalescer.run('key', calculate), results)
+    leader.join()
+    follower.join()
+    assert len(calls) == 1
+    assert results == [{'profile': 1}, {'profile': 1}]
+    assert results[0] is results[1]
+    assert coalescer.stats() == {'in_flight': 0, 'leaders': 1, 'followers': 1}
+    # Finished calculations aren't shared.
+    assert coalescer.run('key', lambda: 2) == 2
+    assert coalescer.run('other', lambda: 3) == 3
+    assert coalescer.stats() == {'in_flight': 0, 'leaders': 3, 'followers': 1}
+
+def test_errors_are_raised_in_every_waiter():
+    coalescer = Coalescer()
+
+    def calculate():
+        wait_until(lambda: coalescer.followers == 2)
+        raise ValueError('boom')
+
+    results = []
+    threads = [run_in_thread(lambda: coalescer.run('key', calculate), results)]
+    wait_until(lambda: len(coalescer) == 1)
+    threads += [run_in_thread(lambda: coalescer.run('key', calculate), results) for _ in range(2)]
+    for thread in threads:
+        thread.join()
+    assert len(results) == 3
+    assert all(isinstance(result, ValueError) and str(result) == 'boom' for result in results)
+    assert len(coalescer) == 0
+    assert coalescer.run('key', lambda: 1) == 1
+
+def test_api_coalesces_identical_requests(app, user_data_json, monkeypatch):
+    coalescer = app.extensions['coalescer']
+    calculated = []
+
+    class BlockingCalculator(RiskProfileCalculator):
+        def calculate(self):
+            calculated.append(None)
+            wait_until(lambda: coalescer.followers == 1)
+            return super().calculate()
+
+    monkeypatch.setattr(api, 'RiskProfileCalculator', BlockingCalculator)
+    reordered = {**user_data_json, 'vehicles': user_data_json['vehicles'][::-1]}
+    leader_results, follower_results = [], []
+    leader = run_in_thread(lambda: app.test_client().post('/risk_profile', json=user_data_json), leader_results)
+    wait_until(lambda: len(coalescer) == 1)
+    follower = run_in_thread(lambda: app.test_client().post('/risk_profile', json=reordered), follower_results)
+    leader.join()
+    follower.join()
+    assert len(calculated) == 1
+    (leader_resp,), (follower_resp,) = leader_results, follower_results
+    assert leader_resp.status_code == follower_resp.status_code == 201
+    # Each response lists the items in the order of its request.
+    assert [item['key'] for item in leader_resp.get_json()['auto']] == [0, 1]
+    assert follower_resp.get_json()['auto'] == leader_resp.get_json()['auto'][::-1]
+    assert app.test_client().get('/coalescing/stats').get_json() == {'in_flight': 0, 'leaders': 1, 'followers': 1}
+    metrics = app.test_client().get('/metrics').get_data(as_text=True)
+    assert 'riskprofiler_coalesced_requests_total{role="follower"} 1' in metrics
+
+def test_coalescing_disabled(user_data_json):
+    client = create_app({'TESTING': True, 'COALESCE_REQUESTS': False}).test_client()
+    assert client.post('/risk_profile', json=user_data_json).status_code == 201
+    assert client.get('/coalescing/stats').status_code == 404
@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+import pytest
+from riskprofiler.db import get_profile_store
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.risk_profile_calculator import RiskAversion
+
+PROFILE = {Loi.life: RiskAversion.average, Loi.auto: {0: RiskAversion.conservative}}
+
+def test_put_and_get(app):
+    with app.app_context():
+        store = get_profile_store()
+        assert store.get('alice') is None
+        store.put('alice', PROFILE)
+        assert store.get('alice') == PROFILE
+        store.put('alice', {Loi.life: RiskAversion.conservative})
+        assert store.get('alice') == {Loi.life: RiskAversion.conservative}
+
+def test_put_many(app):
+    with app.app_context():
+        store = get_profile_store()
+        store.put_many([('a', PROFILE), ('b', {})])
+        assert store.get('a') == PROFILE
+        assert store.get('b') == {}
+
+def test_connection_per_thread(app):
+    with app.app_context():
+        store = get_profile_store()
+    conn = store.connection()
+    assert store.connection() is conn
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    store.put('alice', PROFILE)
+    results = []
+    def worker():
+        results.append((store.connection() is not conn, store.get('alice')))
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert results == [(True, PROFILE)]
+
+def test_connection_closed_when_thread_exits(app):
+    with app.app_context():
+        store = get_profile_store()
+    store.connection()
+    connections = []
+    def worker():
+        connections.append(store.connection())
+        store.put('alice', PROFILE)
+    for _ in range(5):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+    # Only the connection of this thread is left.
+    assert len(store._connections) == 1
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+    assert store.get('alice') == PROFILE
+
+def test_lookup_uses_primary_key(app):
+    with app.app_context():
+        conn = get_profile_store().connection()
+    plan = conn.execute('EXPLAIN QUERY PLAN SELECT profile FROM risk_profile WHERE user_id = ?', ('a',)).fetchall()
+    assert 'USING PRIMARY KEY' in plan[0][-1]
+
+def test_close(app):
+    with app.app_context():
+        store = get_profile_store()
+    conn = store.connection()
+    store.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
+    assert store.connection() is not conn
+
+def test_init_db_command(runner, app):
+    with app.app_context():
+        get_profile_store().put('alice', PROFILE)
+    result = runner.invoke(args=['init-db'])
+    assert 'Initialized' in result.output
+    with app.app_context():
+        assert get_profile_store().get('alice') is None
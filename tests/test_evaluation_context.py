@@ -0,0 +1,101 @@
+import os
+import pytest
+import datetime
+from types import SimpleNamespace
+from riskprofiler import evaluation_context
+from riskprofiler.evaluation_context import EvaluationContext, get_evaluation_context, evaluated_at, is_date_overridden
+from riskprofiler.incremental import IncrementalScorer
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.policy_rules import load_policies
+from riskprofiler.risk_policies import RecentVehiclePolicy
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES, RiskProfileCalculator
+from riskprofiler.risk_scoring import RiskScoring
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.user_data import first_year_within, first_year_under
+
+POLICY_FILE = os.path.join(os.path.dirname(__file__), '..', 'riskprofiler', 'policies.json')
+
+class FakeDate(datetime.date):
+    current = datetime.date(2020, 12, 31)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+@pytest.fixture
+def fake_today(monkeypatch):
+    monkeypatch.setattr(evaluation_context, 'datetime', SimpleNamespace(date=FakeDate))
+    FakeDate.current = datetime.date(2020, 12, 31)
+    return FakeDate
+
+def test_today_context_follows_day_rollover(fake_today):
+    context = get_evaluation_context()
+    assert context.date == datetime.date(2020, 12, 31)
+    assert get_evaluation_context() is context
+    fake_today.current = datetime.date(2021, 1, 1)
+    assert get_evaluation_context().date == datetime.date(2021, 1, 1)
+    assert not is_date_overridden()
+
+def test_evaluated_at(fake_today):
+    with evaluated_at(datetime.date(2010, 6, 1)):
+        assert is_date_overridden()
+        assert get_evaluation_context().date == datetime.date(2010, 6, 1)
+        with evaluated_at(None):
+            assert get_evaluation_context().date == datetime.date(2020, 12, 31)
+        assert get_evaluation_context().date == datetime.date(2010, 6, 1)
+    assert not is_date_overridden()
+
+def test_first_year_within_is_cached():
+    context = EvaluationContext(datetime.date(2021, 1, 5))
+    assert context.first_year_within(5) == first_year_within(5, context.date)
+    assert context.first_year_within(5) == context.first_year_within(5)
+    assert context.first_year_under(5) == first_year_under(5, context.date)
+    assert set(context._first_years) == {5}
+
+@pytest.mark.parametrize('policies', [
+    CURRENT_RISK_POLICIES,
+    load_policies(POLICY_FILE)
+])
+@pytest.mark.parametrize('compiled', [True, False])
+def test_policies_follow_the_evaluation_date(fake_today, policies, compiled, user_data_json):
+    user_data = UserDataDeserializer().load(user_data_json)
+    kwargs = {} if compiled else {'risk_scoring': RiskScoring()}
+
+    def auto_profile():
+        return RiskProfileCalculator(user_data=user_data, risk_policies=policies, lines=[Loi.auto], **kwargs).calculate()
+
+    fake_today.current = datetime.date(2022, 12, 31)
+    recent = auto_profile()
+    fake_today.current = datetime.date(2024, 1, 1)
+    not_recent = auto_profile()
+    assert recent != not_recent
+    with evaluated_at(datetime.date(2022, 12, 31)):
+        assert auto_profile() == recent
+    # A policy's own `curr_date` takes precedence.
+    fixed = [RecentVehiclePolicy(curr_date=datetime.date(2022, 12, 31)) if isinstance(p, RecentVehiclePolicy) else p for p in CURRENT_RISK_POLICIES]
+    assert RiskProfileCalculator(user_data=user_data, risk_policies=fixed, lines=[Loi.auto], **kwargs).calculate() == recent
+
+def test_incremental_state_of_another_date_is_rescored(user_data_json):
+    scorer = IncrementalScorer()
+    with evaluated_at(datetime.date(2022, 12, 31)):
+        _, state = scorer.score(user_data_json)
+    risk_profile, new_state = scorer.rescore(state, {'income': 160000})
+    assert new_state.signature != state.signature
+    expected = RiskProfileCalculator(user_data=UserDataDeserializer().load({**user_data_json, 'income': 160000})).calculate()
+    assert risk_profile == expected
+
+def test_api_as_of(app, client, user_data_json):
+    today = client.post('/risk_profile', json=user_data_json).get_json()
+    resp = client.post('/risk_profile?as_of=2022-12-31', json=user_data_json)
+    assert resp.status_code == 201
+    with evaluated_at(datetime.date(2022, 12, 31)):
+        expected = RiskProfileCalculator(user_data=UserDataDeserializer().load(user_data_json)).calculate()
+    assert resp.get_json()['auto'] == [{'key': key, 'value': value.value} for key, value in expected[Loi.auto].items()]
+    assert resp.get_json() != today
+    # Back-dated profiles aren't cached, and the date is reset afterwards.
+    assert app.extensions['profile_cache'].stats()['size'] == 1
+    assert client.post('/risk_profile', json=user_data_json).get_json() == today
+    assert not is_date_overridden()
+
+def test_api_invalid_as_of(client, user_data_json):
+    assert client.post('/risk_profile?as_of=yesterday', json=user_data_json).status_code == 400
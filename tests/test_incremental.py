@@ -0,0 +1,161 @@
+import datetime
+import random
+import pytest
+from http import HTTPStatus
+from riskprofiler.errors import DeserializationError
+from riskprofiler.incremental import IncrementalScorer, ScoringState, TraceRecorder, apply_patch, changed_fields
+from riskprofiler.risk_policies import RecentVehiclePolicy
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES, RiskProfileCalculator
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.synthetic import SyntheticUserDataGenerator
+
+def full_profile(user_data_obj):
+    return RiskProfileCalculator(user_data=UserDataDeserializer().load(user_data_obj)).calculate()
+
+def random_patch(rnd, generator, user_data_obj):
+    patch = {}
+    for _ in range(rnd.randint(1, 3)):
+        change = rnd.choice((
+            'age', 'income', 'dependents', 'marital_status', 'gender', 'risk_questions',
+            'add_vehicle', 'change_vehicle', 'remove_vehicle', 'add_house', 'change_house', 'remove_house'
+        ))
+        sample = generator.payload()
+        if change in sample:
+            patch[change] = sample[change]
+        elif change == 'age':
+            patch['age'] = rnd.choice((29, 30, 39, 40, 60, 61))
+        elif change == 'income':
+            patch['income'] = rnd.choice((0, 1, 200000, 200001))
+        else:
+            action, field = change.split('_')
+            field += 's'
+            items = user_data_obj[field]
+            if field == 'houses':
+                item = {'zip_code': rnd.randint(1000, 99999), 'status': rnd.choice(('owned', 'mortgaged'))}
+            else:
+                item = {'make': 'Maker', 'model': 'Model', 'year': rnd.randint(2000, 2030)}
+            if action == 'add':
+                item['key'] = max([i['key'] for i in items], default=-1) + 1 + rnd.randint(0, 3)
+                patch.setdefault(field, []).append(item)
+            elif items and action == 'change':
+                item['key'] = rnd.choice(items)['key']
+                patch.setdefault(field, []).append(item)
+            elif items:
+                patch.setdefault('removed_' + field, []).append(rnd.choice(items)['key'])
+    return patch
+
+def test_randomized_equivalence_with_full_recompute():
+    rnd = random.Random(42)
+    generator = SyntheticUserDataGenerator(seed=7)
+    scorer = IncrementalScorer()
+    for _ in range(300):
+        user_data_obj = generator.payload(rnd.choice(('typical', 'typical', 'no_items', 'all_mortgaged')))
+        risk_profile, state = scorer.score(user_data_obj)
+        assert risk_profile == full_profile(user_data_obj)
+        for _ in range(5):
+            patch = random_patch(rnd, generator, state.user_data_obj)
+            state = ScoringState.decode(state.encode())
+            try:
+                risk_profile, state = scorer.rescore(state, patch)
+            except DeserializationError:
+                continue # e.g. a duplicated key; checked below.
+            expected = full_profile(state.user_data_obj)
+            assert risk_profile == expected
+            for loi, val in expected.items():
+                if isinstance(val, dict):
+                    assert list(risk_profile[loi]) == list(val)
+
+def test_only_dependent_policies_are_applied_again(user_data_json):
+    applied = []
+    class SpyPolicy:
+        def __init__(self, policy):
+            self.policy = policy
+            self.reads = policy.reads
+            self.item_wise = policy.item_wise
+        def apply(self, user_data, scoring):
+            applied.append((type(self.policy).__name__, user_data.vehicles_count()))
+            self.policy.apply(user_data, scoring)
+    scorer = IncrementalScorer(policies=[SpyPolicy(p) for p in CURRENT_RISK_POLICIES])
+    _, state = scorer.score(user_data_json)
+
+    applied.clear()
+    _, state = scorer.rescore(state, {'income': 250000})
+    # Vehicles aren't even deserialized, as neither policy reads them.
+    assert applied == [('NoIncomePolicy', 0), ('LargeIncomePolicy', 0)]
+
+    applied.clear()
+    new_vehicle = {'key': 7, 'make': 'Maker', 'model': 'Model C', 'year': 2019}
+    _, state = scorer.rescore(state, {'vehicles': [new_vehicle]})
+    # The item-wise policy only looks at the added vehicle.
+    assert ('RecentVehiclePolicy', 1) in applied
+    assert ('RecentVehiclePolicy', 3) not in applied
+    assert 'AgePolicy' not in [name for name, _ in applied]
+
+def test_apply_patch(user_data_json):
+    patched = apply_patch(user_data_json, {
+        'age': 50,
+        'houses': [{'key': 1, 'zip_code': 789, 'status': 'owned'}, {'key': 5, 'zip_code': 1, 'status': 'owned'}],
+        'removed_vehicles': [0]
+    })
+    assert patched['age'] == 50
+    assert [h['key'] for h in patched['houses']] == [0, 1, 5]
+    assert patched['houses'][1]['zip_code'] == 789
+    assert [v['key'] for v in patched['vehicles']] == [1]
+    assert user_data_json['age'] == 35 # Not changed in place.
+    fields, changed_keys = changed_fields(user_data_json, patched)
+    assert fields == {'age', 'houses', 'vehicles'}
+    assert changed_keys == {'houses': {1, 5}, 'vehicles': set()}
+
+def test_rescore_invalid_patch(user_data_json):
+    scorer = IncrementalScorer()
+    _, state = scorer.score(user_data_json)
+    with pytest.raises(DeserializationError):
+        scorer.rescore(state, {'vehicles': [{'key': 0, 'make': 'Maker'}]})
+    with pytest.raises(DeserializationError):
+        scorer.rescore(state, {'houses': {}})
+
+@pytest.mark.parametrize('patch', (
+    {'dependents': True},
+    {'age': 35.0},
+    {'risk_questions': [False, 1, 0]},
+    {'houses': [{'key': 0, 'zip_code': 123.0, 'status': 'owned'}]}
+))
+def test_rescore_equal_values_of_other_types(user_data_json, patch):
+    # Equal (`==`) to the stored values, but of the wrong type.
+    scorer = IncrementalScorer()
+    _, state = scorer.score(user_data_json)
+    assert changed_fields(state.user_data_obj, apply_patch(state.user_data_obj, patch))[0] == set(patch)
+    with pytest.raises(DeserializationError):
+        scorer.rescore(state, patch)
+
+def test_rescore_with_other_policies(user_data_json):
+    _, state = IncrementalScorer().score(user_data_json)
+    policies = [RecentVehiclePolicy(curr_date=datetime.date(2100, 1, 1)) if isinstance(p, RecentVehiclePolicy) else p for p in CURRENT_RISK_POLICIES]
+    risk_profile, _ = IncrementalScorer(policies=policies).rescore(state, {})
+    expected = RiskProfileCalculator(user_data=UserDataDeserializer().load(user_data_json), risk_policies=policies).calculate()
+    assert risk_profile == expected
+
+def test_patch_endpoint_corrupted_state(app, client, user_data_json):
+    client.post('/risk_profile?user_id=alice', json=user_data_json)
+    with app.app_context():
+        writer = app.extensions['write_behind']
+        writer.put('alice', writer.get('alice'), b'not a scoring state')
+    resp = client.patch('/risk_profile?user_id=alice', json={'age': 70})
+    assert resp.status_code == HTTPStatus.NOT_FOUND
+    assert 'POST the whole user data first' in resp.get_json()['error']
+
+def test_patch_endpoint(client, user_data_json):
+    assert client.patch('/risk_profile?user_id=alice', json={'age': 70}).status_code == HTTPStatus.NOT_FOUND
+    client.post('/risk_profile?user_id=alice', json=user_data_json)
+    resp = client.patch('/risk_profile?user_id=alice', json={'age': 70})
+    assert resp.status_code == HTTPStatus.OK
+    expected = client.post('/risk_profile', json={**user_data_json, 'age': 70})
+    assert resp.data == expected.data
+    assert client.get('/risk_profile?user_id=alice').data == expected.data
+
+    resp = client.patch('/risk_profile?user_id=alice', json={'age': '70'})
+    assert resp.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert 'age' in resp.get_json()['error']
+    resp = client.patch('/risk_profile?user_id=alice', json={'dependents': True, 'age': 70.0})
+    assert resp.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert client.get('/risk_profile?user_id=alice').data == expected.data
@@ -0,0 +1,75 @@
+import json
+import pytest
+from riskprofiler.loadgen import CONNECTION_ERROR, HttpTarget, InProcessTarget, LatencyHistogram, LocalServerTarget, make_bodies, parse_mix, run_load
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.record(ms / 1e3)
+    assert histogram.count == 1000
+    assert histogram.max == 1.0
+    for percent, expected in ((50, 0.5), (90, 0.9), (99, 0.99), (99.9, 0.999)):
+        assert histogram.percentile(percent) == pytest.approx(expected, rel=0.011)
+    assert histogram.percentile(100) == 1.0
+    assert sum(count for _, count in histogram.buckets()) == 1000
+    other = LatencyHistogram()
+    other.record(2.0)
+    histogram.merge(other)
+    assert histogram.percentile(100) == 2.0
+    assert LatencyHistogram().percentile(50) is None
+
+def test_parse_mix():
+    assert parse_mix('typical=80,large_fleet=5, invalid=15') == {'typical': 80, 'large_fleet': 5, 'invalid': 15}
+    assert parse_mix('typical') == {'typical': 1}
+    for mix_arg in ('unknown=1', 'typical=x', 'typical=-1', 'typical=0'):
+        with pytest.raises(ValueError):
+            parse_mix(mix_arg)
+
+def test_run_load_in_process(app):
+    bodies = make_bodies(20, {'typical': 1, 'invalid': 1}, seed=3)
+    result = run_load(InProcessTarget(app), bodies, requests=60, concurrency=3)
+    assert result.requests == 60
+    assert set(result.statuses) == {201, 422}
+    assert sum(result.statuses.values()) == 60
+    assert result.failures == 0
+    assert result.throughput > 0
+    assert result.to_dict()['latency']['p99.9'] is not None
+
+def test_run_load_at_rate(app):
+    result = run_load(InProcessTarget(app), make_bodies(5), duration=0.2, concurrency=2, rate=50)
+    # Requests scheduled at 0, 20, ..., 180 ms.
+    assert result.requests == 10
+    assert result.duration >= 0.18
+
+def test_run_load_local_server(app):
+    target = LocalServerTarget(app)
+    try:
+        result = run_load(target, make_bodies(5), requests=20, concurrency=2)
+    finally:
+        target.close()
+    assert result.statuses == {201: 20}
+
+def test_run_load_connection_errors():
+    result = run_load(HttpTarget('http://127.0.0.1:1/risk_profile', timeout=1.0), make_bodies(1), requests=3)
+    assert result.statuses == {CONNECTION_ERROR: 3}
+    assert result.failures == 3
+
+def test_load_command(runner, tmp_path):
+    output = tmp_path / 'results.json'
+    result = runner.invoke(args=[
+        'riskprofiler', 'load', '--requests', '30', '--concurrency', '2',
+        '--mix', 'typical=3,large_fleet=1,invalid=1', '--payloads', '10', '--output', str(output)
+    ])
+    assert result.exit_code == 0, result.output
+    assert '30 requests in' in result.output
+    assert 'p99.9' in result.output
+    results = json.loads(output.read_text())
+    assert results['requests'] == 30
+    assert set(results['statuses']) == {'201', '422'}
+
+def test_load_command_failures(runner):
+    result = runner.invoke(args=['riskprofiler', 'load', '--requests', '2', '--url', 'http://127.0.0.1:1/risk_profile'])
+    assert result.exit_code == 1
+    assert '2 requests failed' in result.output
+    result = runner.invoke(args=['riskprofiler', 'load', '--mix', 'nope=1'])
+    assert result.exit_code == 2
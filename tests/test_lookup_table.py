@@ -0,0 +1,87 @@
+import os
+import itertools
+import pytest
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.lookup_table import build_single_item_line_table
+from riskprofiler.policy_compiler import compile_policies
+from riskprofiler.policy_rules import load_policies
+from riskprofiler.risk_policies import AgePolicy, LargeIncomePolicy
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES, RiskProfileCalculator, RiskScoreValueMapping
+from riskprofiler.risk_scoring import RiskScoring
+from riskprofiler.user_data import UserData, ItemDataCollection, HouseItemData, VehicleItemData, HouseStatus, Gender, MaritalStatus
+
+POLICY_FILE = os.path.join(os.path.dirname(__file__), '..', 'riskprofiler', 'policies.json')
+
+# Values on both sides of every boundary the policies check.
+AGES = (0, 18, 29, 30, 39, 40, 60, 61, 99)
+DEPENDENTS = (0, 1, 3)
+HOUSES = (
+    (),
+    ((0, HouseStatus.owned),),
+    ((0, HouseStatus.mortgaged),),
+    ((0, HouseStatus.owned), (1, HouseStatus.mortgaged))
+)
+RISK_QUESTIONS = [list(answers) for answers in itertools.product((0, 1), repeat=3)] + [[], [5, -1, 3]]
+
+def incomes(large_income_thresh):
+    return sorted({-1, 0, 1, large_income_thresh - 1, large_income_thresh, large_income_thresh + 1})
+
+def user_datas(large_income_thresh):
+    for age, income, dependents, marital_status, houses, risk_questions in itertools.product(
+        AGES, incomes(large_income_thresh), DEPENDENTS, MaritalStatus, HOUSES, RISK_QUESTIONS
+    ):
+        yield UserData(
+            age=age,
+            gender=Gender.male,
+            marital_status=marital_status,
+            dependents=dependents,
+            income=income,
+            houses=ItemDataCollection(*[HouseItemData(key, 1000, status) for key, status in houses]),
+            vehicles=ItemDataCollection(VehicleItemData(0, 'Maker', 'Model', 2018)),
+            risk_questions=risk_questions
+        )
+
+def with_large_income_thresh(large_income_thresh):
+    return [LargeIncomePolicy(large_income_thresh) if isinstance(p, LargeIncomePolicy) else p for p in CURRENT_RISK_POLICIES]
+
+@pytest.mark.parametrize('large_income_thresh', (200000, 1, 0, -5))
+@pytest.mark.parametrize('lines', (None, frozenset([Loi.life]), frozenset([Loi.disability, Loi.auto])))
+def test_table_matches_policies_over_the_whole_domain(large_income_thresh, lines):
+    policies = with_large_income_thresh(large_income_thresh)
+    plan = compile_policies(policies, lines)
+    assert plan.table is not None
+    mapping = RiskScoreValueMapping()
+    for user_data in user_datas(large_income_thresh):
+        expected = RiskProfileCalculator(user_data=user_data, risk_policies=policies, risk_scoring=RiskScoring(), lines=lines).calculate()
+        assert plan.evaluate(user_data, mapping) == expected
+
+def test_table_entries():
+    table = build_single_item_line_table(CURRENT_RISK_POLICIES)
+    # Every feature combination is reachable with the default threshold,
+    # but incomes of at most zero above it.
+    assert [i for i, entry in enumerate(table.entries) if entry is None] == [i for i in range(128) if i >> 3 & 3 == 1]
+    married_with_dependents_and_mortgage = UserData(
+        age=35, gender=Gender.female, marital_status=MaritalStatus.married, dependents=2, income=50000,
+        houses=ItemDataCollection(HouseItemData(0, 1000, HouseStatus.mortgaged)), vehicles=ItemDataCollection(),
+        risk_questions=[0, 1, 0]
+    )
+    # Under 40 (-1), dependents (+1), married (+1 / -1), mortgage (disability +1).
+    assert table.lookup(married_with_dependents_and_mortgage) == (1, 0)
+
+def test_table_follows_the_income_threshold():
+    policies = with_large_income_thresh(200000)
+    plan = compile_policies(policies)
+    large_income_policy = next(p for p in policies if isinstance(p, LargeIncomePolicy))
+    large_income_policy.large_income_thresh = -5
+    mapping = RiskScoreValueMapping()
+    for user_data in user_datas(-5):
+        expected = RiskProfileCalculator(user_data=user_data, risk_policies=policies, risk_scoring=RiskScoring()).calculate()
+        assert plan.evaluate(user_data, mapping) == expected
+
+def test_no_table_for_other_policies():
+    class CustomAgePolicy(AgePolicy):
+        pass
+    assert build_single_item_line_table(load_policies(POLICY_FILE)) is None
+    assert build_single_item_line_table([CustomAgePolicy()]) is None
+    assert build_single_item_line_table(CURRENT_RISK_POLICIES + [LargeIncomePolicy(100000)]) is None
+    assert compile_policies(CURRENT_RISK_POLICIES, [Loi.home, Loi.auto]).table is None
@@ -0,0 +1,82 @@
+import pytest
+from riskprofiler import create_app
+from riskprofiler.metrics import Histogram, Metrics, NULL_METRICS
+from riskprofiler.risk_policies import AgePolicy, InitialRiskPolicy
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES, RiskProfileCalculator
+from riskprofiler.risk_scoring import RiskScoring
+from riskprofiler.serialization import UserDataDeserializer
+
+def test_histogram_buckets():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    cumulative, total, count = histogram.snapshot()
+    assert cumulative == [2, 3, 4]
+    assert total == pytest.approx(2.65)
+    assert count == 4
+
+def test_render():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe_policy(AgePolicy(), 0.5, 'default')
+    metrics.count_request('api.get_risk_profile', 'POST', 201)
+    metrics.count_error(KeyError('x'))
+    text = metrics.render()
+    assert '# TYPE riskprofiler_policy_duration_seconds histogram' in text
+    assert 'riskprofiler_policy_duration_seconds_bucket{policy="AgePolicy",version="default",le="0.1"} 0' in text
+    assert 'riskprofiler_policy_duration_seconds_bucket{policy="AgePolicy",version="default",le="1.0"} 1' in text
+    assert 'riskprofiler_policy_duration_seconds_bucket{policy="AgePolicy",version="default",le="+Inf"} 1' in text
+    assert 'riskprofiler_policy_duration_seconds_sum{policy="AgePolicy",version="default"} 0.5' in text
+    assert 'riskprofiler_policy_duration_seconds_count{policy="AgePolicy",version="default"} 1' in text
+    assert 'riskprofiler_requests_total{endpoint="api.get_risk_profile",method="POST",status="201"} 1' in text
+    assert 'riskprofiler_errors_total{type="KeyError"} 1' in text
+
+def test_stage_timer():
+    metrics = Metrics()
+    with metrics.stage('parse'):
+        pass
+    assert 'riskprofiler_stage_duration_seconds_count{stage="parse"} 1' in metrics.render()
+
+@pytest.mark.parametrize('compiled', [True, False])
+def test_calculator_policy_timer(user_data_json, compiled):
+    user_data = UserDataDeserializer().load(user_data_json)
+    timed = []
+    kwargs = {} if compiled else {'risk_scoring': RiskScoring()}
+    calculator = RiskProfileCalculator(user_data=user_data, policy_timer=lambda p, s: timed.append((p, s)), **kwargs)
+    assert (calculator.plan is not None) == compiled
+    assert calculator.calculate() == RiskProfileCalculator(user_data=user_data).calculate()
+    if compiled:
+        # Life and disability are looked up in a table (see `lookup_table.py`),
+        # only the policies changing home and auto run.
+        plan = calculator.plan
+        assert [p for p, _ in timed] == list(plan.table_rest.policies) + [plan.table]
+        assert 'DependentsPolicy' not in [type(p).__name__ for p in plan.table_rest.policies]
+    else:
+        assert [p for p, _ in timed] == CURRENT_RISK_POLICIES
+    assert all(s >= 0 for _, s in timed)
+
+def test_metrics_endpoint(client, user_data_json):
+    client.post('/risk_profile', json=user_data_json)
+    client.post('/risk_profile', json={**user_data_json, 'age': '35'})
+    client.post('/risk_profile', data='{', content_type='application/json')
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert resp.content_type.startswith('text/plain; version=0.0.4')
+    text = resp.get_data(as_text=True)
+    for stage, count in (('parse', 3), ('deserialize', 2), ('calculate', 1), ('serialize', 1)):
+        assert 'riskprofiler_stage_duration_seconds_count{{stage="{}"}} {}'.format(stage, count) in text
+    assert 'riskprofiler_policy_duration_seconds_count{policy="InitialRiskPolicy",version="default"} 1' in text
+    assert 'riskprofiler_requests_total{endpoint="api.get_risk_profile",method="POST",status="201"} 1' in text
+    assert 'riskprofiler_requests_total{endpoint="api.get_risk_profile",method="POST",status="422"} 1' in text
+    assert 'riskprofiler_requests_total{endpoint="api.get_risk_profile",method="POST",status="400"} 1' in text
+    assert 'riskprofiler_errors_total{type="WrongKeyTypeDeserializationError"} 1' in text
+    assert 'riskprofiler_errors_total{type="BadRequest"} 1' in text
+    assert 'riskprofiler_request_duration_seconds_count{endpoint="api.get_risk_profile"} 3' in text
+
+def test_metrics_disabled(user_data_json):
+    app = create_app({'TESTING': True, 'METRICS_ENABLED': False})
+    client = app.test_client()
+    assert client.post('/risk_profile', json=user_data_json).status_code == 201
+    assert client.get('/metrics').status_code == 404
+    with app.app_context():
+        from riskprofiler.metrics import get_metrics
+        assert get_metrics() is NULL_METRICS
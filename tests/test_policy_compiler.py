@@ -0,0 +1,89 @@
+import pytest
+import datetime
+import itertools
+from unittest.mock import Mock
+from riskprofiler.risk_policies import BaseRiskPolicy, AgePolicy, LargeIncomePolicy, RecentVehiclePolicy
+from riskprofiler.risk_scoring import RiskScoring
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES, RiskProfileCalculator, RiskScoreValueMapping
+from riskprofiler.policy_compiler import compile_policies, CompiledPolicyPlan
+
+def test_compile_current_policies():
+    plan = compile_policies(CURRENT_RISK_POLICIES)
+    assert isinstance(plan, CompiledPolicyPlan)
+    assert len(plan.steps) == len(CURRENT_RISK_POLICIES)
+    assert compile_policies(list(CURRENT_RISK_POLICIES)) is plan
+
+def test_compile_unknown_policies():
+    class CustomAgePolicy(AgePolicy):
+        pass
+    assert compile_policies([Mock(spec=BaseRiskPolicy)]) is None
+    assert compile_policies(CURRENT_RISK_POLICIES + [CustomAgePolicy()]) is None
+
+def test_compiled_plan_matches_interpreted_policies(make_random_user_datas):
+    policies = [
+        RecentVehiclePolicy(curr_date=datetime.date(2018, 7, 1)) if isinstance(p, RecentVehiclePolicy) else p
+        for p in CURRENT_RISK_POLICIES
+    ]
+    mapping = RiskScoreValueMapping()
+    plan = compile_policies(policies)
+    for user_data in make_random_user_datas(2000):
+        expected = RiskProfileCalculator(user_data=user_data, risk_policies=policies, risk_scoring=RiskScoring()).calculate()
+        actual = plan.evaluate(user_data, mapping)
+        assert actual == expected
+        assert list(actual) == list(expected)
+
+def test_compiled_plan_reads_policy_parameters(make_random_user_datas):
+    policy = LargeIncomePolicy(large_income_thresh=10)
+    plan = compile_policies([policy])
+    slots = [0, 0, None, None]
+    user_data = make_random_user_datas(1)[0]
+    user_data.income = 11
+    plan.steps[0](user_data, slots)
+    assert slots == [-1, -1, None, None]
+    policy.large_income_thresh = 11
+    slots = [0, 0, None, None]
+    plan.steps[0](user_data, slots)
+    assert slots == [0, 0, None, None]
+
+def test_calculator_uses_compiled_plan(user_data_json):
+    from riskprofiler.serialization import UserDataDeserializer
+    user_data = UserDataDeserializer().load(user_data_json)
+    assert RiskProfileCalculator(user_data=user_data).plan is not None
+    assert RiskProfileCalculator(user_data=user_data, risk_scoring=RiskScoring()).plan is None
+    assert RiskProfileCalculator(user_data=user_data, risk_policies=[Mock(spec=BaseRiskPolicy)]).plan is None
+
+LINE_SUBSETS = [
+    frozenset(lines) for size in range(1, 4)
+    for lines in itertools.combinations(Loi.all_lines(), size)
+]
+
+@pytest.mark.parametrize('lines', LINE_SUBSETS, ids=lambda lines: ','.join(sorted(loi.value for loi in lines)))
+@pytest.mark.parametrize('compiled', (True, False))
+def test_line_targeted_evaluation_matches_full_evaluation(make_random_user_datas, lines, compiled):
+    for user_data in make_random_user_datas(300):
+        full = RiskProfileCalculator(user_data=user_data).calculate()
+        kwargs = {} if compiled else {'risk_scoring': RiskScoring()}
+        calculator = RiskProfileCalculator(user_data=user_data, lines=lines, **kwargs)
+        assert (calculator.plan is not None) == compiled
+        targeted = calculator.calculate()
+        assert targeted == {loi: val for loi, val in full.items() if loi in lines}
+
+def test_line_targeted_plan_prunes_policies():
+    plan = compile_policies(CURRENT_RISK_POLICIES, lines=[Loi.auto])
+    assert [type(p).__name__ for p in plan.policies] == [
+        'InitialRiskPolicy', 'NoVehiclePolicy', 'AgePolicy', 'LargeIncomePolicy',
+        'RecentVehiclePolicy', 'SingleVehiclePolicy'
+    ]
+    assert compile_policies(CURRENT_RISK_POLICIES, lines=Loi.all_lines()) is compile_policies(CURRENT_RISK_POLICIES)
+
+@pytest.mark.parametrize('compiled', (True, False))
+def test_line_targeted_evaluation_skips_missing_lines(user_data_json, compiled):
+    user_data = UserDataDeserializer().load({**user_data_json, 'vehicles': []})
+    applied = []
+    kwargs = {} if compiled else {'risk_scoring': RiskScoring()}
+    calculator = RiskProfileCalculator(user_data=user_data, lines=[Loi.auto], policy_timer=lambda p, s: applied.append(type(p).__name__), **kwargs)
+    assert calculator.calculate() == {}
+    # Once NoVehiclePolicy disabled auto, nothing else runs.
+    assert applied == ['InitialRiskPolicy', 'NoVehiclePolicy']
@@ -0,0 +1,132 @@
+import datetime
+import itertools
+import math
+import operator
+import os
+import pytest
+from riskprofiler.errors import PolicyDefinitionError
+from riskprofiler.incremental import IncrementalScorer
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.policy_compiler import compile_policies
+from riskprofiler.policy_rules import RulePolicy, load_policies, parse_policies, policies_from_definition
+from riskprofiler.risk_policies import RecentVehiclePolicy
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES, RiskAversion, RiskProfileCalculator
+from riskprofiler.risk_scoring import RiskScoring
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.synthetic import SyntheticUserDataGenerator
+from riskprofiler.user_data import years_since_year
+
+POLICY_FILE = os.path.join(os.path.dirname(__file__), '..', 'riskprofiler', 'policies.json')
+CURR_DATE = datetime.date(2018, 7, 1)
+OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '==': operator.eq, '!=': operator.ne}
+
+@pytest.fixture
+def builtin_policies():
+    return [RecentVehiclePolicy(curr_date=CURR_DATE) if isinstance(p, RecentVehiclePolicy) else p for p in CURRENT_RISK_POLICIES]
+
+@pytest.fixture
+def rule_policies():
+    return load_policies(POLICY_FILE, curr_date=CURR_DATE)
+
+def test_policy_file_declares_the_same_dependencies(builtin_policies, rule_policies):
+    assert len(rule_policies) == len(builtin_policies)
+    for rule_policy, policy in zip(rule_policies, builtin_policies):
+        assert rule_policy.reads == policy.reads
+        assert rule_policy.writes == policy.writes
+        assert rule_policy.creates == policy.creates
+        assert rule_policy.item_wise == policy.item_wise
+
+@pytest.mark.parametrize('lines', [None] + [
+    frozenset(lines) for size in (1, 2) for lines in itertools.combinations(Loi.all_lines(), size)
+])
+def test_policy_file_matches_builtin_policies(make_random_user_datas, builtin_policies, rule_policies, lines):
+    assert compile_policies(rule_policies, lines) is not None
+    for user_data in make_random_user_datas(500):
+        expected = RiskProfileCalculator(user_data=user_data, risk_policies=builtin_policies, lines=lines).calculate()
+        compiled = RiskProfileCalculator(user_data=user_data, risk_policies=rule_policies, lines=lines).calculate()
+        interpreted = RiskProfileCalculator(user_data=user_data, risk_policies=rule_policies, lines=lines, risk_scoring=RiskScoring()).calculate()
+        assert compiled == expected
+        assert interpreted == expected
+        assert list(compiled) == list(expected)
+
+def test_incremental_scoring_with_rule_policies(builtin_policies, rule_policies):
+    generator = SyntheticUserDataGenerator(seed=3)
+    scorer = IncrementalScorer(rule_policies)
+    patch = {'income': 250000, 'vehicles': [{'key': 1000, 'make': 'Maker', 'model': 'Model', 'year': 2017}]}
+    for _ in range(50):
+        _, state = scorer.score(generator.payload('typical'))
+        risk_profile, state = scorer.rescore(state, patch)
+        user_data = UserDataDeserializer().load(state.user_data_obj)
+        assert risk_profile == RiskProfileCalculator(user_data=user_data, risk_policies=builtin_policies).calculate()
+
+@pytest.mark.parametrize('compiled', (True, False))
+def test_rule_policy_on_items(user_data_json, compiled):
+    policy = RulePolicy('old_vehicles', [{
+        'if': {'age': {'>=': 18}},
+        'for_each': 'vehicles',
+        'where': {'make': {'==': 'Maker'}, 'years_since_production': {'>': 5}},
+        'then': [{'add': -3}]
+    }], curr_date=CURR_DATE)
+    assert policy.reads == {'age', 'vehicles'}
+    assert policy.writes == {Loi.auto}
+    assert policy.item_wise == 'vehicles'
+    user_data = UserDataDeserializer().load(user_data_json)
+    kwargs = {} if compiled else {'risk_scoring': RiskScoring()}
+    calculator = RiskProfileCalculator(user_data=user_data, risk_policies=[CURRENT_RISK_POLICIES[0], policy], lines=[Loi.auto], **kwargs)
+    assert (calculator.plan is not None) == compiled
+    assert calculator.calculate() == {Loi.auto: {0: RiskAversion.adventurous, 1: RiskAversion.average}}
+    # The date is read from the policy when it's applied.
+    policy.curr_date = datetime.date(2030, 1, 1)
+    calculator = RiskProfileCalculator(user_data=user_data, risk_policies=[CURRENT_RISK_POLICIES[0], policy], lines=[Loi.auto], **kwargs)
+    assert calculator.calculate() == {Loi.auto: {0: RiskAversion.adventurous, 1: RiskAversion.adventurous}}
+
+@pytest.mark.parametrize('compiled', (True, False))
+@pytest.mark.parametrize('operator', ('<', '<=', '>', '>=', '==', '!='))
+def test_rule_policy_on_out_of_range_years(user_data_json, operator, compiled):
+    policy = RulePolicy('recent_vehicles', [{
+        'for_each': 'vehicles',
+        'where': {'years_since_production': {operator: 5}},
+        'then': [{'add': -3}]
+    }], curr_date=CURR_DATE)
+    # Years `datetime.date` doesn't accept count as very old or in the future.
+    ages = {0: math.inf, -1: math.inf, 10000: -math.inf, 2 ** 40: -math.inf}
+    ages.update((year, years_since_year(year, CURR_DATE)) for year in (2012, 2013, 2014))
+    user_data_json['vehicles'] = [{'key': year, 'make': 'Maker', 'model': 'Model', 'year': year} for year in ages]
+    user_data = UserDataDeserializer().load(user_data_json)
+    kwargs = {} if compiled else {'risk_scoring': RiskScoring()}
+    base = RiskProfileCalculator(user_data=user_data, risk_policies=[CURRENT_RISK_POLICIES[0]], lines=[Loi.auto], **kwargs).calculate()
+    calculator = RiskProfileCalculator(user_data=user_data, risk_policies=[CURRENT_RISK_POLICIES[0], policy], lines=[Loi.auto], **kwargs)
+    test = OPERATORS[operator]
+    assert calculator.calculate() == {Loi.auto: {
+        year: RiskAversion.adventurous if test(ages[year], 5) else base[Loi.auto][year] for year in ages
+    }}
+
+@pytest.mark.parametrize('definition, where', [
+    ({}, 'policies'),
+    ({'policies': [{'name': 'a'}]}, 'policies[0]'),
+    ({'policies': [{'name': 'a', 'rules': [], 'when': 1}]}, 'policies[0].when'),
+    ({'policies': [{'name': 'a', 'rules': []}, {'name': 'a', 'rules': []}]}, 'policies[1].name'),
+    ({'policies': [{'name': 'a', 'rules': {}}]}, 'a.rules'),
+    ({'policies': [{'name': 'a', 'rules': [{'then': []}]}]}, 'a.rules[0].then'),
+    ({'policies': [{'name': 'a', 'rules': [{'if': {'height': {'>': 1}}, 'then': [{'add': 1}]}]}]}, 'a.rules[0].if.height'),
+    ({'policies': [{'name': 'a', 'rules': [{'if': {'age': {'=<': 1}}, 'then': [{'add': 1}]}]}]}, 'a.rules[0].if.age.=<'),
+    ({'policies': [{'name': 'a', 'rules': [{'if': {'age': {'<': '30'}}, 'then': [{'add': 1}]}]}]}, 'a.rules[0].if.age.<'),
+    ({'policies': [{'name': 'a', 'rules': [{'if': {'age': {'<': True}}, 'then': [{'add': 1}]}]}]}, 'a.rules[0].if.age.<'),
+    ({'policies': [{'name': 'a', 'rules': [{'if': {'gender': {'<': 'male'}}, 'then': [{'add': 1}]}]}]}, 'a.rules[0].if.gender.<'),
+    ({'policies': [{'name': 'a', 'rules': [{'if': {'gender': {'==': 'other'}}, 'then': [{'add': 1}]}]}]}, 'a.rules[0].if.gender.=='),
+    ({'policies': [{'name': 'a', 'rules': [{'then': [{'add': 1.5}]}]}]}, 'a.rules[0].then[0].add'),
+    ({'policies': [{'name': 'a', 'rules': [{'then': [{'add': 1, 'lines': ['pet']}]}]}]}, 'a.rules[0].then[0].lines'),
+    ({'policies': [{'name': 'a', 'rules': [{'then': [{'remove': ['life']}]}]}]}, 'a.rules[0].then[0]'),
+    ({'policies': [{'name': 'a', 'rules': [{'where': {}, 'then': [{'add': 1}]}]}]}, 'a.rules[0].where'),
+    ({'policies': [{'name': 'a', 'rules': [{'for_each': 'pets', 'then': [{'add': 1}]}]}]}, 'a.rules[0].for_each'),
+    ({'policies': [{'name': 'a', 'rules': [{'for_each': 'houses', 'then': [{'disable': ['home']}]}]}]}, 'a.rules[0].then[0]'),
+    ({'policies': [{'name': 'a', 'rules': [{'for_each': 'houses', 'where': {'make': {'==': 'x'}}, 'then': [{'add': 1}]}]}]}, 'a.rules[0].where.make'),
+])
+def test_invalid_definitions(definition, where):
+    with pytest.raises(PolicyDefinitionError) as excinfo:
+        policies_from_definition(definition)
+    assert excinfo.value.where == where
+
+def test_malformed_json():
+    with pytest.raises(PolicyDefinitionError):
+        parse_policies(b'{"policies": [')
@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+import tempfile
+import pytest
+from http import HTTPStatus
+from riskprofiler import create_app
+from riskprofiler.errors import PolicyDefinitionError
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.metrics import Metrics
+from riskprofiler.policy_set import BUILTIN_POLICIES, PolicySet, get_active_policies
+
+POLICY_FILE = os.path.join(os.path.dirname(__file__), '..', 'riskprofiler', 'policies.json')
+
+def write_policies(path, large_income_thresh):
+    with open(POLICY_FILE) as f:
+        definition = json.load(f)
+    for policy in definition['policies']:
+        if policy['name'] == 'large_income':
+            policy['rules'][0]['if']['income']['>'] = large_income_thresh
+    # Written aside and renamed, so readers never see a partial file.
+    tmp_path = str(path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(definition, f)
+    os.replace(tmp_path, str(path))
+
+def large_income_thresh(active):
+    policy = next(p for p in active.policies if p.name == 'large_income')
+    return policy.rules[0]['if']['income']['>']
+
+def test_builtin_policies():
+    policy_set = PolicySet()
+    assert policy_set.active is BUILTIN_POLICIES
+    assert not policy_set.reload()
+
+def test_reload(tmp_path):
+    path = tmp_path / 'policies.json'
+    write_policies(path, 200000)
+    metrics = Metrics()
+    policy_set = PolicySet(str(path), metrics=metrics)
+    first = policy_set.active
+    assert large_income_thresh(first) == 200000
+    assert not policy_set.reload()
+
+    write_policies(path, 100000)
+    assert policy_set.reload()
+    assert large_income_thresh(policy_set.active) == 100000
+    assert policy_set.active.version != first.version
+    assert policy_set.active.incremental_scorer.signature != first.incremental_scorer.signature
+
+    # Invalid files are reported, and the current policies kept.
+    path.write_text('{"policies": [{"name": "broken"}]}')
+    assert not policy_set.reload()
+    assert large_income_thresh(policy_set.active) == 100000
+    assert 'riskprofiler_policy_reloads_total{result="ok"} 1' in metrics.render()
+    assert 'riskprofiler_policy_reloads_total{result="error"} 1' in metrics.render()
+
+def test_invalid_file_at_startup(tmp_path):
+    path = tmp_path / 'policies.json'
+    path.write_text('[]')
+    with pytest.raises(PolicyDefinitionError):
+        PolicySet(str(path))
+
+def test_reload_interval(tmp_path):
+    path = tmp_path / 'policies.json'
+    write_policies(path, 200000)
+    now = [0.0]
+    policy_set = PolicySet(str(path), reload_interval=1.0, clock=lambda: now[0])
+    policy_set.reload_if_due()
+    write_policies(path, 100000)
+    now[0] = 0.5
+    policy_set.reload_if_due()
+    assert large_income_thresh(policy_set.active) == 200000
+    now[0] = 1.0
+    policy_set.reload_if_due()
+    assert large_income_thresh(policy_set.active) == 100000
+
+@pytest.fixture
+def policy_app(tmp_path):
+    path = tmp_path / 'policies.json'
+    write_policies(path, 200000)
+    db_fd, db_path = tempfile.mkstemp()
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': db_path,
+        'POLICY_FILE': str(path),
+        'POLICY_RELOAD_INTERVAL': 0.001
+    })
+    yield app, path
+    app.extensions['write_behind'].close()
+    app.extensions['profile_store'].close()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+def test_requests_use_reloaded_policies(policy_app, user_data_json):
+    app, path = policy_app
+    client = app.test_client()
+    user_data_json = {**user_data_json, 'dependents': 0, 'income': 150000}
+    assert client.post('/risk_profile', json=user_data_json).get_json()['life'] == 'average'
+    response = client.post('/risk_profile?user_id=u1', json=user_data_json)
+    assert response.get_json()['life'] == 'average'
+
+    write_policies(path, 100000)
+    app.extensions['policy_set']._next_check = 0
+    response = client.post('/risk_profile', json=user_data_json)
+    assert response.get_json()['life'] == 'adventurous'
+    # The cached profile, computed with the old policies, wasn't used.
+    assert client.get('/profile_cache/stats').get_json()['invalidations'] == 1
+    # The stored state was recorded with the old policies too.
+    response = client.patch('/risk_profile?user_id=u1', json={'gender': 'male'})
+    assert response.get_json()['life'] == 'adventurous'
+
+def test_requests_keep_their_policies(policy_app):
+    app, path = policy_app
+    with app.test_request_context('/risk_profile'):
+        active = get_active_policies()
+        write_policies(path, 100000)
+        assert app.extensions['policy_set'].reload()
+        assert get_active_policies() is active
+    with app.test_request_context('/risk_profile'):
+        assert get_active_policies() is app.extensions['policy_set'].active
+        assert get_active_policies() is not active
+
+@pytest.fixture
+def versions_app(tmp_path):
+    write_policies(tmp_path / 'strict.json', 100000)
+    db_fd, db_path = tempfile.mkstemp()
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': db_path,
+        'POLICY_VERSIONS': {'strict': str(tmp_path / 'strict.json'), 'builtin': None}
+    })
+    yield app
+    app.extensions['write_behind'].close()
+    app.extensions['profile_store'].close()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+def test_requests_select_policy_versions(versions_app, user_data_json):
+    client = versions_app.test_client()
+    user_data_json = {**user_data_json, 'dependents': 0, 'income': 150000}
+    assert client.post('/risk_profile', json=user_data_json).get_json()['life'] == 'average'
+    resp = client.post('/risk_profile', json=user_data_json, headers={'X-Policy-Version': 'strict'})
+    assert resp.get_json()['life'] == 'adventurous'
+    assert client.post('/risk_profile?policy_version=strict', json=user_data_json).get_json()['life'] == 'adventurous'
+    assert client.post('/risk_profile?policy_version=builtin', json=user_data_json).get_json()['life'] == 'average'
+    assert client.post('/risk_profile?policy_version=nope', json=user_data_json).status_code == HTTPStatus.BAD_REQUEST
+    # Each version keeps its own cached profiles.
+    stats = client.get('/profile_cache/stats').get_json()
+    assert stats['size'] == 3
+    assert stats['hits'] == 1
+    assert stats['invalidations'] == 0
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'riskprofiler_policy_version_requests_total{version="strict"} 2' in metrics
+    assert 'riskprofiler_policy_version_requests_total{version="default"} 1' in metrics
+    assert 'riskprofiler_policy_duration_seconds_count{policy="large_income",version="strict"} 1' in metrics
+    assert 'riskprofiler_policy_duration_seconds_count{policy="LargeIncomePolicy",version="default"} 1' in metrics
+
+def test_policy_versions_are_compiled_once(versions_app):
+    active = versions_app.extensions['policy_sets']['strict'].active
+    assert active.name == 'strict'
+    assert active.plan_for() is not None
+    lines = frozenset([Loi.auto])
+    assert active.plan_for(lines) is active.plan_for(lines)
+    with versions_app.test_request_context('/risk_profile', headers={'X-Policy-Version': 'strict'}):
+        assert get_active_policies() is active
+    with versions_app.test_request_context('/risk_profile'):
+        assert get_active_policies() is BUILTIN_POLICIES
+
+def test_default_version_set_twice(tmp_path):
+    write_policies(tmp_path / 'policies.json', 100000)
+    with pytest.raises(ValueError):
+        create_app({'TESTING': True, 'POLICY_FILE': str(tmp_path / 'policies.json'), 'POLICY_VERSIONS': {'default': None}})
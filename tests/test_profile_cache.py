@@ -0,0 +1,89 @@
+import pytest
+import datetime
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.risk_policies import AgePolicy
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES, RiskProfileCalculator
+from riskprofiler.profile_cache import ProfileCache, user_data_fingerprint
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.date = datetime.date(2018, 1, 1)
+
+    def __call__(self):
+        return self.now
+
+    def today(self):
+        return self.date
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def cache(clock):
+    return ProfileCache(maxsize=2, ttl=10, clock=clock, today=clock.today)
+
+def load(user_data_json, **overrides):
+    return UserDataDeserializer().load({**user_data_json, **overrides})
+
+def test_fingerprint_ignores_item_order(user_data_json):
+    user_data = load(user_data_json)
+    reordered = load(user_data_json, houses=user_data_json['houses'][::-1], vehicles=user_data_json['vehicles'][::-1])
+    assert user_data_fingerprint(user_data) == user_data_fingerprint(reordered)
+    assert user_data_fingerprint(user_data) != user_data_fingerprint(load(user_data_json, income=1))
+
+def test_cache_hit_and_miss(cache, user_data_json):
+    user_data = load(user_data_json)
+    expected = RiskProfileCalculator(user_data=user_data).calculate()
+    assert cache.get_or_calculate(user_data, CURRENT_RISK_POLICIES) == expected
+    assert cache.get_or_calculate(load(user_data_json), CURRENT_RISK_POLICIES) == expected
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['size'] == 1
+
+def test_cache_hit_keeps_item_order(cache, user_data_json):
+    cache.get_or_calculate(load(user_data_json), CURRENT_RISK_POLICIES)
+    reordered = load(user_data_json, vehicles=user_data_json['vehicles'][::-1])
+    risk_profile = cache.get_or_calculate(reordered, CURRENT_RISK_POLICIES)
+    assert cache.hits == 1
+    assert list(risk_profile[Loi.auto]) == [1, 0]
+    assert risk_profile == RiskProfileCalculator(user_data=reordered).calculate()
+
+def test_cache_expiration(cache, clock, user_data_json):
+    cache.get_or_calculate(load(user_data_json), CURRENT_RISK_POLICIES)
+    clock.now = 10
+    cache.get_or_calculate(load(user_data_json), CURRENT_RISK_POLICIES)
+    assert cache.expirations == 1
+    assert cache.misses == 2
+
+def test_cache_eviction(cache, user_data_json):
+    for age in (20, 30, 40):
+        cache.get_or_calculate(load(user_data_json, age=age), CURRENT_RISK_POLICIES)
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert cache.get(load(user_data_json, age=20), CURRENT_RISK_POLICIES) is None
+    assert cache.get(load(user_data_json, age=40), CURRENT_RISK_POLICIES) is not None
+
+def test_cache_invalidation(cache, clock, user_data_json):
+    user_data = load(user_data_json)
+    cache.get_or_calculate(user_data, CURRENT_RISK_POLICIES)
+    clock.date = datetime.date(2018, 1, 2)
+    assert cache.get(user_data, CURRENT_RISK_POLICIES) is None
+    assert cache.invalidations == 1
+    cache.get_or_calculate(user_data, CURRENT_RISK_POLICIES)
+    assert cache.get(user_data, [AgePolicy()]) is None
+    assert cache.invalidations == 2
+
+def test_cache_namespaces(cache, user_data_json):
+    user_data = load(user_data_json)
+    risk_profile = RiskProfileCalculator(user_data=user_data).calculate()
+    cache.put(user_data, CURRENT_RISK_POLICIES, risk_profile, namespace='a')
+    assert cache.get(user_data, [AgePolicy()], namespace='b') is None
+    # Other policies in another namespace don't invalidate the entry.
+    assert cache.get(user_data, CURRENT_RISK_POLICIES, namespace='a') == risk_profile
+    assert cache.invalidations == 0
+    assert cache.get(user_data, [AgePolicy()], namespace='a') is None
+    assert cache.invalidations == 1
@@ -0,0 +1,36 @@
+import pytest
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.risk_profile_calculator import RiskAversion
+from riskprofiler.profile_codec import encode_profile, decode_profile
+
+@pytest.mark.parametrize('risk_profile', (
+    {},
+    {Loi.life: RiskAversion.average, Loi.disability: RiskAversion.conservative},
+    {
+        Loi.life: RiskAversion.adventurous,
+        Loi.home: {0: RiskAversion.average, 1: RiskAversion.conservative},
+        Loi.auto: {-1: RiskAversion.adventurous, 2 ** 70: RiskAversion.average, 127: RiskAversion.average, 128: RiskAversion.conservative}
+    },
+    {Loi.home: {}, Loi.auto: {}}
+))
+def test_round_trip(risk_profile):
+    data = encode_profile(risk_profile)
+    decoded = decode_profile(data)
+    assert decoded == risk_profile
+    for loi, val in risk_profile.items():
+        if isinstance(val, dict):
+            assert list(decoded[loi]) == list(val)
+
+def test_encoding_is_compact():
+    risk_profile = {
+        Loi.life: RiskAversion.average,
+        Loi.disability: RiskAversion.average,
+        Loi.home: {0: RiskAversion.average},
+        Loi.auto: {0: RiskAversion.conservative, 1: RiskAversion.average}
+    }
+    assert len(encode_profile(risk_profile)) == 13
+
+@pytest.mark.parametrize('data', (b'', b'\x02\x00\x00\x00\x00', b'\x01\x00', b'\x01\x00\x00\xff\x02\x00\x01', b'\x01\x09\x00\x00\x00'))
+def test_decode_invalid(data):
+    with pytest.raises(ValueError):
+        decode_profile(data)
@@ -0,0 +1,44 @@
+import pytest
+import json
+from flask import jsonify
+from http import HTTPStatus
+from riskprofiler import create_app
+from riskprofiler.serialization import UserDataDeserializer, RiskProfileSerializer
+from riskprofiler.risk_profile_calculator import RiskProfileCalculator
+from riskprofiler.response_encoding import RISK_PROFILE_ENCODER
+
+def test_encoder_matches_jsonify(app, make_random_user_datas):
+    serializer = RiskProfileSerializer()
+    with app.app_context():
+        for user_data in make_random_user_datas(500):
+            risk_profile = RiskProfileCalculator(user_data=user_data).calculate()
+            expected = jsonify(serializer.to_dict(risk_profile)).get_data()
+            assert RISK_PROFILE_ENCODER.encode(risk_profile) == expected
+
+def test_encoder_empty_profile(app):
+    with app.app_context():
+        assert RISK_PROFILE_ENCODER.encode({}) == jsonify({}).get_data()
+
+def test_risk_profile_post_response_bytes(app, client, user_data_json):
+    resp = client.post('/risk_profile', json=user_data_json)
+    assert resp.status_code == HTTPStatus.CREATED
+    assert resp.mimetype == 'application/json'
+    risk_profile = RiskProfileCalculator(user_data=UserDataDeserializer().load(user_data_json)).calculate()
+    with app.app_context():
+        assert resp.get_data() == jsonify(RiskProfileSerializer().to_dict(risk_profile)).get_data()
+
+def test_custom_json_codec(user_data_json):
+    class CountingCodec:
+        calls = 0
+        def loads(self, data):
+            CountingCodec.calls += 1
+            return json.loads(data)
+    app = create_app({'TESTING': True, 'JSON_CODEC': CountingCodec()})
+    resp = app.test_client().post('/risk_profile', json=user_data_json)
+    assert resp.status_code == HTTPStatus.CREATED
+    assert CountingCodec.calls == 1
+
+def test_risk_profile_post_invalid_body(client):
+    assert client.post('/risk_profile', data='{', content_type='application/json').status_code == HTTPStatus.BAD_REQUEST
+    assert client.post('/risk_profile', data='null', content_type='application/json').status_code == HTTPStatus.BAD_REQUEST
+    assert client.post('/risk_profile', data='{}', content_type='text/plain').status_code == HTTPStatus.UNSUPPORTED_MEDIA_TYPE
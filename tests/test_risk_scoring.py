@@ -4,13 +4,14 @@ from riskprofiler.risk_profile_calculator import RiskAversion, RiskScoreValueMap
 from riskprofiler.errors import InvalidRiskScoreOperation
 from riskprofiler.user_data import UserData
 from riskprofiler.risk_policies import BaseRiskPolicy
+from riskprofiler.line_of_insurance import Loi
 from unittest.mock import Mock
 
 @pytest.fixture
 def scoring():
     return RiskScoring({
-        'single': _SingleItemRiskScore(0),
-        'multiple': _MultipleItemRiskScore({
+        Loi.life: _SingleItemRiskScore(0),
+        Loi.home: _MultipleItemRiskScore({
             'key0': 1,
             'key1': 2,
             'key2': 3
@@ -18,56 +19,87 @@ def scoring():
     })
 
 def test_risk_scoring_create_single(scoring):
-    scoring.create(loi='foo', score=123)
-    assert isinstance(scoring['foo'], _SingleItemRiskScore)
-    assert scoring['foo'].value == 123
+    scoring.create(loi=Loi.disability, score=123)
+    assert isinstance(scoring[Loi.disability], _SingleItemRiskScore)
+    assert scoring[Loi.disability].value == 123
 
 def test_risk_scoring_create_multiple(scoring):
-    scoring.create(loi='foo', multiple_items=True)
-    assert isinstance(scoring['foo'], _MultipleItemRiskScore)
+    scoring.create(loi=Loi.auto, multiple_items=True)
+    assert isinstance(scoring[Loi.auto], _MultipleItemRiskScore)
 
 def test_risk_scoring_create_item(scoring):
-    scoring.create_item(loi='multiple', item='key3', score=3)
-    assert scoring['multiple']['key3'] == 3
+    scoring.create_item(loi=Loi.home, item='key3', score=3)
+    assert scoring[Loi.home]['key3'] == 3
 
 def test_risk_scoring_add_single(scoring):
-    scoring.add(loi='single', points=5)
-    assert scoring['single'].value == 5
+    scoring.add(loi=Loi.life, points=5)
+    assert scoring[Loi.life].value == 5
 
 def test_risk_scoring_add_multiple(scoring):
-    scoring.add(loi='multiple', points=3, item='key1')
-    assert scoring['multiple']['key1'] == 5
+    scoring.add(loi=Loi.home, points=3, item='key1')
+    assert scoring[Loi.home]['key1'] == 5
 
 def test_risk_scoring_subtract_single(scoring):
-    scoring.subtract(loi='single', points=5)
-    assert scoring['single'].value == -5
+    scoring.subtract(loi=Loi.life, points=5)
+    assert scoring[Loi.life].value == -5
 
 def test_risk_scoring_subtract_multiple(scoring):
-    scoring.subtract(loi='multiple', points=5)
-    assert scoring['multiple']['key0'] == -4
-    assert scoring['multiple']['key1'] == -3
-    assert scoring['multiple']['key2'] == -2
+    scoring.subtract(loi=Loi.home, points=5)
+    assert scoring[Loi.home]['key0'] == -4
+    assert scoring[Loi.home]['key1'] == -3
+    assert scoring[Loi.home]['key2'] == -2
+
+def test_multiple_item_score_views_after_subtract(scoring):
+    scoring.subtract(loi=Loi.home, points=2)
+    home = scoring[Loi.home]
+    assert home.get('key0') == -1
+    assert home.get('missing') is None
+    assert list(home.items()) == [('key0', -1), ('key1', 0), ('key2', 1)]
+    assert list(home.values()) == [-1, 0, 1]
+    assert dict(home) == {'key0': -1, 'key1': 0, 'key2': 1}
+    assert home == {'key0': -1, 'key1': 0, 'key2': 1}
+    assert 'key0' in home and len(home) == 3
+    with pytest.raises(TypeError):
+        home['key0'] = 5
+
+def test_risk_scoring_add_to_all_items_then_create_item(scoring):
+    scoring.add(loi=Loi.home, points=2)
+    scoring.create_item(loi=Loi.home, item='key3', score=1)
+    scoring.subtract(loi=Loi.home, points=1, item='key0')
+    scoring.subtract(loi=Loi.home, points=3)
+    assert [scoring[Loi.home][key] for key in ('key0', 'key1', 'key2', 'key3')] == [-1, 1, 2, -2]
+    mapping = Mock(map_score_value=lambda value: value * 10)
+    assert scoring.as_profile(mapping)[Loi.home] == {'key0': -10, 'key1': 10, 'key2': 20, 'key3': -20}
 
 def test_risk_scoring_disable(scoring):
-    scoring.disable(loi='multiple')
-    assert 'multiple' not in scoring
+    scoring.disable(loi=Loi.home)
+    assert Loi.home not in scoring
 
 def test_risk_scoring_invalid_operation(scoring):
     with pytest.raises(InvalidRiskScoreOperation):
-        scoring.create_item(loi='single', item='key0', score=42)
+        scoring.create_item(loi=Loi.life, item='key0', score=42)
     with pytest.raises(InvalidRiskScoreOperation):
-        scoring.add(loi='single', item='key0', points=7)
+        scoring.add(loi=Loi.life, item='key0', points=7)
     with pytest.raises(InvalidRiskScoreOperation):
-        scoring.subtract(loi='single', item='key0', points=7)
+        scoring.subtract(loi=Loi.life, item='key0', points=7)
+
+def test_risk_scoring_items_in_line_order(scoring):
+    scoring.create(loi=Loi.auto, multiple_items=True)
+    scoring.create(loi=Loi.disability, score=1)
+    assert [loi for loi, _ in scoring.items()] == [Loi.life, Loi.disability, Loi.home, Loi.auto]
+    scoring.disable(loi=Loi.disability)
+    assert len(scoring) == 3
+    with pytest.raises(KeyError):
+        scoring[Loi.disability]
 
 def test_scoring_map_to_profile(scoring):
     mapping = RiskScoreValueMapping()
     risk_profile = scoring.as_profile(mapping)
     assert isinstance(risk_profile, dict)
-    assert risk_profile['single'] == RiskAversion.adventurous
-    assert risk_profile['multiple']['key0'] == RiskAversion.average
-    assert risk_profile['multiple']['key1'] == RiskAversion.average
-    assert risk_profile['multiple']['key2'] == RiskAversion.conservative
+    assert risk_profile[Loi.life] == RiskAversion.adventurous
+    assert risk_profile[Loi.home]['key0'] == RiskAversion.average
+    assert risk_profile[Loi.home]['key1'] == RiskAversion.average
+    assert risk_profile[Loi.home]['key2'] == RiskAversion.conservative
 
 def test_risk_profile_calculator():
     user_data = Mock()
@@ -87,3 +119,8 @@ def test_risk_profile_calculator():
     policies[0].apply.assert_called_once_with(user_data, scoring)
     policies[1].apply.assert_called_once_with(user_data, scoring)
     scoring.as_profile.assert_called_once_with(mapping)
+
+def test_risk_scoring_disable_twice(scoring):
+    scoring.disable(loi=Loi.life)
+    scoring.disable(loi=Loi.life)
+    assert Loi.life not in scoring
@@ -1,6 +1,7 @@
 import pytest
 from riskprofiler.user_data import UserData, ItemData, ItemDataCollection, VehicleItemData, HouseItemData, Gender, MaritalStatus, HouseStatus
 from riskprofiler.serialization import UserDataDeserializer, HouseItemDataDeserializer, VehicleItemDataDeserializer
+from riskprofiler.errors import MissingKeyDeserializationError, WrongKeyTypeDeserializationError, InvalidValueDeserializationError, DeserializationErrors
 
 @pytest.fixture
 def user_data_obj():
@@ -63,3 +64,41 @@ def test_vehicle_item_data_deserialization():
     assert vehicle_item_data.make == 'Foo'
     assert vehicle_item_data.model == 'Bar'
     assert vehicle_item_data.year == 1987
+
+def test_user_data_deserialization_reports_first_error_in_key_order(user_data_obj):
+    del user_data_obj['vehicles']
+    user_data_obj['income'] = '1000'
+    user_data_obj['houses'][1]['status'] = 'rented'
+    with pytest.raises(WrongKeyTypeDeserializationError) as excinfo:
+        UserDataDeserializer().load(user_data_obj)
+    assert excinfo.value.key == 'income'
+
+@pytest.mark.parametrize(('key', 'value', 'error_type', 'path'), (
+    ('gender', 'other', InvalidValueDeserializationError, 'gender'),
+    ('marital_status', 'divorced', InvalidValueDeserializationError, 'marital_status'),
+    ('houses', [{'key': 0, 'zip_code': 1, 'status': 'rented'}], InvalidValueDeserializationError, 'houses[0].status'),
+    ('houses', [{'key': 0, 'zip_code': 1}], MissingKeyDeserializationError, 'houses[0].status'),
+    ('houses', [42], WrongKeyTypeDeserializationError, 'houses[0]'),
+    ('vehicles', [{'key': 0, 'make': 'M', 'model': 'M', 'year': 2000}, {'key': 0, 'make': 'M', 'model': 'M', 'year': 2001}], InvalidValueDeserializationError, 'vehicles[1].key'),
+    ('risk_questions', [0, 1.0, 0], WrongKeyTypeDeserializationError, 'risk_questions[1]')
+))
+def test_user_data_deserialization_invalid_values(user_data_obj, key, value, error_type, path):
+    user_data_obj[key] = value
+    with pytest.raises(error_type) as excinfo:
+        UserDataDeserializer().load(user_data_obj)
+    assert excinfo.value.key == path
+
+def test_user_data_deserialization_collects_all_errors(user_data_obj):
+    del user_data_obj['age']
+    user_data_obj['gender'] = 'other'
+    user_data_obj['houses'][0]['zip_code'] = '123'
+    user_data_obj['vehicles'][1]['year'] = None
+    with pytest.raises(DeserializationErrors) as excinfo:
+        UserDataDeserializer().load(user_data_obj, collect_errors=True)
+    assert [err.key for err in excinfo.value.errors] == ['age', 'gender', 'houses[0].zip_code', 'vehicles[1].year']
+
+def test_user_data_deserialization_many_items(user_data_obj):
+    user_data_obj['vehicles'] = [{'key': i, 'make': 'M', 'model': 'M', 'year': 2000 + i % 20} for i in range(5000)]
+    user_data = UserDataDeserializer().load(user_data_obj, collect_errors=True)
+    assert user_data.vehicles_count() == 5000
+    assert user_data.get_vehicle_at(4999).year == 2019
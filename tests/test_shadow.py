@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import threading
+import pytest
+from http import HTTPStatus
+from riskprofiler import create_app
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.metrics import Metrics
+from riskprofiler.policy_set import PolicySet
+from riskprofiler.risk_profile_calculator import RiskProfileCalculator
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.shadow import ShadowEvaluator
+
+POLICY_FILE = os.path.join(os.path.dirname(__file__), '..', 'riskprofiler', 'policies.json')
+
+def write_policies(path, large_income_thresh):
+    with open(POLICY_FILE) as f:
+        definition = json.load(f)
+    for policy in definition['policies']:
+        if policy['name'] == 'large_income':
+            policy['rules'][0]['if']['income']['>'] = large_income_thresh
+    with open(path, 'w') as f:
+        json.dump(definition, f)
+
+@pytest.fixture
+def candidate(tmp_path):
+    # Incomes above 100000 (rather than 200000) lower every score.
+    write_policies(tmp_path / 'candidate.json', 100000)
+    return PolicySet(str(tmp_path / 'candidate.json'), name='candidate')
+
+def score(user_data_json, **overrides):
+    user_data = UserDataDeserializer().load({**user_data_json, **overrides})
+    return user_data, RiskProfileCalculator(user_data=user_data).calculate()
+
+def test_shadow_diffs(candidate, user_data_json):
+    metrics = Metrics()
+    shadow_evaluator = ShadowEvaluator(candidate, sample_size=1, metrics=metrics)
+    for income in (50000, 150000, 250000, 160000):
+        assert shadow_evaluator.submit(*score(user_data_json, dependents=0, income=income))
+    shadow_evaluator.flush()
+    stats = shadow_evaluator.stats()
+    assert stats['candidate'] == 'candidate'
+    assert (stats['compared'], stats['changed'], stats['dropped'], stats['errors']) == (4, 2, 0, 0)
+    assert stats['diffs'] == {'life': 2, 'disability': 0, 'home': 2, 'auto': 0}
+    (sample,) = stats['samples']
+    assert sample['user_data']['income'] in (150000, 160000)
+    assert sample['changed'] == ['life', 'home']
+    assert sample['live'] != sample['candidate']
+    assert 'riskprofiler_shadow_profiles_total{result="changed"} 2' in metrics.render()
+    assert 'riskprofiler_shadow_diffs_total{line="life"} 2' in metrics.render()
+    shadow_evaluator.close()
+    assert not shadow_evaluator.submit(*score(user_data_json))
+
+def test_shadow_compares_requested_lines(candidate, user_data_json):
+    shadow_evaluator = ShadowEvaluator(candidate)
+    user_data = UserDataDeserializer().load({**user_data_json, 'dependents': 0, 'income': 150000})
+    lines = frozenset([Loi.auto, Loi.life])
+    shadow_evaluator.submit(user_data, RiskProfileCalculator(user_data=user_data, lines=lines).calculate(), lines)
+    shadow_evaluator.flush()
+    assert shadow_evaluator.stats()['diffs'] == {'life': 1, 'disability': 0, 'home': 0, 'auto': 0}
+
+class BlockingCandidate:
+    name = 'blocking'
+
+    def __init__(self, candidate):
+        self.candidate = candidate
+        self.release = threading.Event()
+
+    @property
+    def active(self):
+        self.release.wait()
+        return self.candidate.active
+
+def test_shadow_drops_work_when_full(candidate, user_data_json):
+    blocking = BlockingCandidate(candidate)
+    shadow_evaluator = ShadowEvaluator(blocking, queue_size=1)
+    job = score(user_data_json)
+    assert shadow_evaluator.submit(*job)
+    # The worker takes the first profile and blocks, one more is queued.
+    while shadow_evaluator._queue.qsize():
+        pass
+    assert shadow_evaluator.submit(*job)
+    assert not shadow_evaluator.submit(*job)
+    assert shadow_evaluator.dropped == 1
+    blocking.release.set()
+    shadow_evaluator.flush()
+    assert shadow_evaluator.compared == 2
+
+@pytest.fixture
+def shadow_app(tmp_path):
+    write_policies(tmp_path / 'candidate.json', 100000)
+    db_fd, db_path = tempfile.mkstemp()
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': db_path,
+        'POLICY_VERSIONS': {'candidate': str(tmp_path / 'candidate.json')},
+        'SHADOW_POLICY_VERSION': 'candidate'
+    })
+    yield app
+    app.extensions['shadow_evaluator'].close()
+    app.extensions['write_behind'].close()
+    app.extensions['profile_store'].close()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+def test_api_shadow(shadow_app, user_data_json):
+    client = shadow_app.test_client()
+    user_data_json = {**user_data_json, 'dependents': 0, 'income': 150000}
+    # The response is the one of the live policies.
+    assert client.post('/risk_profile', json=user_data_json).get_json()['life'] == 'average'
+    assert client.post('/risk_profile?user_id=u1', json=user_data_json).status_code == HTTPStatus.CREATED
+    # Requests scored with the candidate itself aren't compared.
+    client.post('/risk_profile', json=user_data_json, headers={'X-Policy-Version': 'candidate'})
+    shadow_app.extensions['shadow_evaluator'].flush()
+    stats = client.get('/shadow/stats').get_json()
+    assert (stats['compared'], stats['changed']) == (2, 2)
+    assert stats['diffs']['life'] == 2
+    assert stats['samples'][0]['user_data']['income'] == 150000
+    assert stats['samples'][0]['candidate']['life'] == 'adventurous'
+
+def test_shadow_disabled(client):
+    assert client.get('/shadow/stats').status_code == HTTPStatus.NOT_FOUND
+
+def test_unknown_shadow_version():
+    with pytest.raises(ValueError):
+        create_app({'TESTING': True, 'SHADOW_POLICY_VERSION': 'candidate'})
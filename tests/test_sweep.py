@@ -0,0 +1,88 @@
+import itertools
+import pytest
+from http import HTTPStatus
+from riskprofiler.errors import DeserializationError
+from riskprofiler.policy_rules import RulePolicy
+from riskprofiler.risk_profile_calculator import CURRENT_RISK_POLICIES, RiskProfileCalculator, RiskScoreValueMapping
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.sweep import SweepAxis, load_axes, sweep_profiles
+from riskprofiler.user_data import UserData
+
+def naive_profile(user_data, axes, indexes, policies):
+    fields = {name: getattr(user_data, name) for name in ('age', 'gender', 'marital_status', 'dependents', 'income', 'risk_questions')}
+    fields.update((axis.field, axis.user_data_values[i]) for axis, i in zip(axes, indexes))
+    user_data = UserData(houses=user_data.house_collec, vehicles=user_data.vehicle_collec, **fields)
+    return RiskProfileCalculator(user_data=user_data, risk_policies=policies).calculate()
+
+def check_grid(user_data, axes, policies):
+    profiles, grid = sweep_profiles(user_data, axes, policies, RiskScoreValueMapping())
+    for indexes in itertools.product(*(range(len(axis.values)) for axis in axes)):
+        cell = grid
+        for i in indexes:
+            cell = cell[i]
+        assert profiles[cell] == naive_profile(user_data, axes, indexes, policies)
+    return profiles, grid
+
+def test_sweep_matches_separate_calculations(make_random_user_datas):
+    axes = load_axes({
+        'age': {'from': 18, 'to': 70, 'step': 4},
+        'income': {'values': [0, 1, 200000, 200001]},
+        'dependents': {'values': [0, 2]},
+        'marital_status': {'values': ['single', 'married']}
+    })
+    for user_data in make_random_user_datas(20):
+        profiles, _ = check_grid(user_data, axes, CURRENT_RISK_POLICIES)
+        assert len(profiles) == len(set(map(repr, profiles)))
+
+def test_sweep_fields_read_together(make_random_user_datas):
+    # Age and income can't be swept apart for this policy.
+    policy = RulePolicy('young_and_rich', [{'if': {'age': {'<': 30}, 'income': {'>': 100000}}, 'then': [{'add': 3}]}])
+    axes = load_axes({'age': {'from': 20, 'to': 40, 'step': 5}, 'dependents': {'values': [0, 1]}, 'income': {'values': [0, 100001]}})
+    for user_data in make_random_user_datas(10):
+        check_grid(user_data, axes, CURRENT_RISK_POLICIES + [policy])
+
+def test_sweep_axis_values():
+    assert SweepAxis.load('age', {'from': 20, 'to': 30, 'step': 5}).values == [20, 25, 30]
+    assert SweepAxis.load('age', {'from': 20, 'to': 22}).values == [20, 21, 22]
+    assert SweepAxis.load('marital_status', {'values': ['married']}).values == ['married']
+
+@pytest.mark.parametrize('sweep', [
+    [],
+    {},
+    {'gender': {'values': ['male']}},
+    {'age': [20, 30]},
+    {'age': {'from': 20}},
+    {'age': {'from': 20, 'to': 30, 'step': 0}},
+    {'age': {'from': 30, 'to': 20}},
+    {'age': {'values': []}},
+    {'age': {'values': ['20']}},
+    {'marital_status': {'from': 0, 'to': 1}},
+    {'marital_status': {'values': ['divorced']}},
+    {'age': {'from': 0, 'to': 999}, 'income': {'from': 0, 'to': 999}},
+])
+def test_invalid_sweeps(sweep):
+    with pytest.raises(DeserializationError):
+        load_axes(sweep)
+
+def test_sweep_endpoint(client, user_data_json):
+    body = {'user_data': user_data_json, 'sweep': {'age': {'from': 20, 'to': 80}, 'income': {'values': [0, 250000]}}}
+    response = client.post('/risk_profile/sweep', json=body)
+    assert response.status_code == HTTPStatus.OK
+    data = response.get_json()
+    assert data['axes'] == [{'field': 'age', 'values': list(range(20, 81))}, {'field': 'income', 'values': [0, 250000]}]
+    assert len(data['grid']) == 61 and all(len(row) == 2 for row in data['grid'])
+    for age_index, income_index in ((0, 0), (15, 1), (60, 1)):
+        cell_user_data_json = {**user_data_json, 'age': 20 + age_index, 'income': [0, 250000][income_index]}
+        expected = client.post('/risk_profile', json=cell_user_data_json).get_json()
+        assert data['profiles'][data['grid'][age_index][income_index]] == expected
+
+@pytest.mark.parametrize('body', [
+    {'sweep': {'age': {'values': [20]}}},
+    {'user_data': {}, 'sweep': {'age': {'values': [20]}}},
+    {'user_data': None, 'sweep': {'height': {'values': [20]}}},
+])
+def test_sweep_endpoint_invalid_body(client, user_data_json, body):
+    if body.get('user_data') is None and 'user_data' in body:
+        body['user_data'] = user_data_json
+    response = client.post('/risk_profile/sweep', json=body)
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
@@ -0,0 +1,28 @@
+import pytest
+from riskprofiler.serialization import UserDataDeserializer
+from riskprofiler.errors import DeserializationError
+from riskprofiler.synthetic import SyntheticUserDataGenerator, GENERATOR_KINDS
+
+def test_generator_is_seeded():
+    first = list(SyntheticUserDataGenerator(seed=7).payloads(50, {'typical': 3, 'large_fleet': 1}))
+    second = list(SyntheticUserDataGenerator(seed=7).payloads(50, {'typical': 3, 'large_fleet': 1}))
+    assert first == second
+    assert first != list(SyntheticUserDataGenerator(seed=8).payloads(50, {'typical': 3, 'large_fleet': 1}))
+
+@pytest.mark.parametrize('kind', [k for k in GENERATOR_KINDS if k != 'invalid'])
+def test_generator_valid_kinds(kind):
+    generator = SyntheticUserDataGenerator(seed=1)
+    for _ in range(20):
+        user_data = UserDataDeserializer().load(generator.payload(kind))
+        if kind == 'large_fleet':
+            assert user_data.vehicles_count() == 500
+        elif kind == 'all_mortgaged':
+            assert len(user_data.get_mortgaged_houses()) == user_data.houses_count() > 1
+
+def test_generator_invalid_kind():
+    generator = SyntheticUserDataGenerator(seed=1)
+    for _ in range(50):
+        with pytest.raises(DeserializationError):
+            UserDataDeserializer().load(generator.payload('invalid'))
+    with pytest.raises(ValueError):
+        generator.payload('unknown')
@@ -1,7 +1,7 @@
 import pytest
 import datetime
 from riskprofiler.errors import ItemDataKeyNotUnique
-from riskprofiler.user_data import UserData, ItemData, ItemDataCollection, VehicleItemData, HouseItemData, Gender, MaritalStatus, HouseStatus
+from riskprofiler.user_data import UserData, ItemData, ItemDataCollection, VehicleItemData, HouseItemData, Gender, MaritalStatus, HouseStatus, first_year_within, first_year_under
 
 def test_user_data_query_methods():
     user_data = UserData(
@@ -57,6 +57,50 @@ def test_item_data_collection():
     with pytest.raises(ItemDataKeyNotUnique):
         collec.add(ItemData('foo'))
 
+def test_item_data_collection_indexes():
+    collec = ItemDataCollection.from_dict({
+        0: HouseItemData(0, zip_code=123, status=HouseStatus.mortgaged),
+        1: HouseItemData(1, zip_code=124, status=HouseStatus.owned)
+    })
+    assert [h.item_key() for h in collec.items_with_status(HouseStatus.mortgaged)] == [0]
+    assert collec.count_with_status(HouseStatus.owned) == 1
+    assert collec.items_by_year() == []
+    # Indexes built already are kept up to date.
+    collec.add(HouseItemData(2, zip_code=125, status=HouseStatus.mortgaged))
+    assert [h.item_key() for h in collec.items_with_status(HouseStatus.mortgaged)] == [0, 2]
+    assert collec.item_at(2).zip_code == 125
+    assert collec.items_with_status(HouseStatus.owned)[0].item_key() == 1
+
+    vehicles = ItemDataCollection(*[VehicleItemData(key, make='M', model='M', year=year) for key, year in enumerate([2015, 2010, 2019, 2010])])
+    assert [v.item_key() for v in vehicles.items_by_year()] == [1, 3, 0, 2]
+    assert [v.item_key() for v in vehicles.items_since_year(2011)] == [0, 2]
+    vehicles.add(VehicleItemData(4, make='M', model='M', year=2012))
+    assert [v.item_key() for v in vehicles.items_since_year(2011)] == [4, 0, 2]
+    assert vehicles.items_since_year(2020) == []
+    assert vehicles.count_with_status(HouseStatus.owned) == 0
+
+@pytest.mark.parametrize('curr_date', [datetime.date(2021, 1, 1), datetime.date(2021, 1, 5), datetime.date(2020, 12, 31), datetime.date(2024, 6, 30)])
+@pytest.mark.parametrize('num_years', [0, 1, 4.5, 5])
+def test_first_year_within(curr_date, num_years):
+    year = first_year_within(num_years, curr_date)
+    for y in range(year - 3, year + 3):
+        vehicle = VehicleItemData(0, make='M', model='M', year=y)
+        assert (vehicle.years_since_production(curr_date) <= num_years) == (y >= year)
+    year = first_year_under(num_years, curr_date)
+    for y in range(year - 3, year + 3):
+        vehicle = VehicleItemData(0, make='M', model='M', year=y)
+        assert (vehicle.years_since_production(curr_date) < num_years) == (y >= year)
+
 def test_vehicle_item_data():
     vid = VehicleItemData('foo', make='Bar', model='Quux', year=1995)
-    assert int(vid.years_since_production(curr_date=datetime.date(1998, 1, 1))) == 3
\ No newline at end of file
+    assert int(vid.years_since_production(curr_date=datetime.date(1998, 1, 1))) == 3
+
+def test_data_model_has_no_instance_dict():
+    house = HouseItemData(0, zip_code=123, status=HouseStatus.owned)
+    vehicle = VehicleItemData(0, make='Bar', model='Quux', year=1995)
+    user_data = UserData(
+        age=42, gender=Gender.male, marital_status=MaritalStatus.single, dependents=0, income=0,
+        houses=ItemDataCollection(house), vehicles=ItemDataCollection(vehicle), risk_questions=[0, 0, 0]
+    )
+    for obj in (house, vehicle, user_data, user_data.house_collec):
+        assert not hasattr(obj, '__dict__')
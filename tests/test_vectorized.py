@@ -0,0 +1,73 @@
+import pytest
+import datetime
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.user_data import UserData, ItemDataCollection, HouseItemData, VehicleItemData, HouseStatus, MaritalStatus, Gender
+from riskprofiler.risk_policies import InitialRiskPolicy, NoIncomePolicy, NoVehiclePolicy, NoHousePolicy, AgePolicy, LargeIncomePolicy, MortgagedHousePolicy, DependentsPolicy, MaritalStatusPolicy, RecentVehiclePolicy, SingleHousePolicy, SingleVehiclePolicy
+from riskprofiler.risk_profile_calculator import RiskProfileCalculator, RiskScoreValueMapping
+
+np = pytest.importorskip('numpy')
+from riskprofiler.vectorized import VectorizedRiskProfileCalculator, VectorizedRiskScoreValueMapping, AVERSION_FOR_CODE, calculate_many
+
+CURR_DATE = datetime.date(2018, 7, 1)
+
+def make_policies(curr_date=CURR_DATE):
+    return [
+        InitialRiskPolicy(),
+        NoIncomePolicy(),
+        NoVehiclePolicy(),
+        NoHousePolicy(),
+        AgePolicy(),
+        LargeIncomePolicy(),
+        MortgagedHousePolicy(),
+        DependentsPolicy(),
+        MaritalStatusPolicy(),
+        RecentVehiclePolicy(curr_date=curr_date),
+        SingleHousePolicy(),
+        SingleVehiclePolicy()
+    ]
+
+def test_vectorized_score_value_mapping():
+    mapping = RiskScoreValueMapping()
+    values = np.arange(-5, 8)
+    codes = VectorizedRiskScoreValueMapping().map_score_values(values)
+    assert [AVERSION_FOR_CODE[c] for c in codes] == [mapping.map_score_value(v) for v in values.tolist()]
+
+def test_vectorized_calculator_matches_per_user_calculator(make_random_user_datas):
+    user_datas = make_random_user_datas(2000)
+    policies = make_policies()
+    expected = [RiskProfileCalculator(user_data=u, risk_policies=policies).calculate() for u in user_datas]
+    actual = VectorizedRiskProfileCalculator.from_policies(policies, user_datas=user_datas).calculate()
+    assert actual == expected
+    for a, e in zip(actual, expected):
+        assert list(a) == list(e)
+
+def test_vectorized_calculator_recent_vehicle_boundary():
+    # 2013-01-01 is exactly 1825 days (5 years of 365 days) before this date.
+    curr_date = datetime.date(2017, 12, 31)
+    user_datas = [
+        UserData(
+            age=50, gender=Gender.male, marital_status=MaritalStatus.single, dependents=0, income=1,
+            houses=ItemDataCollection(),
+            vehicles=ItemDataCollection(*[VehicleItemData(year, make='M', model='M', year=year) for year in range(2011, 2016)]),
+            risk_questions=[1, 1, 0]
+        )
+    ]
+    policies = make_policies(curr_date)
+    expected = [RiskProfileCalculator(user_data=u, risk_policies=policies).calculate() for u in user_datas]
+    assert VectorizedRiskProfileCalculator.from_policies(policies, user_datas=user_datas).calculate() == expected
+
+def test_vectorized_calculator_falls_back_for_huge_values():
+    user_data = UserData(
+        age=35, gender=Gender.male, marital_status=MaritalStatus.single, dependents=0, income=2 ** 80,
+        houses=ItemDataCollection(), vehicles=ItemDataCollection(), risk_questions=[0, 1, 0]
+    )
+    policies = make_policies()
+    expected = RiskProfileCalculator(user_data=user_data, risk_policies=policies).calculate()
+    assert calculate_many([user_data], policies) == [expected]
+    assert expected[Loi.life].value == 'adventurous'
+
+def test_vectorized_calculator_supports():
+    assert VectorizedRiskProfileCalculator.supports(make_policies())
+    assert not VectorizedRiskProfileCalculator.supports(make_policies()[:-1])
+    with pytest.raises(ValueError):
+        VectorizedRiskProfileCalculator.from_policies([AgePolicy()], user_datas=[])
@@ -0,0 +1,106 @@
+import copy
+import json
+import struct
+import pytest
+from http import HTTPStatus
+from riskprofiler.errors import InvalidValueDeserializationError, DeserializationErrors
+from riskprofiler.serialization import UserDataDeserializer, UserDataSerializer, RiskProfileSerializer
+from riskprofiler.risk_profile_calculator import RiskProfileCalculator
+from riskprofiler.synthetic import SyntheticUserDataGenerator
+from riskprofiler.wire_format import BINARY_MIMETYPE, encode_user_data, decode_user_data, encode_risk_profile, decode_risk_profile
+
+def test_round_trip(user_data_json):
+    payloads = [user_data_json] + list(SyntheticUserDataGenerator(seed=7).payloads(200, {'typical': 1, 'no_items': 1, 'landlord': 1, 'large_fleet': 1}))
+    serializer = UserDataSerializer()
+    for payload in payloads:
+        expected = serializer.to_dict(UserDataDeserializer().load(payload))
+        assert serializer.to_dict(decode_user_data(encode_user_data(payload))) == expected
+
+def test_round_trip_edge_values(user_data_json):
+    user_data_json = dict(
+        user_data_json, age=-1, income=-2 ** 63, risk_questions=[], houses=[],
+        vehicles=[{'key': -5, 'make': 'Škoda', 'model': '', 'year': 1999}, {'key': 2 ** 40, 'make': '', 'model': '日本', 'year': 2020}]
+    )
+    assert UserDataSerializer().to_dict(decode_user_data(encode_user_data(user_data_json))) == UserDataSerializer().to_dict(UserDataDeserializer().load(user_data_json))
+
+def test_encoding_is_compact(user_data_json):
+    assert len(encode_user_data(user_data_json)) < len(json.dumps(user_data_json, separators=(",", ":"))) / 2
+
+@pytest.mark.parametrize('change', (
+    lambda obj: obj.pop('age'),
+    lambda obj: obj.update(gender='other'),
+    lambda obj: obj.update(income=2 ** 63),
+    lambda obj: obj.update(risk_questions=[0, '1']),
+    lambda obj: obj['houses'][0].update(status='rented'),
+    lambda obj: obj['vehicles'][0].update(make=None)
+))
+def test_encode_invalid(user_data_json, change):
+    change(user_data_json)
+    with pytest.raises(ValueError):
+        encode_user_data(user_data_json)
+
+def test_decode_invalid(user_data_json):
+    data = encode_user_data(user_data_json)
+    for invalid in (b'', b'\x02' + data[1:], data[:-1], data + b'x', data[:40], data[:-len('ModelB')] + b'\xff' * len('ModelB')):
+        with pytest.raises(ValueError):
+            decode_user_data(invalid)
+
+def invalid_user_data(user_data_json):
+    # Invalid gender, duplicated house key and vehicle key.
+    user_data_json['houses'][1]['key'] = 0
+    user_data_json['vehicles'][1]['key'] = 0
+    data = bytearray(encode_user_data(user_data_json))
+    data[5] = 7
+    return bytes(data)
+
+def test_decode_errors(user_data_json):
+    data = invalid_user_data(user_data_json)
+    with pytest.raises(InvalidValueDeserializationError) as exc_info:
+        decode_user_data(data)
+    assert str(exc_info.value) == 'key "gender" in serialized object has invalid value 7 (expected one of 0 ("male"), 1 ("female"))'
+    with pytest.raises(DeserializationErrors) as exc_info:
+        decode_user_data(data, collect_errors=True)
+    assert [err.key for err in exc_info.value.errors] == ['gender', 'houses[1].key', 'vehicles[1].key']
+    # Same as the JSON path for the item keys.
+    user_data_json['gender'] = 'female'
+    with pytest.raises(DeserializationErrors) as json_exc_info:
+        UserDataDeserializer().load(user_data_json, collect_errors=True)
+    assert [str(err) for err in exc_info.value.errors[1:]] == [str(err) for err in json_exc_info.value.errors]
+
+def test_risk_profile_round_trip(user_data_json):
+    risk_profile = RiskProfileCalculator(user_data=UserDataDeserializer().load(user_data_json)).calculate()
+    assert decode_risk_profile(encode_risk_profile(risk_profile)) == RiskProfileSerializer().to_dict(risk_profile)
+
+def test_post_binary(client, user_data_json):
+    json_resp = client.post('/risk_profile', json=user_data_json)
+    resp = client.post('/risk_profile', data=encode_user_data(user_data_json), content_type=BINARY_MIMETYPE, headers={'Accept': BINARY_MIMETYPE})
+    assert resp.status_code == HTTPStatus.CREATED
+    assert resp.mimetype == BINARY_MIMETYPE
+    assert decode_risk_profile(resp.get_data()) == json_resp.get_json()
+    # Each direction is negotiated separately.
+    resp = client.post('/risk_profile', data=encode_user_data(user_data_json), content_type=BINARY_MIMETYPE)
+    assert resp.mimetype == 'application/json'
+    assert resp.get_json() == json_resp.get_json()
+    resp = client.post('/risk_profile', json=user_data_json, headers={'Accept': BINARY_MIMETYPE + ', application/json;q=0.5'})
+    assert decode_risk_profile(resp.get_data()) == json_resp.get_json()
+
+def test_post_binary_errors(client, user_data_json):
+    data = invalid_user_data(user_data_json)
+    resp = client.post('/risk_profile', data=data, content_type=BINARY_MIMETYPE, headers={'Accept': BINARY_MIMETYPE})
+    assert resp.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert resp.get_json() == {'error': 'key "gender" in serialized object has invalid value 7 (expected one of 0 ("male"), 1 ("female"))'}
+    resp = client.post('/risk_profile?errors=all', data=data, content_type=BINARY_MIMETYPE)
+    assert len(resp.get_json()['errors']) == 3
+    resp = client.post('/risk_profile', data=data[:-1], content_type=BINARY_MIMETYPE)
+    assert resp.status_code == HTTPStatus.BAD_REQUEST
+
+def test_stored_binary_profile(client, user_data_json):
+    resp = client.post('/risk_profile?user_id=u1', data=encode_user_data(user_data_json), content_type=BINARY_MIMETYPE)
+    assert resp.status_code == HTTPStatus.CREATED
+    resp = client.get('/risk_profile?user_id=u1', headers={'Accept': BINARY_MIMETYPE})
+    assert resp.mimetype == BINARY_MIMETYPE
+    assert decode_risk_profile(resp.get_data()) == client.post('/risk_profile', json=user_data_json).get_json()
+    # Updated like a profile POSTed as JSON.
+    resp = client.patch('/risk_profile?user_id=u1', json={'age': 65})
+    assert resp.status_code == HTTPStatus.OK
+    assert 'life' not in resp.get_json()
@@ -0,0 +1,141 @@
+import threading
+import time
+import pytest
+from http import HTTPStatus
+from riskprofiler.errors import WriteQueueFullError
+from riskprofiler.line_of_insurance import Loi
+from riskprofiler.metrics import Metrics
+from riskprofiler.risk_profile_calculator import RiskAversion
+from riskprofiler.write_behind import WriteBehindProfileStore
+
+def profile(aversion=RiskAversion.average):
+    return {Loi.life: aversion}
+
+class FakeStore:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.profiles = {}
+        self.failures = failures
+        self.gate = threading.Event()
+        self.gate.set()
+        self.written = threading.Condition()
+
+    def get(self, user_id):
+        return self.profiles.get(user_id)
+
+    def put(self, user_id, risk_profile, state=None):
+        self.put_many([(user_id, risk_profile, state)])
+
+    def put_many(self, items):
+        self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('disk full')
+        items = list(items)
+        with self.written:
+            self.batches.append([user_id for user_id, _, _ in items])
+            self.profiles.update((user_id, risk_profile) for user_id, risk_profile, _ in items)
+            self.written.notify_all()
+
+    def wait_for_batches(self, count, timeout=5):
+        with self.written:
+            assert self.written.wait_for(lambda: len(self.batches) >= count, timeout)
+
+def test_flushes_full_batches():
+    store = FakeStore()
+    queue = WriteBehindProfileStore(store, batch_size=3, flush_interval=60)
+    for user_id in ('a', 'b', 'c'):
+        queue.put(user_id, profile())
+    store.wait_for_batches(1)
+    assert store.batches == [['a', 'b', 'c']]
+    queue.close()
+
+def test_flushes_after_interval():
+    store = FakeStore()
+    queue = WriteBehindProfileStore(store, batch_size=100, flush_interval=0.01)
+    queue.put('a', profile())
+    store.wait_for_batches(1)
+    assert store.batches == [['a']]
+    queue.close()
+
+def test_rewrites_replace_queued_profile():
+    store = FakeStore()
+    store.gate.clear()
+    queue = WriteBehindProfileStore(store, batch_size=1, flush_interval=60)
+    queue.put('a', profile())
+    queue.put('b', profile())
+    queue.put('b', profile(RiskAversion.conservative))
+    assert queue.get('b') == profile(RiskAversion.conservative)
+    store.gate.set()
+    queue.flush()
+    assert store.batches == [['a'], ['b']]
+    assert store.profiles['b'] == profile(RiskAversion.conservative)
+    queue.close()
+
+def test_reads_queued_and_in_flight_profiles():
+    store = FakeStore()
+    store.gate.clear()
+    queue = WriteBehindProfileStore(store, batch_size=1, flush_interval=0)
+    queue.put('a', profile())
+    queue.put('b', profile(RiskAversion.adventurous))
+    assert queue.get('a') == profile()
+    assert queue.get('b') == profile(RiskAversion.adventurous)
+    assert queue.get('c') is None
+    store.gate.set()
+    queue.close()
+    assert store.profiles == {'a': profile(), 'b': profile(RiskAversion.adventurous)}
+
+def test_backpressure():
+    store = FakeStore()
+    store.gate.clear()
+    queue = WriteBehindProfileStore(store, maxsize=1, batch_size=1, flush_interval=0, put_timeout=0.05)
+    queue.put('a', profile())
+    while len(queue._in_flight) == 0:
+        time.sleep(0.001)
+    queue.put('b', profile())
+    queue.put('b', profile()) # Replacing a queued profile doesn't need room.
+    start = time.monotonic()
+    with pytest.raises(WriteQueueFullError):
+        queue.put('c', profile())
+    assert time.monotonic() - start >= 0.05
+    store.gate.set()
+    queue.put('c', profile())
+    queue.close()
+    assert sorted(store.profiles) == ['a', 'b', 'c']
+
+def test_close_drains_queue():
+    store = FakeStore()
+    queue = WriteBehindProfileStore(store, batch_size=2, flush_interval=60)
+    for user_id in 'abcde':
+        queue.put(user_id, profile())
+    queue.close()
+    assert sorted(store.profiles) == list('abcde')
+    queue.put('f', profile())
+    assert 'f' in store.profiles
+
+def test_retries_failed_writes():
+    store = FakeStore(failures=1)
+    metrics = Metrics()
+    queue = WriteBehindProfileStore(store, batch_size=10, flush_interval=0.001, metrics=metrics)
+    queue.put('a', profile())
+    queue.flush()
+    assert store.profiles == {'a': profile()}
+    queue.close()
+    text = metrics.render()
+    assert 'riskprofiler_write_flush_errors_total 1' in text
+    assert 'riskprofiler_write_batch_size_count 1' in text
+    assert 'riskprofiler_write_flush_duration_seconds_count 1' in text
+    assert 'riskprofiler_write_queue_depth 0' in text
+
+def test_queue_full_response(app, client, user_data_json, monkeypatch):
+    def put(user_id, risk_profile, state=None):
+        raise WriteQueueFullError
+    monkeypatch.setattr(app.extensions['write_behind'], 'put', put)
+    resp = client.post('/risk_profile?user_id=alice', json=user_data_json)
+    assert resp.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert resp.headers['Retry-After'] == '1'
+
+def test_profiles_reach_the_database(app, client, user_data_json):
+    client.post('/risk_profile?user_id=alice', json=user_data_json)
+    app.extensions['write_behind'].flush()
+    assert app.extensions['profile_store'].get('alice') is not None